@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import wave
+import resource
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from backend.utils.audio_utils import SAMPLE_RATE, SAMPLE_WIDTH, read_wav, write_wav
+
+# Peak-memory benchmark for the chunker on a synthetic long recording:
+#   python -m backend.benchmarks.chunker_memory --hours 6
+# Each mode runs in its own process so ru_maxrss is that mode's own ceiling.
+
+# Function to write a synthetic 16 kHz mono WAV block by block (speech-like bursts separated by pauses)
+def write_synthetic_wav(path, seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    block = 60 * SAMPLE_RATE
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(SAMPLE_RATE)
+        for start in range(0, int(seconds * SAMPLE_RATE), block):
+            t = np.arange(start, start + block) / SAMPLE_RATE
+            envelope = (np.sin(2 * np.pi * t / 5) > -0.3).astype(np.float32)
+            noise = rng.standard_normal(block).astype(np.float32)
+            wav_file.writeframesraw((3000 * envelope * noise).astype(np.int16).tobytes())
+
+# Function to build caption segments every 5 seconds, like a dense transcript
+def synthetic_segments(seconds):
+    return [(start, min(start + 4.5, seconds), f"segment {index}") for index, start in enumerate(np.arange(0, seconds, 5.0))]
+
+# Function to chunk the whole file the way the chunker did before streaming: one in-memory array per video
+def chunk_whole_file(wav_path, segments, output_dir):
+    from backend.utils.chunk_utils import plan_chunks
+    audio = read_wav(wav_path)
+    for chunk_index, plan in enumerate(plan_chunks(segments, total_samples=len(audio), seed=0), start=1):
+        write_wav(os.path.join(output_dir, f"{chunk_index}.wav"), audio, plan['ranges'])
+
+# Function to chunk with the streaming chunker used by the pipeline
+def chunk_streaming(wav_path, segments, output_dir):
+    from backend.services.process_service import chunk_audio_and_srt
+    job_dir = os.path.join(output_dir, 'temp_files_benchmark', 'english', 'video')
+    chunk_audio_and_srt(wav_path, segments, job_dir, 'english', 'benchmark', seed=0)
+
+# Function to run one mode in this process and report its peak RSS
+def run_mode(mode, wav_path, seconds, output_dir):
+    segments = synthetic_segments(seconds)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    {'whole': chunk_whole_file, 'streaming': chunk_streaming}[mode](wav_path, segments, output_dir)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    print(json.dumps({'mode': mode, 'peak_rss_bytes': peak * scale, 'baseline_rss_bytes': baseline * scale}))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the chunker's peak memory on a synthetic long recording.")
+    parser.add_argument('--hours', type=float, default=2.0)
+    parser.add_argument('--run', choices=['whole', 'streaming'], help=argparse.SUPPRESS)
+    parser.add_argument('--wav', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    seconds = args.hours * 3600
+
+    if args.run:
+        run_mode(args.run, args.wav, seconds, args.output)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        wav_path = os.path.join(work_dir, 'synthetic.wav')
+        write_synthetic_wav(wav_path, seconds)
+        print(f"Synthetic recording: {args.hours} h, {os.path.getsize(wav_path) / 2**20:.0f} MiB of PCM")
+        for mode in ('whole', 'streaming'):
+            output_dir = os.path.join(work_dir, mode)
+            os.makedirs(output_dir)
+            result = subprocess.run([sys.executable, '-m', 'backend.benchmarks.chunker_memory', '--hours', str(args.hours),
+                                     '--run', mode, '--wav', wav_path, '--output', output_dir],
+                                    check=True, stdout=subprocess.PIPE, text=True)
+            report = json.loads(result.stdout.strip().splitlines()[-1])
+            print(f"{mode:>9}: peak RSS {report['peak_rss_bytes'] / 2**20:.0f} MiB "
+                  f"(interpreter and imports {report['baseline_rss_bytes'] / 2**20:.0f} MiB)")
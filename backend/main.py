@@ -4,7 +4,10 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from backend.routers import process
+from backend.services.model_service import warm_up
+from backend.services.metrics_service import render_metrics
 
 app = FastAPI()
 
@@ -22,9 +25,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Load the Whisper model(s) once per worker before the first request arrives
+@app.on_event("startup")
+def warm_up_models():
+    warm_up()
+
 # Include the router for processing
 app.include_router(process.router)
 
+# Prometheus scrape endpoint: per-stage latency, real-time factor, bytes written and queue depths across all workers
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the File Processing API!"}
@@ -1,55 +1,154 @@
 from fastapi import APIRouter, File, UploadFile, Form, HTTPException, Request
-from fastapi.responses import JSONResponse, StreamingResponse
-from backend.services.process_service import process_youtube_links
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from backend.services.job_service import submit_job, resume_job, get_job, list_jobs, read_events, JobQueueFull, JobNotResumable
 from backend.services.transfer_service import transfer_data
 from backend.services.deletion_service import delete_temp_files_folder
 from backend.services.wordcloud_service import generate_wordcloud
 from backend.services.histogram_service import generate_histograms
 from backend.services.fetch_service import fetch_video_folders, fetch_language_folders
+from backend.services.model_service import registry_stats
+from backend.services.transcript_cache_service import transcript_cache_stats
+from backend.services.audio_cache_service import audio_cache_stats
+from backend.services.export_service import export_language, ExportBusy
+from backend.services.metrics_service import timed
+from backend.services.asr_service import get_backend, installed_backends, ASR_BACKENDS
+from backend.utils.audio_utils import CHUNK_CODECS
+from backend.services.render_cache_service import render_key, render_etag, etag_matches, get_render, put_render
+from backend.services.render_pool_service import run_render, RenderPoolBusy, RenderTimeout
 import os
+import re
+import json
+import uuid
+import asyncio
 
 router = APIRouter()
 
+# How often the event stream checks a job's event log, and how long it may stay silent
+EVENT_POLL_SECONDS = 0.5
+EVENT_HEARTBEAT_SECONDS = 15
+
 # Define the route to process YouTube links from a file
 @router.post("/process/")
-async def process_file(file: UploadFile = File(...), language: str = Form(...)):
-    # Define where to store the uploaded file temporarily
+async def process_file(file: UploadFile = File(...), language: str = Form(...),
+                       codec: str = Form("wav"), bitrate: str = Form(None),
+                       asr_backend: str = Form(None), asr_model: str = Form(None)):
+    # Ensure the language is valid
+    supported_languages = ["english", "hindi", "german"]
+    if language.lower() not in supported_languages:
+        raise HTTPException(status_code=400, detail=f"Unsupported language: {language}. Supported languages are {supported_languages}")
+
+    # Ensure the chunk codec is valid; the bitrate only applies to Opus
+    codec = codec.lower()
+    if codec not in CHUNK_CODECS:
+        raise HTTPException(status_code=400, detail=f"Unsupported codec: {codec}. Supported codecs are {list(CHUNK_CODECS)}")
+    if bitrate and not re.fullmatch(r"\d+k", bitrate):
+        raise HTTPException(status_code=400, detail=f"Invalid bitrate: {bitrate}. Use a value such as 32k.")
+
+    # Ensure the ASR backend and model are valid; both default to the deployment's settings
+    try:
+        asr = get_backend(asr_backend, model_size=asr_model).spec()
+        models = ASR_BACKENDS[asr["backend"]].available_models()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImportError as e:
+        raise HTTPException(status_code=400, detail=f"ASR backend {asr_backend} is not installed: {e}")
+    if models is not None and asr["model_size"] not in models:
+        raise HTTPException(status_code=400, detail=f"Unsupported model: {asr['model_size']}. Supported models are {list(models)}")
+
+    # Define where to store the uploaded file until the job has read it
     upload_dir = "uploads"
     os.makedirs(upload_dir, exist_ok=True)  # Ensure the upload directory exists
-    
-    # Save the uploaded file to the upload directory
-    file_path = os.path.join(upload_dir, file.filename)
+
+    # Save the uploaded file to the upload directory under the job's ID
+    unique_id = str(uuid.uuid4())
+    file_path = os.path.join(upload_dir, f"{unique_id}_{os.path.basename(file.filename)}")
     try:
         with open(file_path, "wb") as f:
-            f.write(file.file.read())
+            f.write(await file.read())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving file: {e}")
-    
-    # Ensure the language is valid
-    supported_languages = ["english", "hindi", "german"]
-    if language.lower() not in supported_languages:
-        raise HTTPException(status_code=400, detail=f"Unsupported language: {language}. Supported languages are {supported_languages}")
 
-    # Call the service to process the file
+    # Queue the job; the heavy work runs on the job worker pool, off the event loop
     try:
-        result, status_code = process_youtube_links(file_path, language.lower())
-        if status_code == 200:
-            # Extract unique_id from the result if present
-            unique_id = result.get("unique_id", None)
-            # Return a success response with metadata and unique_id
-            return JSONResponse(status_code=200, content={
-                "message": "File processed successfully",
-                "result": result,
-                "unique_id": unique_id  # Include the unique_id in the response
-            })
-        else:
-            raise HTTPException(status_code=500, detail=f"Error: {result.get('message', 'Failed to process the file.')}")
+        job = submit_job(unique_id, file_path, language.lower(), codec=codec, bitrate=bitrate, asr=asr)
+    except JobQueueFull as e:
+        os.remove(file_path)
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing file: {e}")
-    finally:
-        # Clean up the uploaded file after processing
         if os.path.exists(file_path):
             os.remove(file_path)
+        raise HTTPException(status_code=500, detail=f"Error queueing file: {e}")
+
+    return JSONResponse(status_code=202, content={
+        "message": "File queued for processing",
+        "status": job["status"],
+        "unique_id": unique_id
+    })
+
+# Endpoint to fetch the status and per-video progress of a processing job
+@router.get("/jobs/{unique_id}")
+async def get_job_status(unique_id: str):
+    job = get_job(unique_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {unique_id} not found.")
+    return job
+
+# Endpoint to run a finished, failed or interrupted job again from its per-video checkpoints (only unfinished videos are redone)
+@router.post("/jobs/{unique_id}/resume")
+async def resume_processing_job(unique_id: str):
+    try:
+        job = resume_job(unique_id)
+    except JobNotResumable as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {unique_id} not found.")
+
+    return JSONResponse(status_code=202, content={
+        "message": "Job queued for resume",
+        "status": job["status"],
+        "unique_id": unique_id
+    })
+
+# Endpoint to stream a job's progress events as server-sent events until the job finishes
+@router.get("/jobs/{unique_id}/events")
+async def stream_job_events(request: Request, unique_id: str):
+    if await run_in_threadpool(get_job, unique_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job {unique_id} not found.")
+
+    # Resume after the last event the client saw, if it reconnects
+    last_event_id = request.headers.get("last-event-id", "0")
+    offset = int(last_event_id) if last_event_id.isdigit() else 0
+
+    async def event_stream():
+        nonlocal offset
+        idle_seconds = 0.0
+        while not await request.is_disconnected():
+            # Both reads touch the disk, so they run on the thread pool rather than the event loop
+            events = await run_in_threadpool(read_events, unique_id, offset)
+            for event_id, event in events:
+                offset = event_id
+                yield f"id: {event_id}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            job = await run_in_threadpool(get_job, unique_id)
+            if job is None or (job["status"] in ("completed", "failed", "interrupted") and not events):
+                break
+            if events:
+                idle_seconds = 0.0
+            elif idle_seconds >= EVENT_HEARTBEAT_SECONDS:
+                idle_seconds = 0.0
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(EVENT_POLL_SECONDS)
+            idle_seconds += EVENT_POLL_SECONDS
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# Endpoint to list processing jobs that have not been transferred or deleted
+@router.get("/jobs")
+async def get_jobs():
+    return {"jobs": list_jobs()}
             
                         
 # Define the route to transfer data from temp_files to audio_files
@@ -71,6 +170,24 @@ async def transfer_data_files(request: Request):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error transferring data: {e}")
 
+# Define the route to pack a language (or a subset of its videos) into memory-mappable training shards
+@router.post("/export/")
+async def export_dataset(request: Request):
+    body = await request.json()
+    language = body.get("language")
+    if not language:
+        raise HTTPException(status_code=400, detail="Language is required")
+    try:
+        result = await asyncio.to_thread(export_language, language.lower(), body.get("name"), body.get("video_codes"),
+                                         body.get("min_duration"), body.get("max_duration"))
+    except ExportBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error exporting data: {e}")
+    return {"status": "success", **result}
+
 # Define the route to delete the temp_files folder
 @router.delete("/delete_temp/")
 async def delete_temp_folder(request: Request):
@@ -91,39 +208,49 @@ async def delete_temp_folder(request: Request):
         raise HTTPException(status_code=500, detail=f"Error deleting temp_files folder: {e}")
     
 BASE_DIR = "audio_files"
+# Function to serve a cached PNG, answering 304 when the client already holds the current version.
+# The key reads the catalog version from SQLite (and may rebuild a missing catalog), so it is computed on
+# the threadpool; misses are rendered on the render pool. Either way the event loop stays free.
+async def cached_png_response(request, endpoint, language, video_code, render):
+    key = await run_in_threadpool(render_key, endpoint, language, video_code)
+    etag = render_etag(key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    data = get_render(key)
+    if data is None:
+        try:
+            with timed(f'{endpoint}_render', language):
+                img_buffer = await run_render(render, language, video_code)
+        except RenderPoolBusy as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except RenderTimeout as e:
+            raise HTTPException(status_code=504, detail=str(e))
+        if img_buffer is None:
+            return None
+        data = img_buffer.getvalue()
+        put_render(key, data)
+    return Response(content=data, media_type="image/png", headers={"ETag": etag, "Cache-Control": "no-cache"})
+
 @router.get("/wordcloud/")
-async def get_wordcloud(language: str, video_code: str = None):
-    # Construct the directory path based on the presence of video_code
-    if video_code:
-        # Use the specific video folder
-        language_path = os.path.join(BASE_DIR, language.lower(), video_code)
-    else:
-        # Use the language folder
-        language_path = os.path.join(BASE_DIR, language.lower())
+async def get_wordcloud(request: Request, language: str, video_code: str = None):
+    # Build the word cloud from the catalogued chunks of the language, or of one video when video_code is given
+    response = await cached_png_response(request, "wordcloud", language.lower(), video_code, generate_wordcloud)
     
-    wordcloud_image = generate_wordcloud(language_path, language.lower())
-    
-    if wordcloud_image is None:
+    if response is None:
         raise HTTPException(status_code=404, detail="Base directory does not exist.")
     
-    return wordcloud_image
+    return response
 
 @router.get("/histograms/")
-async def get_histograms(language: str, video_code: str = None):
-    # Construct the directory path based on the presence of video_code
-    if video_code:
-        # Use the specific video folder
-        language_path = os.path.join(BASE_DIR, language.lower(), video_code)
-    else:
-        # Use the language folder
-        language_path = os.path.join(BASE_DIR, language.lower())
-    
-    img_buffer = generate_histograms(language_path, language.lower())
+async def get_histograms(request: Request, language: str, video_code: str = None):
+    # Build the histograms from the catalogued chunks of the language, or of one video when video_code is given
+    response = await cached_png_response(request, "histograms", language.lower(), video_code, generate_histograms)
     
-    if img_buffer is None:
+    if response is None:
         return {"error": "Base directory not found"}
     
-    return StreamingResponse(img_buffer, media_type="image/png")
+    return response
 
 # Endpoint to fetch video folder names for a given language
 @router.get("/video_folders/")
@@ -145,4 +272,14 @@ async def get_language_folders():
             raise HTTPException(status_code=404, detail=language_folders["error"])
         return {"language_folders": language_folders}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching language folders: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error fetching language folders: {e}")
+
+# Endpoint to report the ASR models resident in this worker and the engines installed
+@router.get("/models/")
+async def get_models():
+    return dict(registry_stats(), engines=installed_backends())
+
+# Endpoint to report the shared caches' usage and hit/miss counters
+@router.get("/caches/")
+async def get_caches():
+    return {"audio": audio_cache_stats(), "transcripts": transcript_cache_stats()}
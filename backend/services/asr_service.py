@@ -0,0 +1,129 @@
+import os
+import zlib
+import numpy as np
+from backend.services.model_service import get_model, exclusive_model, whisper_progress_bar, report_transcription_progress, DEFAULT_MODEL_SIZE, DEFAULT_DEVICE, DEFAULT_PRECISION
+
+# Languages the app accepts and the codes the ASR engines expect
+LANGUAGE_CODES = {'english': 'en', 'hindi': 'hi', 'german': 'de'}
+DEFAULT_ASR_BACKEND = os.environ.get("ASR_BACKEND", "whisper")
+ASR_SAMPLE_RATE = 16000
+
+
+# An ASR backend turns 16 kHz float32 audio into [{'start', 'end', 'text'}] segments.
+# Every backend takes the same options: model size, compute type, threads and beam size (None = the engine's default).
+class AsrBackend:
+    name = None
+    default_compute_type = None
+    default_beam_size = None
+
+    def __init__(self, model_size=None, compute_type=None, threads=None, beam_size=None):
+        self.model_size = model_size or DEFAULT_MODEL_SIZE
+        self.compute_type = compute_type or self.default_compute_type
+        self.threads = threads
+        self.beam_size = beam_size or self.default_beam_size
+
+    def language_code(self, language):
+        return LANGUAGE_CODES.get(language.lower(), 'en')
+
+    def spec(self):
+        return {'backend': self.name, 'model_size': self.model_size, 'compute_type': self.compute_type,
+                'threads': self.threads, 'beam_size': self.beam_size}
+
+    @classmethod
+    def available_models(cls):
+        return None
+
+    def transcribe(self, audio, language_code, initial_prompt=None):
+        raise NotImplementedError
+
+
+# openai-whisper on PyTorch (fp32 on CPU)
+class WhisperBackend(AsrBackend):
+    name = 'whisper'
+    default_compute_type = DEFAULT_PRECISION
+
+    @classmethod
+    def available_models(cls):
+        import whisper
+        return whisper.available_models()
+
+    # The threads option is applied by the transcription worker processes (see transcription_service), never here:
+    # torch's thread count is process-wide, so setting it from a job thread would change it for every other job
+    def transcribe(self, audio, language_code, initial_prompt=None):
+        options = {'beam_size': self.beam_size} if self.beam_size else {}
+        # The model is shared by every job thread of this process; one transcription at a time per model
+        with exclusive_model(self.model_size, DEFAULT_DEVICE, self.compute_type) as model, whisper_progress_bar():
+            result = model.transcribe(audio, language=language_code, fp16=self.compute_type == "fp16",
+                                      initial_prompt=initial_prompt, **options)
+        return [{'start': segment['start'], 'end': segment['end'], 'text': segment['text']} for segment in result['segments']]
+
+
+# faster-whisper (CTranslate2) with int8 weights on CPU; trades a little accuracy for several times the throughput
+class QuantizedWhisperBackend(AsrBackend):
+    name = 'faster-whisper'
+    default_compute_type = os.environ.get("QUANTIZED_COMPUTE_TYPE", "int8")
+    default_beam_size = int(os.environ.get("QUANTIZED_BEAM_SIZE", "1"))
+
+    @classmethod
+    def available_models(cls):
+        from faster_whisper import available_models
+        return available_models()
+
+    def transcribe(self, audio, language_code, initial_prompt=None):
+        model = get_model(self.model_size, 'cpu', self.compute_type, engine='faster-whisper', threads=self.threads)
+        segments, info = model.transcribe(audio, language=language_code, beam_size=self.beam_size,
+                                          initial_prompt=initial_prompt)
+        seconds_total = len(audio) / ASR_SAMPLE_RATE
+        results = []
+        # Segments are decoded lazily as they are iterated, so progress follows the iteration
+        for segment in segments:
+            results.append({'start': segment.start, 'end': segment.end, 'text': segment.text})
+            report_transcription_progress(segment.end, seconds_total)
+        return results
+
+
+# Deterministic stand-in for tests and benchmarks: one segment per few seconds of non-silent audio, words picked from a checksum of the samples
+class FakeBackend(AsrBackend):
+    name = 'fake'
+    default_compute_type = 'none'
+    segment_seconds = 4.0
+    words = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliett']
+
+    def transcribe(self, audio, language_code, initial_prompt=None):
+        step = int(self.segment_seconds * ASR_SAMPLE_RATE)
+        seconds_total = len(audio) / ASR_SAMPLE_RATE
+        results = []
+        for start in range(0, len(audio), step):
+            span = audio[start:start + step]
+            if not len(span) or float(np.max(np.abs(span))) < 1e-3:
+                continue
+            checksum = zlib.crc32(span.tobytes())
+            text = ' '.join(self.words[(checksum >> shift) % len(self.words)] for shift in (0, 8, 16))
+            results.append({'start': start / ASR_SAMPLE_RATE, 'end': (start + len(span)) / ASR_SAMPLE_RATE, 'text': f" {text}"})
+            report_transcription_progress((start + len(span)) / ASR_SAMPLE_RATE, seconds_total)
+        return results
+
+
+ASR_BACKENDS = {backend.name: backend for backend in (WhisperBackend, QuantizedWhisperBackend)}
+# The fake backend produces placeholder text, so the API only accepts it on test deployments that opt in
+ASR_ALLOW_FAKE = os.environ.get("ASR_ALLOW_FAKE", "false").lower() == "true"
+if ASR_ALLOW_FAKE:
+    ASR_BACKENDS[FakeBackend.name] = FakeBackend
+
+# Function to list the backends whose engine is installed in this deployment
+def installed_backends():
+    installed = []
+    for name, backend in ASR_BACKENDS.items():
+        try:
+            backend.available_models()
+        except ImportError:
+            continue
+        installed.append(name)
+    return installed
+
+# Function to build a backend from a spec dict (as stored on a job); unknown names are a ValueError
+def get_backend(backend=None, **options):
+    name = backend or DEFAULT_ASR_BACKEND
+    if name not in ASR_BACKENDS:
+        raise ValueError(f"Unknown ASR backend: {name}. Available backends are {list(ASR_BACKENDS)}")
+    return ASR_BACKENDS[name](**options)
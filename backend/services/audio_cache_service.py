@@ -0,0 +1,170 @@
+import os
+import time
+import uuid
+import shutil
+import threading
+from backend.utils.db_utils import connect, transaction
+
+# Shared cache of normalised 16 kHz mono WAVs keyed by video ID, kept outside the temp_files_* folders.
+# The index is SQLite so every uvicorn worker sees the same entries and the same in-flight fetches.
+AUDIO_CACHE_DIR = os.environ.get("AUDIO_CACHE_DIR", os.path.join('cache', 'audio'))
+AUDIO_CACHE_BYTES = int(os.environ.get("AUDIO_CACHE_BYTES", str(5 * 1024 ** 3)))
+# The worker fetching a video renews its claim every AUDIO_FETCH_HEARTBEAT_SECONDS, however long the download takes;
+# a claim not renewed for AUDIO_FETCH_TIMEOUT_SECONDS belongs to a dead worker and is taken over
+AUDIO_FETCH_HEARTBEAT_SECONDS = float(os.environ.get("AUDIO_FETCH_HEARTBEAT_SECONDS", "10"))
+AUDIO_FETCH_TIMEOUT_SECONDS = float(os.environ.get("AUDIO_FETCH_TIMEOUT_SECONDS", str(6 * AUDIO_FETCH_HEARTBEAT_SECONDS)))
+AUDIO_FETCH_POLL_SECONDS = 1.0
+
+_initialised = set()
+
+
+# Function to open the cache index, creating its schema the first time
+def _index(cache_dir=AUDIO_CACHE_DIR):
+    db_path = os.path.join(cache_dir, 'index.db')
+    conn = connect(db_path)
+    if db_path not in _initialised:
+        conn.execute('''CREATE TABLE IF NOT EXISTS audio (
+            video_id TEXT PRIMARY KEY,
+            nbytes INTEGER NOT NULL,
+            created_at REAL,
+            last_used_at REAL)''')
+        conn.execute('CREATE INDEX IF NOT EXISTS audio_last_used ON audio (last_used_at)')
+        # started_at is moved forward by the owner's heartbeat, so it is the last time the owner was known alive
+        conn.execute('CREATE TABLE IF NOT EXISTS fetches (video_id TEXT PRIMARY KEY, owner TEXT NOT NULL, started_at REAL NOT NULL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        _initialised.add(db_path)
+    return conn
+
+# Function to get the path of a video's cached WAV
+def cached_audio_path(video_id, cache_dir=AUDIO_CACHE_DIR):
+    return os.path.join(cache_dir, f'{video_id}.wav')
+
+# Function to bump a hit/miss/eviction counter
+def _count(conn, name, amount=1):
+    conn.execute('INSERT INTO cache_counters (name, value) VALUES (?, ?) '
+                 'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value', (name, amount))
+
+# Function to hard-link (or, across filesystems, copy) a cached WAV into a job folder.
+# The job keeps its own name for the file, so evicting the cache entry never pulls audio from under a running job.
+def _link_into(source, destination):
+    if os.path.exists(destination):
+        os.remove(destination)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+    return destination
+
+# Function to take a cached entry if present; returns True on a hit
+def _try_hit(conn, video_id, destination, cache_dir):
+    with transaction(conn):
+        row = conn.execute('SELECT 1 FROM audio WHERE video_id = ?', (video_id,)).fetchone()
+        if row is None:
+            return False
+        conn.execute('UPDATE audio SET last_used_at = ? WHERE video_id = ?', (time.time(), video_id))
+        _count(conn, 'hits')
+    try:
+        _link_into(cached_audio_path(video_id, cache_dir), destination)
+    except FileNotFoundError:
+        # Evicted between the lookup and the link
+        return False
+    return True
+
+# Function to claim the fetch of a video for this worker; a claim older than the timeout is taken over
+def _claim(conn, video_id, owner):
+    with transaction(conn):
+        row = conn.execute('SELECT started_at FROM fetches WHERE video_id = ?', (video_id,)).fetchone()
+        if row is not None and time.time() - row[0] < AUDIO_FETCH_TIMEOUT_SECONDS:
+            return False
+        conn.execute('INSERT OR REPLACE INTO fetches (video_id, owner, started_at) VALUES (?, ?, ?)', (video_id, owner, time.time()))
+        _count(conn, 'misses')
+        return True
+
+# Function to release a fetch claim
+def _release(conn, video_id, owner):
+    conn.execute('DELETE FROM fetches WHERE video_id = ? AND owner = ?', (video_id, owner))
+
+# Function run by a fetch's heartbeat thread: renew the claim until the fetch ends (stop is set)
+def _renew_claim(video_id, owner, cache_dir, stop):
+    while not stop.wait(AUDIO_FETCH_HEARTBEAT_SECONDS):
+        try:
+            _index(cache_dir).execute('UPDATE fetches SET started_at = ? WHERE video_id = ? AND owner = ?',
+                                      (time.time(), video_id, owner))
+        except Exception as e:
+            print(f"An error occurred while renewing the audio fetch claim on {video_id}: {e}")
+
+# Function to record a newly fetched WAV and evict least recently used entries until the cache fits its budget
+def _admit(conn, video_id, nbytes, cache_dir, max_bytes):
+    now = time.time()
+    with transaction(conn):
+        conn.execute('INSERT OR REPLACE INTO audio (video_id, nbytes, created_at, last_used_at) VALUES (?, ?, ?, ?)',
+                     (video_id, nbytes, now, now))
+        total = conn.execute('SELECT COALESCE(SUM(nbytes), 0) FROM audio').fetchone()[0]
+        evicted = []
+        for old_id, old_bytes in conn.execute('SELECT video_id, nbytes FROM audio WHERE video_id != ? ORDER BY last_used_at',
+                                              (video_id,)).fetchall():
+            if total <= max_bytes:
+                break
+            conn.execute('DELETE FROM audio WHERE video_id = ?', (old_id,))
+            total -= old_bytes
+            evicted.append(old_id)
+        if evicted:
+            _count(conn, 'evictions', len(evicted))
+    for old_id in evicted:
+        try:
+            os.remove(cached_audio_path(old_id, cache_dir))
+        except FileNotFoundError:
+            pass
+
+# Function to get a video's normalised WAV into destination, fetching it at most once across all workers.
+# fetch(work_dir) must produce the WAV inside work_dir and return its path (or None on failure).
+def get_cached_audio(video_id, destination, fetch, progress=None, cache_dir=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_BYTES):
+    progress = progress or (lambda status, **details: None)
+    conn = _index(cache_dir)
+    owner = f'{os.getpid()}-{uuid.uuid4()}'
+    waiting = False
+
+    while True:
+        if _try_hit(conn, video_id, destination, cache_dir):
+            print(f"Audio cache hit for {video_id}")
+            progress('downloading', cache='hit')
+            return destination
+        if _claim(conn, video_id, owner):
+            break
+        # Another worker is fetching this video; wait for its result instead of downloading it twice.
+        # The wait is reported once, not on every poll, so the job's event log does not grow while it waits.
+        if not waiting:
+            progress('downloading', cache='waiting')
+            waiting = True
+        time.sleep(AUDIO_FETCH_POLL_SECONDS)
+
+    work_dir = os.path.join(cache_dir, f'.tmp-{owner}')
+    stop_renewing = threading.Event()
+    threading.Thread(target=_renew_claim, args=(video_id, owner, cache_dir, stop_renewing),
+                     name=f"audio-fetch-{video_id}", daemon=True).start()
+    try:
+        os.makedirs(work_dir, exist_ok=True)
+        wav_path = fetch(work_dir)
+        if not wav_path:
+            return None
+        # Publish atomically: readers only ever see a complete file under the cache name
+        nbytes = os.path.getsize(wav_path)
+        if nbytes <= max_bytes:
+            os.replace(wav_path, cached_audio_path(video_id, cache_dir))
+            _admit(conn, video_id, nbytes, cache_dir, max_bytes)
+            return _link_into(cached_audio_path(video_id, cache_dir), destination)
+        os.replace(wav_path, destination)  # Larger than the whole budget: hand it to the job uncached
+        return destination
+    finally:
+        stop_renewing.set()
+        _release(conn, video_id, owner)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# Function to report cache usage and counters
+def audio_cache_stats(cache_dir=AUDIO_CACHE_DIR):
+    conn = _index(cache_dir)
+    entries, nbytes = conn.execute('SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM audio').fetchone()
+    counters = dict(conn.execute('SELECT name, value FROM cache_counters'))
+    fetching = conn.execute('SELECT COUNT(*) FROM fetches').fetchone()[0]
+    return {'entries': entries, 'bytes': nbytes, 'max_bytes': AUDIO_CACHE_BYTES, 'fetching': fetching,
+            'hits': counters.get('hits', 0), 'misses': counters.get('misses', 0), 'evictions': counters.get('evictions', 0)}
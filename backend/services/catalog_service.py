@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import time
+from collections import Counter
+from backend.utils.db_utils import connect, transaction
+from backend.utils.text_utils import read_word_counts, write_word_counts
+from backend.utils.utils import dataset_relative_path
+
+# Catalog of every committed chunk; the analytics and folder endpoints read from here instead of walking audio_files
+BASE_DIR = 'audio_files'
+CATALOG_PATH = os.path.join(BASE_DIR, 'catalog.db')
+# Bumped whenever the schema gains data that needs a rebuild from disk
+CATALOG_SCHEMA_VERSION = 3
+
+_initialised = set()
+
+# Function to open the catalog, creating the schema and building it from disk the first time (or after a schema change)
+def _catalog(db_path=CATALOG_PATH, base_dir=BASE_DIR, build_if_empty=True):
+    conn = connect(db_path)
+    if db_path not in _initialised:
+        conn.execute('''CREATE TABLE IF NOT EXISTS chunks (
+            audio_filepath TEXT PRIMARY KEY,
+            video_id TEXT NOT NULL,
+            language TEXT NOT NULL,
+            duration REAL,
+            text TEXT,
+            lang_id TEXT)''')
+        conn.execute('CREATE INDEX IF NOT EXISTS chunks_language ON chunks (language, video_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS chunks_video ON chunks (video_id)')
+        conn.execute('''CREATE TABLE IF NOT EXISTS video_word_counts (
+            language TEXT NOT NULL,
+            video_id TEXT NOT NULL,
+            words TEXT NOT NULL,
+            stopwords TEXT NOT NULL,
+            PRIMARY KEY (language, video_id))''')
+        conn.execute('CREATE TABLE IF NOT EXISTS catalog_meta (key TEXT PRIMARY KEY, value TEXT)')
+        built = conn.execute("SELECT value FROM catalog_meta WHERE key = 'schema_version'").fetchone()
+        _initialised.add(db_path)
+        if (not built or int(built[0]) < CATALOG_SCHEMA_VERSION) and build_if_empty:
+            rebuild_catalog(base_dir, db_path)
+    return conn
+
+# Function to read the chunk rows of one video folder's metadata.json
+def _video_rows(base_dir, language, video_id):
+    metadata_path = os.path.join(base_dir, language, video_id, 'metadata.json')
+    rows = []
+    if os.path.exists(metadata_path):
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                rows.append((dataset_relative_path(data['audio_filepath']), video_id, language, data.get('duration'), data.get('text', ''), data.get('lang_id')))
+    return rows
+
+# Function to load a video's word counts, computing and saving them for videos that predate word_counts.json
+def _video_word_counts(base_dir, language, video_id, rows):
+    video_dir = os.path.join(base_dir, language, video_id)
+    counts = read_word_counts(video_dir)
+    if counts is None and rows:
+        try:
+            counts = write_word_counts(video_dir, [row[4] for row in rows], language)
+        except Exception as e:
+            print(f"An error occurred while counting words for {video_id}: {e}")
+    return counts
+
+# Function to replace a set of videos' rows inside an open transaction
+def _replace_videos(conn, base_dir, videos):
+    count = 0
+    for language, video_id in videos:
+        conn.execute('DELETE FROM chunks WHERE language = ? AND video_id = ?', (language, video_id))
+        conn.execute('DELETE FROM video_word_counts WHERE language = ? AND video_id = ?', (language, video_id))
+        rows = _video_rows(base_dir, language, video_id)
+        conn.executemany('INSERT OR REPLACE INTO chunks (audio_filepath, video_id, language, duration, text, lang_id) VALUES (?, ?, ?, ?, ?, ?)', rows)
+        counts = _video_word_counts(base_dir, language, video_id, rows)
+        if counts is not None:
+            conn.execute('INSERT INTO video_word_counts (language, video_id, words, stopwords) VALUES (?, ?, ?, ?)',
+                         (language, video_id, json.dumps(counts['words'], ensure_ascii=False),
+                          json.dumps(counts['stopwords'], ensure_ascii=False)))
+        count += len(rows)
+    return count
+
+# Function to bump the catalog version so caches keyed on it see the change
+def _bump_version(conn):
+    conn.execute("INSERT INTO catalog_meta (key, value) VALUES ('version', '1') "
+                 "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1")
+
+# Function to add (or refresh) committed videos in the catalog; called when transfer_data commits a job
+def add_videos(videos, base_dir=BASE_DIR, db_path=CATALOG_PATH):
+    conn = _catalog(db_path, base_dir)
+    with transaction(conn):
+        count = _replace_videos(conn, base_dir, videos)
+        _bump_version(conn)
+    print(f"Catalogued {count} chunks from {len(videos)} videos.")
+    return count
+
+# Function to rebuild the whole catalog by re-scanning every metadata.json under base_dir
+def rebuild_catalog(base_dir=BASE_DIR, db_path=CATALOG_PATH):
+    conn = _catalog(db_path, base_dir, build_if_empty=False)
+    videos = []
+    if os.path.exists(base_dir):
+        for language in sorted(os.listdir(base_dir)):
+            language_dir = os.path.join(base_dir, language)
+            if os.path.isdir(language_dir):
+                videos.extend((language, video_id) for video_id in sorted(os.listdir(language_dir))
+                              if os.path.isdir(os.path.join(language_dir, video_id)))
+    with transaction(conn):
+        conn.execute('DELETE FROM chunks')
+        conn.execute('DELETE FROM video_word_counts')
+        count = _replace_videos(conn, base_dir, videos)
+        conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('built_at', ?)", (str(time.time()),))
+        conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('schema_version', ?)", (str(CATALOG_SCHEMA_VERSION),))
+        _bump_version(conn)
+    print(f"Rebuilt catalog {db_path}: {count} chunks from {len(videos)} videos.")
+    return count
+
+# Function to list the languages that have catalogued chunks
+def list_languages(db_path=CATALOG_PATH):
+    return [row[0] for row in _catalog(db_path).execute('SELECT DISTINCT language FROM chunks ORDER BY language')]
+
+# Function to list the videos catalogued for a language
+def list_videos(language, db_path=CATALOG_PATH):
+    rows = _catalog(db_path).execute('SELECT DISTINCT video_id FROM chunks WHERE language = ? ORDER BY video_id', (language,))
+    return [row[0] for row in rows]
+
+# Function to fetch the transcript text of every chunk of a language, or of one video
+def fetch_texts(language, video_id=None, db_path=CATALOG_PATH):
+    conn = _catalog(db_path)
+    if video_id:
+        rows = conn.execute('SELECT text FROM chunks WHERE language = ? AND video_id = ?', (language, video_id))
+    else:
+        rows = conn.execute('SELECT text FROM chunks WHERE language = ?', (language,))
+    return [row[0] for row in rows]
+
+# Function to fetch the chunk rows of a language in dataset order, optionally limited to some videos
+def fetch_chunks(language, video_ids=None, db_path=CATALOG_PATH):
+    conn = _catalog(db_path)
+    rows = conn.execute('SELECT audio_filepath, video_id, duration, text, lang_id FROM chunks '
+                        'WHERE language = ? ORDER BY video_id, rowid', (language,))
+    wanted = set(video_ids) if video_ids else None
+    return [{'audio_filepath': row[0], 'video_id': row[1], 'duration': row[2], 'text': row[3], 'lang_id': row[4]}
+            for row in rows if wanted is None or row[1] in wanted]
+
+# Function to merge the precomputed per-video word and stopword counts of a language, or of one video
+def fetch_word_counts(language, video_id=None, db_path=CATALOG_PATH):
+    conn = _catalog(db_path)
+    if video_id:
+        rows = conn.execute('SELECT words, stopwords FROM video_word_counts WHERE language = ? AND video_id = ?', (language, video_id))
+    else:
+        # A fixed merge order keeps most_common() ties, and so the rendered charts, identical on every worker
+        rows = conn.execute('SELECT words, stopwords FROM video_word_counts WHERE language = ? ORDER BY video_id', (language,))
+    word_freq = Counter()
+    stopword_freq = Counter()
+    found = False
+    for words, stopwords in rows:
+        word_freq.update(json.loads(words))
+        stopword_freq.update(json.loads(stopwords))
+        found = True
+    return (word_freq, stopword_freq) if found else None
+
+# Function to read the catalog version (incremented on every commit or rebuild)
+def catalog_version(db_path=CATALOG_PATH):
+    row = _catalog(db_path).execute("SELECT value FROM catalog_meta WHERE key = 'version'").fetchone()
+    return int(row[0]) if row else 0
+
+
+# Rebuild from the command line: python -m backend.services.catalog_service rebuild [base_dir]
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("Usage: python -m backend.services.catalog_service rebuild [base_dir]")
+        sys.exit(1)
+    base_dir = sys.argv[2] if len(sys.argv) > 2 else BASE_DIR
+    rebuild_catalog(base_dir, os.path.join(base_dir, 'catalog.db'))
@@ -0,0 +1,62 @@
+import os
+import json
+import time
+import threading
+
+# Per-video checkpoints of a job, kept in its temp folder: how far each video got (pending -> downloaded ->
+# transcribed -> chunked) and, for a failed video, the stage and error. A resumed job continues from 'completed'.
+CHECKPOINT_FILE = 'checkpoints.json'
+CHECKPOINT_STAGES = ('pending', 'downloaded', 'transcribed', 'chunked')
+# The job's input links, saved so a resumed job does not need the original upload
+JOB_LINKS_FILE = 'links.txt'
+
+
+# Function to read a job folder's checkpoints ({video_id: checkpoint}); empty if the job has none yet
+def read_checkpoints(output_dir):
+    path = os.path.join(output_dir, CHECKPOINT_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Thread-safe checkpoint manifest of one job; every update is written to disk atomically
+class CheckpointManifest:
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, CHECKPOINT_FILE)
+        self.videos = read_checkpoints(output_dir)
+        self._lock = threading.Lock()
+
+    def get(self, video_id):
+        with self._lock:
+            checkpoint = self.videos.get(video_id)
+            return dict(checkpoint) if checkpoint else None
+
+    # Function to register a video the job is (re)starting; a known video restarts from its last completed stage
+    def start(self, video_id, link, order):
+        with self._lock:
+            checkpoint = self.videos.setdefault(video_id, {'completed': 'pending'})
+            checkpoint.update(link=link, order=order, state=checkpoint['completed'], failed_stage=None, error=None,
+                              updated_at=time.time())
+            self._write()
+            return dict(checkpoint)
+
+    # Function to record that a video finished a stage, with anything needed to resume after it
+    def complete(self, video_id, stage, **fields):
+        with self._lock:
+            checkpoint = self.videos[video_id]
+            checkpoint.update(fields, state=stage, completed=stage, updated_at=time.time())
+            self._write()
+
+    # Function to record that a video failed; its last completed stage is kept for resume
+    def fail(self, video_id, stage, error):
+        with self._lock:
+            checkpoint = self.videos.setdefault(video_id, {'completed': 'pending'})
+            checkpoint.update(state='failed', failed_stage=stage, error=error, updated_at=time.time())
+            self._write()
+
+    def _write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.videos, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -1,12 +1,26 @@
 import os
 import shutil
+import json
+from backend.services.transfer_service import rollback_transfer
+from backend.services.job_service import job_is_active
 
 # In deletion_service.py
 def delete_temp_files_folder(unique_id):
     temp_dir=f'temp_files_{unique_id}'
     try:
+        # Refuse to delete the folder of a job that is still running
+        job_file = os.path.join(temp_dir, 'job.json')
+        if os.path.exists(job_file):
+            with open(job_file, 'r', encoding='utf-8') as f:
+                job = json.load(f)
+            # A job whose worker died is interrupted, not running, and may be cleaned up
+            if job_is_active(job):
+                return {"status": "error", "message": f"Job {unique_id} is still {job['status']}."}
+
         # Check if temp_files directory exists
         if os.path.exists(temp_dir):
+            # Pull back any videos an interrupted transfer already renamed into audio_files, so none are left behind
+            rollback_transfer(unique_id)
             # Use shutil.rmtree to delete the directory and its contents
             shutil.rmtree(temp_dir)
             return {"status": "success", "message": f"Deleted the entire folder: {temp_dir}"}
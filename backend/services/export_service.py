@@ -0,0 +1,181 @@
+import os
+import re
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+import numpy as np
+from backend.services.catalog_service import BASE_DIR, fetch_chunks
+from backend.utils.audio_utils import SAMPLE_RATE, read_chunk
+
+# Training exports: each language (or filtered subset) is packed into shards of concatenated int16 PCM
+# with a JSON index of chunk offsets, so a training loader opens a handful of files instead of one per chunk
+EXPORT_DIR = os.environ.get("EXPORT_DIR", "exports")
+EXPORT_SHARD_BYTES = int(os.environ.get("EXPORT_SHARD_BYTES", str(256 * 1024 * 1024)))
+EXPORT_LOCK_STALE_SECONDS = int(os.environ.get("EXPORT_LOCK_STALE_SECONDS", "3600"))
+MANIFEST_FILE = 'manifest.json'
+# Export names become folder names under EXPORT_DIR, so only plain names are accepted
+EXPORT_NAME_PATTERN = re.compile(r'[A-Za-z0-9._-]+')
+
+_export_lock = threading.Lock()
+
+
+class ExportBusy(Exception):
+    pass
+
+
+# Function to hold an export's lock file so two workers never append shards to the same export at once
+@contextmanager
+def _locked(export_path):
+    lock_path = os.path.join(export_path, '.lock')
+    with _export_lock:
+        try:
+            # A lock left behind by a crashed export is taken over once it is old enough
+            if time.time() - os.path.getmtime(lock_path) > EXPORT_LOCK_STALE_SECONDS:
+                os.remove(lock_path)
+        except OSError:
+            pass
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            raise ExportBusy(f"Export {export_path} is already being written.")
+        try:
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            yield
+        finally:
+            os.remove(lock_path)
+
+# Function to write JSON atomically
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+# Function to read an export's manifest, or None if the export does not exist yet
+def read_export_manifest(export_path):
+    path = os.path.join(export_path, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# Function to resolve an export's folder, refusing names that are not a plain folder name inside export_dir
+def export_path_for(name, export_dir=EXPORT_DIR):
+    if not isinstance(name, str) or not EXPORT_NAME_PATTERN.fullmatch(name) or name in ('.', '..'):
+        raise ValueError(f"Invalid export name: {name!r}. Use letters, digits, '.', '_' and '-' only.")
+    root = os.path.realpath(export_dir)
+    export_path = os.path.realpath(os.path.join(root, name))
+    if os.path.dirname(export_path) != root:
+        raise ValueError(f"Invalid export name: {name!r}. Exports must stay inside {export_dir}.")
+    return export_path
+
+# Function to write one shard: the PCM first, then its index; the manifest only lists it once both exist
+def _write_shard(export_path, shard_name, base_dir, chunks):
+    pcm_path = os.path.join(export_path, f'{shard_name}.pcm')
+    index = []
+    offset = 0
+    with open(f'{pcm_path}.tmp', 'wb') as pcm_file:
+        for chunk in chunks:
+            samples = read_chunk(os.path.join(base_dir, chunk['audio_filepath']))
+            samples.tofile(pcm_file)
+            index.append(dict(chunk, offset=offset, num_samples=len(samples)))
+            offset += len(samples)
+    os.replace(f'{pcm_path}.tmp', pcm_path)
+    _write_json(os.path.join(export_path, f'{shard_name}.json'), index)
+    return {'name': shard_name, 'chunks': len(index), 'num_samples': offset,
+            'videos': sorted(set(chunk['video_id'] for chunk in index))}
+
+# Function to export a language (or a subset of its videos and chunk durations) into shards.
+# Exports are incremental: videos already in the manifest are skipped and new videos only ever go into new shards.
+def export_language(language, name=None, video_ids=None, min_duration=None, max_duration=None,
+                    base_dir=BASE_DIR, export_dir=EXPORT_DIR, shard_bytes=EXPORT_SHARD_BYTES):
+    name = name or language
+    export_path = export_path_for(name, export_dir)
+    os.makedirs(export_path, exist_ok=True)
+    filters = {'video_ids': sorted(video_ids) if video_ids else None,
+               'min_duration': min_duration, 'max_duration': max_duration}
+
+    with _locked(export_path):
+        manifest = read_export_manifest(export_path) or {
+            'name': name, 'language': language, 'sample_rate': SAMPLE_RATE, 'dtype': 'int16',
+            'filters': filters, 'shards': [], 'videos': [], 'created_at': time.time(),
+        }
+        if manifest['language'] != language or manifest['filters'] != filters:
+            raise ValueError(f"Export {name} was created for {manifest['language']} with filters {manifest['filters']}; "
+                             f"choose another name for a different subset.")
+
+        exported = set(manifest['videos'])
+        chunks = [chunk for chunk in fetch_chunks(language, video_ids)
+                  if chunk['video_id'] not in exported
+                  and (min_duration is None or chunk['duration'] >= min_duration)
+                  and (max_duration is None or chunk['duration'] <= max_duration)]
+
+        # Group chunks into shards by their estimated PCM size, keeping each video inside one shard
+        shard_chunks = []
+        shard_size = 0
+        new_shards = []
+        for index, chunk in enumerate(chunks):
+            shard_chunks.append(chunk)
+            shard_size += int(chunk['duration'] * SAMPLE_RATE) * 2
+            last_of_video = index + 1 == len(chunks) or chunks[index + 1]['video_id'] != chunk['video_id']
+            if last_of_video and (shard_size >= shard_bytes or index + 1 == len(chunks)):
+                shard_name = f"shard-{len(manifest['shards']) + len(new_shards):05d}"
+                new_shards.append(_write_shard(export_path, shard_name, base_dir, shard_chunks))
+                print(f"Wrote {shard_name} of export {name} with {len(shard_chunks)} chunks.")
+                shard_chunks = []
+                shard_size = 0
+
+        # Commit the new shards by listing them in the manifest
+        if new_shards:
+            manifest['shards'].extend(new_shards)
+            manifest['videos'] = sorted(exported.union(*(shard['videos'] for shard in new_shards)))
+            manifest['updated_at'] = time.time()
+            _write_json(os.path.join(export_path, MANIFEST_FILE), manifest)
+
+    return {'name': name, 'language': language, 'new_shards': [shard['name'] for shard in new_shards],
+            'new_chunks': sum(shard['chunks'] for shard in new_shards),
+            'shards': len(manifest['shards']), 'videos': len(manifest['videos'])}
+
+
+# Random access to an export's chunks; each chunk is a read-only np.memmap slice, so nothing is copied
+class ShardReader:
+    def __init__(self, export_path):
+        self.manifest = read_export_manifest(export_path)
+        if self.manifest is None:
+            raise FileNotFoundError(f"No export found at {export_path}")
+        self.export_path = export_path
+        self.sample_rate = self.manifest['sample_rate']
+        self._entries = []
+        for shard_number, shard in enumerate(self.manifest['shards']):
+            with open(os.path.join(export_path, f"{shard['name']}.json"), 'r', encoding='utf-8') as f:
+                self._entries.extend((shard_number, entry) for entry in json.load(f))
+        self._by_path = {entry['audio_filepath']: position for position, (_, entry) in enumerate(self._entries)}
+        self._maps = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _shard(self, shard_number):
+        if shard_number not in self._maps:
+            name = self.manifest['shards'][shard_number]['name']
+            self._maps[shard_number] = np.memmap(os.path.join(self.export_path, f'{name}.pcm'), dtype=np.int16, mode='r')
+        return self._maps[shard_number]
+
+    def __getitem__(self, position):
+        shard_number, entry = self._entries[position]
+        samples = self._shard(shard_number)[entry['offset']:entry['offset'] + entry['num_samples']]
+        return samples, entry
+
+    def chunk(self, audio_filepath):
+        return self[self._by_path[audio_filepath]]
+
+
+# Export from the command line: python -m backend.services.export_service export <language> [name]
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] != 'export':
+        print("Usage: python -m backend.services.export_service export <language> [name]")
+        sys.exit(1)
+    print(export_language(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None))
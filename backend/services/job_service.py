@@ -0,0 +1,240 @@
+import os
+import json
+import glob
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from backend.services.process_service import process_youtube_links
+from backend.services.checkpoint_service import JOB_LINKS_FILE
+from backend.services.metrics_service import add_gauge
+
+# Number of jobs that may run at once in this worker, and how many may wait behind them
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+MAX_PENDING_JOBS = int(os.environ.get("MAX_PENDING_JOBS", "32"))
+# A worker stamps its queued and running jobs every JOB_HEARTBEAT_SECONDS; a job whose worker process is gone,
+# or whose stamp is older than JOB_STALE_SECONDS, was interrupted and may be resumed, transferred or deleted
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", "30"))
+JOB_STALE_SECONDS = float(os.environ.get("JOB_STALE_SECONDS", "120"))
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_jobs = {}
+_jobs_lock = threading.Lock()
+_heartbeat = None
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobNotResumable(Exception):
+    pass
+
+
+# Function to get the path of a job's status file (kept in the job's temp folder so every worker can read it)
+def job_file_path(unique_id):
+    return os.path.join(f'temp_files_{unique_id}', 'job.json')
+
+# Function to get the path of a job's append-only progress event log
+def job_events_path(unique_id):
+    return os.path.join(f'temp_files_{unique_id}', 'events.jsonl')
+
+# Function to append one timestamped event to a job's event log (called with _jobs_lock held)
+def _append_event(unique_id, event):
+    event['ts'] = time.time()
+    with open(job_events_path(unique_id), 'a', encoding='utf-8') as f:
+        f.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+# Function to persist a job's status atomically
+def _write_job(job):
+    path = job_file_path(job['unique_id'])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+# Function to check whether a process on this host is still running
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+# Function to check whether a queued or running job still has a live worker behind it
+def job_is_active(job):
+    if job.get('status') not in ('queued', 'running'):
+        return False
+    owner_pid, heartbeat_at = job.get('owner_pid'), job.get('heartbeat_at')
+    if owner_pid is None or heartbeat_at is None:
+        return False
+    return _process_alive(owner_pid) and time.time() - heartbeat_at < JOB_STALE_SECONDS
+
+# Function run by the heartbeat thread: stamp every job this worker holds so other workers can tell it is alive
+def _stamp_jobs():
+    while True:
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+        with _jobs_lock:
+            for job in _jobs.values():
+                try:
+                    job['heartbeat_at'] = time.time()
+                    _write_job(job)
+                except Exception as e:
+                    print(f"An error occurred while stamping job {job['unique_id']}: {e}")
+
+# Function to make this worker the owner of a job (called with _jobs_lock held) and start the heartbeat once per process
+def _take_ownership(job):
+    global _heartbeat
+    job.update(owner_pid=os.getpid(), heartbeat_at=time.time())
+    if _heartbeat is None:
+        _heartbeat = threading.Thread(target=_stamp_jobs, name="job-heartbeat", daemon=True)
+        _heartbeat.start()
+
+# Function to apply an update to a job and persist it
+def _update_job(unique_id, **fields):
+    with _jobs_lock:
+        job = _jobs[unique_id]
+        job.update(fields)
+        _write_job(job)
+        if 'status' in fields:
+            _append_event(unique_id, {'type': 'job', 'status': job['status'], 'message': job['message']})
+
+# Function to record per-video progress reported by process_youtube_links
+def _video_progress(unique_id, video_id, status, **details):
+    with _jobs_lock:
+        job = _jobs[unique_id]
+        video = job['videos'].setdefault(video_id, {})
+        video.update(details)
+        video['status'] = status
+        video['updated_at'] = time.time()
+        _write_job(job)
+        _append_event(unique_id, dict(details, type='video', video_id=video_id, stage=status))
+
+# Function that runs a job on the worker pool
+def _run_job(unique_id, file_path, language, codec, bitrate, asr):
+    add_gauge('audio_generator_queue_depth', -1, queue='jobs')
+    _update_job(unique_id, status='running', started_at=time.time())
+    try:
+        result, status_code = process_youtube_links(
+            file_path, language, unique_id=unique_id,
+            progress=lambda video_id, status, **details: _video_progress(unique_id, video_id, status, **details),
+            codec=codec, bitrate=bitrate, asr=asr
+        )
+        if status_code == 200:
+            _update_job(unique_id, status='completed', result=result, finished_at=time.time())
+        else:
+            _update_job(unique_id, status='failed', message=result.get('message', 'Failed to process the file.'),
+                        finished_at=time.time())
+    except Exception as e:
+        print(f"An error occurred while running job {unique_id}: {e}")
+        _update_job(unique_id, status='failed', message=str(e), finished_at=time.time())
+    finally:
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+        with _jobs_lock:
+            _jobs.pop(unique_id, None)
+
+# Function to enqueue a processing job and return immediately
+def submit_job(unique_id, file_path, language, codec='wav', bitrate=None, asr=None):
+    with _jobs_lock:
+        pending = sum(1 for job in _jobs.values() if job['status'] in ('queued', 'running'))
+        if pending >= JOB_WORKERS + MAX_PENDING_JOBS:
+            raise JobQueueFull(f"Too many jobs in progress ({pending}). Please try again later.")
+        job = {
+            'unique_id': unique_id,
+            'language': language,
+            'codec': codec,
+            'bitrate': bitrate,
+            'asr': asr,
+            'status': 'queued',
+            'message': None,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'videos': {},
+            'result': None,
+        }
+        _take_ownership(job)
+        _jobs[unique_id] = job
+        _write_job(job)
+        _append_event(unique_id, {'type': 'job', 'status': 'queued', 'message': None})
+
+    add_gauge('audio_generator_queue_depth', 1, queue='jobs')
+    _executor.submit(_run_job, unique_id, file_path, language, codec, bitrate, asr)
+    return job
+
+# Function to queue a finished, failed or interrupted job again; it reuses the job's saved links and per-video
+# checkpoints, so only the videos that failed or never finished are worked on
+def resume_job(unique_id):
+    job = get_job(unique_id)
+    if job is None:
+        return None
+    with _jobs_lock:
+        if unique_id in _jobs or job_is_active(job):
+            raise JobNotResumable(f"Job {unique_id} is still {job['status']}.")
+        if not os.path.exists(os.path.join(f'temp_files_{unique_id}', JOB_LINKS_FILE)):
+            raise JobNotResumable(f"Job {unique_id} has no saved links to resume from.")
+        pending = sum(1 for queued in _jobs.values() if queued['status'] in ('queued', 'running'))
+        if pending >= JOB_WORKERS + MAX_PENDING_JOBS:
+            raise JobQueueFull(f"Too many jobs in progress ({pending}). Please try again later.")
+        job.update(status='queued', message=None, started_at=None, finished_at=None, result=None,
+                   resumes=job.get('resumes', 0) + 1)
+        _take_ownership(job)
+        _jobs[unique_id] = job
+        _write_job(job)
+        _append_event(unique_id, {'type': 'job', 'status': 'queued', 'message': None, 'resumed': True})
+
+    add_gauge('audio_generator_queue_depth', 1, queue='jobs')
+    _executor.submit(_run_job, unique_id, None, job['language'], job['codec'], job['bitrate'], job['asr'])
+    return job
+
+# Function to report a queued or running job whose worker has died as interrupted
+def _with_liveness(job):
+    if job['status'] in ('queued', 'running') and not job_is_active(job):
+        job.update(status='interrupted', message=f"The worker running this job stopped while it was {job['status']}.")
+    return job
+
+# Function to read a job's status from disk
+def get_job(unique_id):
+    path = job_file_path(unique_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return _with_liveness(json.load(f))
+
+# Function to read a job's events after byte `offset` of its log; returns (event id, event) pairs.
+# An event's id is the byte offset just past it, so a poll seeks straight to where the previous one stopped.
+def read_events(unique_id, offset=0):
+    path = job_events_path(unique_id)
+    if not os.path.exists(path):
+        return []
+    events = []
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # A writer is still appending this line; pick it up on the next read
+            offset += len(line)
+            events.append((offset, json.loads(line)))
+    return events
+
+# Function to list every job that still has a temp folder
+def list_jobs():
+    jobs = []
+    for path in glob.glob(os.path.join('temp_files_*', 'job.json')):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                job = _with_liveness(json.load(f))
+        except (OSError, ValueError):
+            continue
+        jobs.append({
+            'unique_id': job['unique_id'],
+            'language': job['language'],
+            'status': job['status'],
+            'created_at': job['created_at'],
+            'finished_at': job['finished_at'],
+            'videos': len(job['videos']),
+        })
+    return sorted(jobs, key=lambda job: job['created_at'], reverse=True)
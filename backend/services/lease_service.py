@@ -0,0 +1,109 @@
+import os
+import time
+import threading
+from backend.utils.db_utils import connect, transaction
+
+# Cross-worker leases on (video ID, language): while one job downloads and transcribes a video, another job
+# that reaches the same video waits for it and then reuses its cached audio and transcript instead of redoing them.
+# A lease is renewed by a heartbeat thread in the process that holds it; if that process dies, the lease expires and is reclaimed.
+LEASE_DB_PATH = os.environ.get("LEASE_DB_PATH", os.path.join('audio_files', 'video_leases.db'))
+LEASE_SECONDS = float(os.environ.get("LEASE_SECONDS", "120"))
+LEASE_POLL_SECONDS = 1.0
+
+_initialised = set()
+_held = {}  # (video_id, language, db_path) -> owner, for the heartbeat
+_held_lock = threading.Lock()
+_heartbeat = None
+
+
+# Function to open the lease table, creating it the first time
+def _leases(db_path=LEASE_DB_PATH):
+    conn = connect(db_path)
+    if db_path not in _initialised:
+        conn.execute('''CREATE TABLE IF NOT EXISTS video_leases (
+            video_id TEXT NOT NULL,
+            language TEXT NOT NULL,
+            owner TEXT NOT NULL,
+            acquired_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (video_id, language))''')
+        conn.execute('CREATE INDEX IF NOT EXISTS video_leases_owner ON video_leases (owner)')
+        _initialised.add(db_path)
+    return conn
+
+# Function run by the heartbeat thread: extend every lease this process holds well before it expires
+def _renew_held():
+    while True:
+        time.sleep(LEASE_SECONDS / 3)
+        with _held_lock:
+            held = list(_held.items())
+        for (video_id, language, db_path), owner in held:
+            try:
+                conn = _leases(db_path)
+                conn.execute('UPDATE video_leases SET expires_at = ? WHERE video_id = ? AND language = ? AND owner = ?',
+                             (time.time() + LEASE_SECONDS, video_id, language, owner))
+            except Exception as e:
+                print(f"An error occurred while renewing the lease on {video_id} ({language}): {e}")
+
+# Function to start the heartbeat thread once per process
+def _ensure_heartbeat():
+    global _heartbeat
+    with _held_lock:
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(target=_renew_held, name="lease-heartbeat", daemon=True)
+            _heartbeat.start()
+
+# Function to try to take the lease once; returns None on success or the current holder's row
+def try_acquire_lease(video_id, language, owner, db_path=LEASE_DB_PATH):
+    conn = _leases(db_path)
+    now = time.time()
+    with transaction(conn):
+        row = conn.execute('SELECT owner, acquired_at, expires_at FROM video_leases WHERE video_id = ? AND language = ?',
+                           (video_id, language)).fetchone()
+        if row is not None and row[0] != owner and row[2] > now:
+            return {'owner': row[0], 'acquired_at': row[1], 'expires_at': row[2]}
+        if row is not None and row[0] != owner:
+            print(f"Reclaiming expired lease on {video_id} ({language}) from {row[0]}")
+        conn.execute('INSERT OR REPLACE INTO video_leases (video_id, language, owner, acquired_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                     (video_id, language, owner, now, now + LEASE_SECONDS))
+    _ensure_heartbeat()
+    with _held_lock:
+        _held[(video_id, language, db_path)] = owner
+    return None
+
+# Function to take the lease on a video, waiting while another live owner holds it.
+# on_wait(holder) is called once when the wait starts; returns True if this call had to wait.
+def acquire_lease(video_id, language, owner, on_wait=None, db_path=LEASE_DB_PATH):
+    waited = False
+    while True:
+        holder = try_acquire_lease(video_id, language, owner, db_path)
+        if holder is None:
+            return waited
+        if not waited:
+            print(f"Video {video_id} ({language}) is being processed by {holder['owner']}; waiting for it")
+            if on_wait:
+                on_wait(holder)
+            waited = True
+        time.sleep(LEASE_POLL_SECONDS)
+
+# Function to give up a lease (a no-op if it has been reclaimed by someone else)
+def release_lease(video_id, language, owner, db_path=LEASE_DB_PATH):
+    with _held_lock:
+        _held.pop((video_id, language, db_path), None)
+    _leases(db_path).execute('DELETE FROM video_leases WHERE video_id = ? AND language = ? AND owner = ?',
+                             (video_id, language, owner))
+
+# Function to give up every lease an owner still holds, e.g. for videos a failed job never finished
+def release_owner_leases(owner, db_path=LEASE_DB_PATH):
+    with _held_lock:
+        for key in [key for key, held_by in _held.items() if held_by == owner and key[2] == db_path]:
+            del _held[key]
+    _leases(db_path).execute('DELETE FROM video_leases WHERE owner = ?', (owner,))
+
+# Function to list the leases currently held, live or expired
+def list_leases(db_path=LEASE_DB_PATH):
+    now = time.time()
+    rows = _leases(db_path).execute('SELECT video_id, language, owner, acquired_at, expires_at FROM video_leases ORDER BY acquired_at')
+    return [{'video_id': video_id, 'language': language, 'owner': owner, 'acquired_at': acquired_at,
+             'expires_at': expires_at, 'expired': expires_at <= now}
+            for video_id, language, owner, acquired_at, expires_at in rows]
@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from backend.utils.db_utils import connect, transaction
+
+# Prometheus metrics for the processing stages. Each process keeps its own values and flushes them to
+# METRICS_DIR/<pid>-<process start>.json every few seconds; /metrics merges the files, so every uvicorn worker (and the
+# transcription worker processes) is counted whichever worker serves the scrape. When a process is gone its gauges
+# are dropped, its counters and histograms are folded into the retired table, and its file is deleted.
+METRICS_DIR = os.environ.get("METRICS_DIR", "metrics")
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", "5"))
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+REAL_TIME_FACTOR_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'audio_generator_stage_seconds': ('histogram', 'Wall-clock seconds spent in a processing stage', STAGE_BUCKETS),
+    'audio_generator_real_time_factor': ('histogram', 'Seconds of audio processed per wall-clock second', REAL_TIME_FACTOR_BUCKETS),
+    'audio_generator_audio_seconds_total': ('counter', 'Seconds of audio processed by a stage', None),
+    'audio_generator_bytes_written_total': ('counter', 'Bytes written to disk by a stage', None),
+    'audio_generator_queue_depth': ('gauge', 'Items waiting in or being handled by a queue', None),
+}
+
+_values = {}  # (name, sorted label pairs) -> number, or {'buckets': [...], 'sum': s, 'count': n} for histograms
+_lock = threading.Lock()
+_dirty = False
+_flusher = None
+_snapshot_names = {}  # pid -> snapshot file name, so a forked child does not write to its parent's file
+
+
+# Function to get a process's start time, which together with its PID identifies it even after the PID is reused.
+# On Linux this is the start time in clock ticks from /proc; None if the process does not exist.
+def _process_start(pid):
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            return f.read().rsplit(')', 1)[1].split()[19]
+    except (OSError, IndexError):
+        return None
+
+# Function to get this process's snapshot file name
+def _snapshot_name():
+    pid = os.getpid()
+    if pid not in _snapshot_names:
+        start = _process_start(pid) or str(int(time.time() * 1000))
+        _snapshot_names[pid] = f'{pid}-{start}.json'
+    return _snapshot_names[pid]
+
+# Function to write this process's values to its snapshot file
+def flush_metrics():
+    global _dirty
+    with _lock:
+        snapshot = [{'name': name, 'labels': dict(labels), 'value': value} for (name, labels), value in _values.items()]
+        _dirty = False
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, _snapshot_name())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+# Function run by the flusher thread
+def _flush_periodically():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        if _dirty:
+            try:
+                flush_metrics()
+            except Exception as e:
+                print(f"An error occurred while flushing metrics: {e}")
+
+# Function to apply an update to one metric value and start the flusher thread once per process
+def _update(name, labels, apply):
+    global _dirty, _flusher
+    key = (name, tuple(sorted((label, str(value)) for label, value in labels.items())))
+    with _lock:
+        _values[key] = apply(_values.get(key))
+        _dirty = True
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_periodically, name="metrics-flush", daemon=True)
+            _flusher.start()
+
+# Function to record one observation in a histogram
+def observe(name, value, **labels):
+    buckets = METRICS[name][2]
+    def apply(current):
+        current = current or {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+        for index, bound in enumerate(buckets):
+            if value <= bound:
+                current['buckets'][index] += 1
+        current['sum'] += value
+        current['count'] += 1
+        return current
+    _update(name, labels, apply)
+
+# Function to add to a counter
+def increment(name, amount=1, **labels):
+    _update(name, labels, lambda current: (current or 0) + amount)
+
+# Function to move a gauge up or down (e.g. +1 when an item is queued, -1 when it is taken)
+def add_gauge(name, delta, **labels):
+    _update(name, labels, lambda current: (current or 0) + delta)
+
+# Function to time a stage; the caller may set record['audio_seconds'] and record['bytes'] inside the block.
+# Failed stages are not recorded, so the histograms describe completed work.
+@contextmanager
+def timed(stage, language='', asr_model=''):
+    record = {}
+    start = time.perf_counter()
+    yield record
+    seconds = time.perf_counter() - start
+    labels = {'stage': stage, 'language': language or '', 'asr_model': asr_model or ''}
+    observe('audio_generator_stage_seconds', seconds, **labels)
+    if record.get('audio_seconds'):
+        increment('audio_generator_audio_seconds_total', record['audio_seconds'], **labels)
+        if seconds > 0:
+            observe('audio_generator_real_time_factor', record['audio_seconds'] / seconds, **labels)
+    if record.get('bytes'):
+        increment('audio_generator_bytes_written_total', record['bytes'], **labels)
+
+# Function to turn an ASR spec dict into the asr_model label
+def asr_label(asr):
+    return f"{asr['backend']}:{asr['model_size']}" if asr else ''
+
+# Function to check whether the process that wrote a snapshot is still running (and is not a newer process with its PID)
+def _alive(pid, start):
+    if os.path.isdir('/proc'):
+        return _process_start(pid) == start
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+# Function to open the table of values left by processes that have exited, creating it the first time
+def _retired():
+    conn = connect(os.path.join(METRICS_DIR, 'retired.db'))
+    conn.execute('CREATE TABLE IF NOT EXISTS retired_metrics (name TEXT NOT NULL, labels TEXT NOT NULL, value TEXT NOT NULL, '
+                 'PRIMARY KEY (name, labels))')
+    return conn
+
+# Function to add one value into a merged set (histograms bucket by bucket)
+def _add_value(merged, key, value):
+    if isinstance(value, dict):
+        current = merged.setdefault(key, {'buckets': [0] * len(value['buckets']), 'sum': 0.0, 'count': 0})
+        current['buckets'] = [a + b for a, b in zip(current['buckets'], value['buckets'])]
+        current['sum'] += value['sum']
+        current['count'] += value['count']
+    else:
+        merged[key] = merged.get(key, 0) + value
+
+# Function to merge every process's snapshot into one set of values. Snapshots of exited processes are folded
+# into the retired table and deleted; the whole merge is one transaction so no scrape counts a snapshot twice.
+def _merged_values():
+    flush_metrics()
+    conn = _retired()
+    merged = {}
+    with transaction(conn):
+        retired = {}
+        for name, labels, value in conn.execute('SELECT name, labels, value FROM retired_metrics'):
+            retired[(name, tuple(tuple(pair) for pair in json.loads(labels)))] = json.loads(value)
+        dead_files = []
+        for file_name in os.listdir(METRICS_DIR):
+            pid, _, start = file_name[:-len('.json')].partition('-')
+            if not file_name.endswith('.json') or not pid.isdigit() or not start:
+                continue
+            path = os.path.join(METRICS_DIR, file_name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            alive = _alive(int(pid), start)
+            for entry in snapshot:
+                if entry['name'] not in METRICS:
+                    continue
+                key = (entry['name'], tuple(sorted(entry['labels'].items())))
+                if alive:
+                    _add_value(merged, key, entry['value'])
+                elif METRICS[entry['name']][0] != 'gauge':
+                    _add_value(retired, key, entry['value'])
+            if not alive:
+                dead_files.append(path)
+        if dead_files:
+            conn.executemany('INSERT OR REPLACE INTO retired_metrics (name, labels, value) VALUES (?, ?, ?)',
+                             [(name, json.dumps(labels), json.dumps(value)) for (name, labels), value in retired.items()])
+            # Deleted before the commit: a crash in between loses the retired values rather than counting them twice
+            for path in dead_files:
+                os.remove(path)
+    for key, value in retired.items():
+        _add_value(merged, key, value)
+    return merged
+
+# Function to format label pairs for the exposition format
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(labels, escaped)) + '}'
+
+# Function to render all metrics in the Prometheus text exposition format (version 0.0.4)
+def render_metrics():
+    merged = _merged_values()
+    lines = []
+    for name, (metric_type, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for (metric_name, labels), value in sorted(merged.items()):
+            if metric_name != name:
+                continue
+            if metric_type != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            for bound, count in zip(buckets, value['buckets']):
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", str(bound)),))} {count}')
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {value["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {value["sum"]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
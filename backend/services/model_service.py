@@ -0,0 +1,214 @@
+import os
+import time
+import threading
+import importlib
+from contextlib import contextmanager
+from collections import OrderedDict
+import numpy as np
+import whisper
+from backend.services.metrics_service import observe
+
+# Defaults can be overridden per deployment through environment variables
+DEFAULT_MODEL_SIZE = os.environ.get("WHISPER_MODEL_SIZE", "base")
+DEFAULT_DEVICE = os.environ.get("WHISPER_DEVICE", "cpu")
+DEFAULT_PRECISION = os.environ.get("WHISPER_PRECISION", "fp32")
+MAX_RESIDENT_MODELS = int(os.environ.get("WHISPER_MAX_RESIDENT_MODELS", "1"))
+WARMUP_MODELS = [size.strip() for size in os.environ.get("WHISPER_WARMUP_MODELS", DEFAULT_MODEL_SIZE).split(",") if size.strip()]
+
+# Process-wide registry: (engine, model size, device, precision, threads) -> model entry, kept in LRU order
+_models = OrderedDict()
+_models_lock = threading.Lock()
+_key_locks = {}
+
+# whisper.transcribe reports its progress through a tqdm bar over mel frames. While a WhisperBackend transcribes,
+# the bar is replaced by one that forwards (frames done, total frames) to a callback registered for the calling thread.
+_progress_local = threading.local()
+_progress_bar_lock = threading.Lock()
+_progress_bar_users = 0
+_original_tqdm = None
+
+
+class _TranscriptionProgressBar:
+    def __init__(self, total=None, **kwargs):
+        self.total = total
+        self.n = 0
+        self.callback = getattr(_progress_local, 'callback', None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def update(self, n=1):
+        self.n += n
+        if self.callback and self.total:
+            self.callback(min(self.n, self.total) / whisper.audio.FRAMES_PER_SECOND, self.total / whisper.audio.FRAMES_PER_SECOND)
+
+
+class _TqdmShim:
+    tqdm = _TranscriptionProgressBar
+
+
+# Function to install the progress bar for the duration of a transcription; the original tqdm is put back when the
+# last concurrent transcription ends. A whisper release without the tqdm attribute transcribes without progress.
+@contextmanager
+def whisper_progress_bar():
+    global _progress_bar_users, _original_tqdm
+    module = importlib.import_module('whisper.transcribe')
+    if not hasattr(module, 'tqdm'):
+        yield
+        return
+    with _progress_bar_lock:
+        if _progress_bar_users == 0:
+            _original_tqdm = module.tqdm
+            module.tqdm = _TqdmShim
+        _progress_bar_users += 1
+    try:
+        yield
+    finally:
+        with _progress_bar_lock:
+            _progress_bar_users -= 1
+            if _progress_bar_users == 0:
+                module.tqdm = _original_tqdm
+
+# Function for engines without a tqdm bar to report (seconds transcribed, total seconds) to the current thread's callback
+def report_transcription_progress(seconds_done, seconds_total):
+    callback = getattr(_progress_local, 'callback', None)
+    if callback and seconds_total:
+        callback(min(seconds_done, seconds_total), seconds_total)
+
+# Function to receive (seconds transcribed, total seconds) updates while the current thread runs model.transcribe
+@contextmanager
+def transcription_progress(callback):
+    previous = getattr(_progress_local, 'callback', None)
+    _progress_local.callback = callback
+    try:
+        yield
+    finally:
+        _progress_local.callback = previous
+
+# Function to estimate how many bytes a model's weights and buffers occupy
+def _model_nbytes(model):
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        return 0
+
+# Function to read the resident set size of the current process
+def process_rss_bytes():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except Exception:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+# Function to load a model the first time it is requested in this process
+def _load(engine, model_size, device, precision, threads):
+    start = time.perf_counter()
+    if engine == 'faster-whisper':
+        # Optional dependency: CTranslate2 build of Whisper with int8 CPU kernels
+        from faster_whisper import WhisperModel
+        model = WhisperModel(model_size, device=device, compute_type=precision, cpu_threads=threads or 0)
+    else:
+        model = whisper.load_model(model_size, device=device)
+        if precision == "fp16" and device != "cpu":
+            model = model.half()
+    load_seconds = time.perf_counter() - start
+    observe('audio_generator_stage_seconds', load_seconds, stage='model_load', language='', asr_model=f'{engine}:{model_size}')
+    print(f"Loaded {engine} model '{model_size}' on {device} ({precision}) in {load_seconds:.2f}s")
+    return {
+        'model': model,
+        'load_seconds': load_seconds,
+        'nbytes': _model_nbytes(model),
+        'loaded_at': time.time(),
+        'hits': 0,
+        # Whisper keeps its KV cache in forward hooks installed on the model's decoder modules, so two
+        # transcriptions on one model at once would overwrite each other's cache; this lock serializes them
+        'lock': threading.Lock(),
+    }
+
+# Function to get a model's registry entry, loading the model once per process
+def _get_entry(model_size=None, device=None, precision=None, engine='whisper', threads=None):
+    key = (engine, model_size or DEFAULT_MODEL_SIZE, device or DEFAULT_DEVICE, precision or DEFAULT_PRECISION, threads)
+
+    with _models_lock:
+        entry = _models.get(key)
+        if entry is not None:
+            _models.move_to_end(key)
+            entry['hits'] += 1
+            return entry
+        # A key's load lock only lives while someone is loading or waiting for that key, so the table stays small
+        key_lock = _key_locks.setdefault(key, {'lock': threading.Lock(), 'users': 0})
+        key_lock['users'] += 1
+
+    # Load outside the registry lock so other sizes stay available, but only once per key
+    try:
+        with key_lock['lock']:
+            with _models_lock:
+                entry = _models.get(key)
+                if entry is not None:
+                    _models.move_to_end(key)
+                    entry['hits'] += 1
+                    return entry
+
+            entry = _load(*key)
+
+            with _models_lock:
+                _models[key] = entry
+                # Evict the least recently used models beyond the configured cap
+                while len(_models) > max(MAX_RESIDENT_MODELS, 1):
+                    evicted_key, _ = _models.popitem(last=False)
+                    print(f"Evicted model {evicted_key} from the registry")
+            return entry
+    finally:
+        with _models_lock:
+            key_lock['users'] -= 1
+            if key_lock['users'] == 0:
+                del _key_locks[key]
+
+# Function to get a model from the registry, loading it once per process
+def get_model(model_size=None, device=None, precision=None, engine='whisper', threads=None):
+    return _get_entry(model_size, device, precision, engine, threads)['model']
+
+# Function to use a registry model exclusively: callers of the same model wait for each other,
+# so concurrent transcriptions in one process are serialized per model (other models still run in parallel)
+@contextmanager
+def exclusive_model(model_size=None, device=None, precision=None, engine='whisper', threads=None):
+    entry = _get_entry(model_size, device, precision, engine, threads)
+    with entry['lock']:
+        yield entry['model']
+
+# Function to load (and exercise once) the configured models at startup
+def warm_up(model_sizes=None, device=None, precision=None):
+    for model_size in model_sizes or WARMUP_MODELS:
+        try:
+            with exclusive_model(model_size, device, precision) as model:
+                # Run one short decode so the first real request doesn't pay for lazy initialisation
+                silence = np.zeros(whisper.audio.SAMPLE_RATE, dtype=np.float32)
+                model.transcribe(silence, fp16=(precision or DEFAULT_PRECISION) == "fp16", language='en')
+        except Exception as e:
+            print(f"An error occurred while warming up Whisper model '{model_size}': {e}")
+
+# Function to report what is resident in the registry
+def registry_stats():
+    with _models_lock:
+        models = [{
+            'engine': key[0],
+            'model_size': key[1],
+            'device': key[2],
+            'precision': key[3],
+            'threads': key[4],
+            'load_seconds': round(entry['load_seconds'], 3),
+            'nbytes': entry['nbytes'],
+            'hits': entry['hits'],
+            'loaded_at': entry['loaded_at'],
+        } for key, entry in _models.items()]
+    return {
+        'max_resident_models': MAX_RESIDENT_MODELS,
+        'models': models,
+        'model_bytes': sum(m['nbytes'] for m in models),
+        'process_rss_bytes': process_rss_bytes(),
+    }
@@ -0,0 +1,90 @@
+import queue
+import threading
+from backend.services.metrics_service import add_gauge
+
+# Marker that tells a stage worker there is nothing more to consume
+_DONE = object()
+
+
+class PipelineStage:
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(int(workers), 1)
+
+
+# Function to run items through a chain of stages connected by bounded queues.
+# Each stage has its own worker threads, so while one item is in stage N the
+# next one can already be in stage N-1. A stage function returns the item to
+# pass downstream, None to drop it, or raises to record a failure.
+def run_pipeline(items, stages, queue_size=2, stop_on_error=True):
+    queues = [queue.Queue(maxsize=max(queue_size, 1)) for _ in stages]
+    remaining = [stage.workers for stage in stages]
+    completed = []
+    failures = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def record_failure(stage_name, item, error):
+        print(f"Pipeline stage '{stage_name}' failed: {error}")
+        with lock:
+            failures.append({'stage': stage_name, 'item': item, 'error': str(error)})
+        if stop_on_error:
+            stop.set()
+
+    def feed():
+        try:
+            for item in items:
+                if stop.is_set():
+                    break
+                queues[0].put(item)
+                add_gauge('audio_generator_queue_depth', 1, queue=stages[0].name)
+        except Exception as e:
+            record_failure('input', None, e)
+        finally:
+            for _ in range(stages[0].workers):
+                queues[0].put(_DONE)
+
+    def work(index):
+        stage = stages[index]
+        inbox = queues[index]
+        outbox = queues[index + 1] if index + 1 < len(stages) else None
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            add_gauge('audio_generator_queue_depth', -1, queue=stage.name)
+            if stop.is_set():
+                continue  # Keep draining so upstream stages never block on a full queue
+            try:
+                result = stage.func(item)
+            except Exception as e:
+                record_failure(stage.name, item, e)
+                continue
+            if result is None:
+                continue
+            if outbox is not None:
+                outbox.put(result)
+                add_gauge('audio_generator_queue_depth', 1, queue=stages[index + 1].name)
+            else:
+                with lock:
+                    completed.append(result)
+
+        # The last worker of a stage closes the next stage's queue
+        with lock:
+            remaining[index] -= 1
+            last_worker = remaining[index] == 0
+        if last_worker and outbox is not None:
+            for _ in range(stages[index + 1].workers):
+                outbox.put(_DONE)
+
+    threads = [threading.Thread(target=feed, name="pipeline-feed", daemon=True)]
+    for index, stage in enumerate(stages):
+        for n in range(stage.workers):
+            threads.append(threading.Thread(target=work, args=(index,), name=f"pipeline-{stage.name}-{n}", daemon=True))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return completed, failures
@@ -1,15 +1,28 @@
 import os
-import random
-import subprocess
-from pydub import AudioSegment
 import yt_dlp
-import whisper
 import json
 import uuid
-from backend.utils.utils import format_timestamp, append_srt_chunk, save_srt_chunk, convert_srt_time_to_seconds, mark_link_as_processed, is_link_processed, extract_video_id
-
-# Function to download video and convert to wav with 16000 Hz and mono
-def download_and_convert_to_wav(youtube_url, output_dir):
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from backend.services.pipeline_service import PipelineStage, run_pipeline
+from backend.services.asr_service import get_backend, LANGUAGE_CODES
+from backend.services.transcription_service import plan_windows, transcribe_windows, transcription_settings
+from backend.services.audio_cache_service import get_cached_audio
+from backend.services.lease_service import acquire_lease, release_lease, release_owner_leases
+from backend.services.checkpoint_service import CheckpointManifest, JOB_LINKS_FILE
+from backend.services.metrics_service import timed, asr_label
+from backend.services.transcript_cache_service import transcript_key, get_transcript, put_transcript
+from backend.utils.audio_utils import decode_to_wav, encode_chunk, pcm_sha256, WavReader, CHUNK_CODECS, SAMPLE_RATE
+from backend.utils.chunk_utils import plan_chunks
+from backend.utils.processed_index import filter_processed
+from backend.utils.text_utils import write_word_counts
+from backend.utils.utils import save_srt_chunk, parse_srt_file, mark_link_as_processed, extract_video_id
+
+# Function to download video and convert to wav with 16000 Hz and mono (language only labels the stage metrics)
+def download_and_convert_to_wav(youtube_url, output_dir, progress=None, language=''):
+    progress = progress or (lambda status, **details: None)
     try:
         print(f"Downloading: {youtube_url}")
 
@@ -18,33 +31,39 @@ def download_and_convert_to_wav(youtube_url, output_dir):
         if not video_id:
             return None
 
-        # Set up yt-dlp options to download audio only
+        # Report downloaded bytes at most once per second
+        last_report = [0.0]
+        def download_hook(d):
+            if d.get('status') == 'downloading' and time.monotonic() - last_report[0] >= 1:
+                last_report[0] = time.monotonic()
+                progress('downloading', downloaded_bytes=d.get('downloaded_bytes'),
+                         total_bytes=d.get('total_bytes') or d.get('total_bytes_estimate'))
+
+        # Set up yt-dlp options to download the audio stream as-is; decoding happens in one ffmpeg pass below
         ydl_opts = {
             'format': 'bestaudio/best',
             'outtmpl': os.path.join(output_dir, f'{video_id}.%(ext)s'),
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'wav',
-                'preferredquality': '192',
-            }]
+            'progress_hooks': [download_hook],
         }
 
-        # Download and extract audio using yt-dlp
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            ydl.download([youtube_url])
-
-        # Locate the downloaded file
-        downloaded_file = [f for f in os.listdir(output_dir) if f.endswith('.wav')][-1]
-        wav_file_path = os.path.join(output_dir, downloaded_file)
-
-        # Convert to mono and 16000 Hz using ffmpeg
-        final_wav_file_path = wav_file_path.replace('.wav', '_mono_16000.wav')
-        subprocess.run([
-            'ffmpeg', '-i', wav_file_path, '-ac', '1', '-ar', '16000', final_wav_file_path
-        ], check=True)
+        # Download the audio using yt-dlp and take the path it reports for this video
+        with timed('download', language) as record, yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(youtube_url, download=True)
+            requested_downloads = info.get('requested_downloads') or []
+            downloaded_file_path = requested_downloads[0]['filepath'] if requested_downloads else ydl.prepare_filename(info)
+            record['bytes'] = os.path.getsize(downloaded_file_path)
+
+        # Resample and downmix straight from the downloaded container to 16000 Hz mono PCM
+        final_wav_file_path = os.path.join(output_dir, f'{video_id}_mono_16000.wav')
+        with timed('decode', language) as record:
+            decode_to_wav(downloaded_file_path, final_wav_file_path)
+            record['bytes'] = os.path.getsize(final_wav_file_path)
+            with WavReader(final_wav_file_path) as reader:
+                record['audio_seconds'] = reader.num_samples / SAMPLE_RATE
+        progress('decoded', wav_bytes=os.path.getsize(final_wav_file_path))
 
         print(f"Converted and saved to: {final_wav_file_path}")
-        os.remove(wav_file_path)  # Remove original wav
+        os.remove(downloaded_file_path)  # Remove the downloaded container
 
         return final_wav_file_path
 
@@ -76,36 +95,112 @@ def extract_video_links_from_playlist(playlist_url):
 
     return video_links
 
-# Function to generate SRT using Whisper ASR with language support
-def generate_srt_file(audio_file_path, output_dir, language):
+# Directory of local <video_id>.<ext> recordings to use instead of YouTube (a stand-in for offline runs and tests)
+LOCAL_AUDIO_DIR = os.environ.get("LOCAL_AUDIO_DIR")
+
+# Function to build a fetcher with download_and_convert_to_wav's signature that reads local files instead of YouTube
+def local_audio_fetcher(source_dir):
+    def fetch(youtube_url, output_dir, progress=None, language=''):
+        video_id = extract_video_id(youtube_url)
+        matches = [name for name in os.listdir(source_dir) if os.path.splitext(name)[0] == video_id] if video_id else []
+        if not matches:
+            print(f"No local audio for {youtube_url} in {source_dir}")
+            return None
+        final_wav_file_path = os.path.join(output_dir, f'{video_id}_mono_16000.wav')
+        with timed('decode', language):
+            decode_to_wav(os.path.join(source_dir, matches[0]), final_wav_file_path)
+        return final_wav_file_path
+    return fetch
+
+# Function to get a video's normalised WAV through the shared audio cache; fetcher does the real work on a miss
+def download_cached(youtube_url, output_dir, progress=None, fetcher=None, language=''):
+    fetcher = fetcher or (local_audio_fetcher(LOCAL_AUDIO_DIR) if LOCAL_AUDIO_DIR else download_and_convert_to_wav)
+    video_id = extract_video_id(youtube_url)
+    if not video_id:
+        return None
+    try:
+        return get_cached_audio(video_id, os.path.join(output_dir, f'{video_id}_mono_16000.wav'),
+                                lambda work_dir: fetcher(youtube_url, work_dir, progress=progress, language=language),
+                                progress=progress)
+    except Exception as e:
+        print(f"An error occurred while fetching cached audio for {youtube_url}: {e}")
+        return None
+
+# Function to transcribe audio with the job's ASR backend and return (start, end, text) segments
+def transcribe_audio(audio_file_path, language, progress=None, asr=None):
+    progress = progress or (lambda status, **details: None)
     try:
-        model = whisper.load_model("base")
-        language_map = {'english': 'en', 'hindi': 'hi', 'german': 'de'}
+        asr = get_backend(**(asr or {})).spec()
 
-        if language.lower() not in language_map:
+        if language.lower() not in LANGUAGE_CODES:
             print(f"Unsupported language selected: {language}. Defaulting to English.")
             language = 'english'
         
-        print(f"Generating captions in {language.capitalize()} for {audio_file_path}...")
-        result = model.transcribe(audio_file_path, language=language_map[language.lower()])
+        print(f"Generating captions in {language.capitalize()} for {audio_file_path} with {asr['backend']} '{asr['model_size']}'...")
+        # Audio this backend has already transcribed with the same settings is answered from the cache
+        cache_key = transcript_key(pcm_sha256(audio_file_path), asr, language.lower(), transcription_settings(language.lower()))
+        segments = get_transcript(cache_key)
+        if segments is not None:
+            print(f"Transcript cache hit for {audio_file_path}")
+            progress('transcribing', percent=100.0, cache='hit')
+            return segments
+
+        # Transcribe window by window from the WAV, so a multi-hour recording is never one float array in memory
+        with WavReader(audio_file_path) as reader:
+            # Only speech regions reach Whisper; silence, music beds and dead air are skipped
+            windows, speech_samples = plan_windows(reader, language.lower())
+            skipped_percent = round(100 * (1 - speech_samples / reader.num_samples), 1) if reader.num_samples else 0.0
+            print(f"Voice activity: {speech_samples / SAMPLE_RATE:.1f}s of speech in {reader.num_samples / SAMPLE_RATE:.1f}s, {skipped_percent}% skipped")
+            progress('transcribing', speech_seconds=round(speech_samples / SAMPLE_RATE, 1), skipped_percent=skipped_percent)
+            audio_seconds = reader.num_samples / SAMPLE_RATE
+
+        seconds_total = speech_samples / SAMPLE_RATE
+        def report(seconds_done):
+            seconds_done = min(seconds_done, seconds_total)
+            progress('transcribing', percent=round(100 * seconds_done / seconds_total, 1),
+                     seconds_done=round(seconds_done, 1), seconds_total=round(seconds_total, 1))
+
+        with timed('transcribe', language.lower(), asr_label(asr)) as record:
+            segments = transcribe_windows(audio_file_path, windows, asr, LANGUAGE_CODES[language.lower()], report)
+            record['audio_seconds'] = audio_seconds
+        put_transcript(cache_key, segments)
+        return segments
+
+    except Exception as e:
+        print(f"An error occurred during transcription: {e}")
+        return None
 
+# Function to generate SRT using the ASR backend with language support
+def generate_srt_file(audio_file_path, output_dir, language, asr=None):
+    segments = transcribe_audio(audio_file_path, language, asr=asr)
+    if segments is None:
+        return None
+    try:
         srt_file_path = os.path.join(output_dir, os.path.basename(audio_file_path).replace('.wav', '.srt'))
-        with open(srt_file_path, 'w', encoding='utf-8') as srt_file:
-            for segment in result['segments']:
-                start = segment['start']
-                end = segment['end']
-                text = segment['text']
-                srt_file.write(f"{segment['id'] + 1}\n")
-                srt_file.write(f"{format_timestamp(start)} --> {format_timestamp(end)}\n")
-                srt_file.write(f"{text}\n\n")
+        save_srt_chunk(segments, srt_file_path)
         return srt_file_path
-
     except Exception as e:
         print(f"An error occurred during SRT generation: {e}")
         return None
 
-# Updated function with proper handling of the last chunk's metadata
-def chunk_audio_and_srt(audio_file_path, srt_file_path, output_dir, language, unique_id):
+# Chunk files are encoded on a shared pool; ffmpeg runs in subprocesses, so threads are enough
+ENCODE_WORKERS = int(os.environ.get("ENCODE_WORKERS", str(os.cpu_count() or 2)))
+# Chunks read but not yet written, per video; this (not the video length) bounds the chunker's memory
+CHUNK_WINDOW = int(os.environ.get("CHUNK_WINDOW", str(2 * ENCODE_WORKERS)))
+_encode_executor = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="encode")
+
+# Function to encode one chunk on the pool and record how long it took and what it wrote
+def encode_chunk_timed(chunk_audio_path, samples, codec, bitrate, language):
+    with timed('chunk_export', language) as record:
+        num_samples = encode_chunk(chunk_audio_path, samples, [(0, len(samples))], codec, bitrate)
+        record['audio_seconds'] = num_samples / SAMPLE_RATE
+        record['bytes'] = os.path.getsize(chunk_audio_path)
+    return num_samples
+
+# Function to cut the audio into chunks; every chunk is planned first, then streamed from the WAV and written exactly once
+def chunk_audio_and_srt(audio_file_path, captions, output_dir, language, unique_id, seed=None, progress=None,
+                        codec='wav', bitrate=None):
+    progress = progress or (lambda status, **details: None)
     # Create directories for caption chunks and audio chunks
     caption_chunk_dir = os.path.join(output_dir, 'caption_chunks')
     audio_chunk_dir = os.path.join(output_dir, 'audio_chunks')
@@ -119,198 +214,309 @@ def chunk_audio_and_srt(audio_file_path, srt_file_path, output_dir, language, un
         'german': 'de'
     }
 
-    # Parse SRT file to get timestamp segments with captions
-    caption_segments = []
-    with open(srt_file_path, 'r', encoding='utf-8') as srt_file:
-        lines = srt_file.readlines()
-        for i in range(0, len(lines), 4):  # Each caption segment consists of 4 lines in SRT
-            start_time = convert_srt_time_to_seconds(lines[i+1].split(' --> ')[0].strip())
-            end_time = convert_srt_time_to_seconds(lines[i+1].split(' --> ')[1].strip())
-            text = lines[i+2].strip()  # Get the caption text
-            caption_segments.append((start_time, end_time, text))
-
-    # Load the audio file
-    audio = AudioSegment.from_wav(audio_file_path)
-
-    # Initialize counters for naming files
-    chunk_index = 1
-
-    # Initialize an empty list to store chunk metadata
-    chunk_metadata = []
-
-    # Randomly chop the audio based on captions and the time constraint
-    current_chunk_audio = AudioSegment.empty()
-    current_chunk_captions = []
-    chunk_duration_limit = random.randint(16, 29)  # Generate initial random chunk duration
-    silence_threshold = 3  # 3-second threshold for silence handling
-
-    for idx, (segment_start, segment_end, text) in enumerate(caption_segments):
-        segment_audio = audio[segment_start * 1000:segment_end * 1000]
-        current_chunk_audio += segment_audio
-        current_chunk_captions.append((segment_start, segment_end, text))
-
-        # Check the gap between this segment's end and the next segment's start
-        next_segment_start = caption_segments[idx + 1][0] if idx + 1 < len(caption_segments) else None
-        if next_segment_start:
-            gap_duration = next_segment_start - segment_end
-        else:
-            gap_duration = None  # No next segment means no gap
-
-        # If the gap is short (below the threshold), include the gap in the current chunk
-        if gap_duration is not None and gap_duration <= silence_threshold:
-            current_chunk_audio += audio[segment_end * 1000:next_segment_start * 1000]  # Append short silence
-            segment_end = next_segment_start  # Extend segment end time
-
-        # Check if the accumulated audio chunk is within the random chunk duration limit
-        current_chunk_duration = len(current_chunk_audio) / 1000  # Duration in seconds
-        if current_chunk_duration >= chunk_duration_limit or current_chunk_duration > 29:
-            # Save the audio chunk
-            chunk_audio_path = os.path.join(audio_chunk_dir, f"{chunk_index}.wav")
-            current_chunk_audio.export(chunk_audio_path, format="wav")
-
-            # Save the corresponding SRT chunk with captions
-            chunk_srt_path = os.path.join(caption_chunk_dir, f"{chunk_index}.srt")
-            save_srt_chunk(current_chunk_captions, chunk_srt_path)
-
-            # Append chunk metadata
+    # Captions come straight from the transcriber; an SRT path is still accepted and parsed
+    if isinstance(captions, str):
+        caption_segments = parse_srt_file(captions)
+    else:
+        caption_segments = list(captions)
+
+    # Open the audio through a windowed reader; only the chunks currently being encoded are held in memory
+    with WavReader(audio_file_path) as reader:
+        # Decide every chunk boundary up front so no chunk has to be rewritten later (the plan holds no audio)
+        with timed('chunk_plan', language.lower()):
+            plans = plan_chunks(caption_segments, total_samples=reader.num_samples, seed=seed)
+        extension = CHUNK_CODECS[codec][0]
+        chunk_metadata = []
+        in_flight = deque()
+
+        # Function to wait for the oldest encode and record its metadata, keeping chunk order
+        def finish_oldest():
+            chunk_index, plan, chunk_audio_path, encode = in_flight.popleft()
+            num_samples = encode.result()
+
+            # Append chunk metadata; the path is relative to the dataset root so it stays valid after transfer
+            path_parts = os.path.normpath(chunk_audio_path).split(os.path.sep)
             chunk_metadata.append({
-                'audio_filepath': os.path.join(*os.path.normpath(chunk_audio_path).split(os.path.sep)[os.path.normpath(chunk_audio_path).split(os.path.sep).index(f'temp_files_{unique_id}'):]).replace('\\', '/'),
-                'duration': current_chunk_duration,
-                'text': ' '.join(caption.strip() for start, end, caption in current_chunk_captions),
+                'audio_filepath': '/'.join(path_parts[path_parts.index(f'temp_files_{unique_id}') + 1:]),
+                'duration': num_samples / SAMPLE_RATE,
+                'codec': codec,
+                'text': ' '.join(caption.strip() for start, end, caption in plan['captions']),
                 'lang_id': language_map.get(language.lower(), 'en')
             })
 
             # Log success message
             print(f"Chunk {chunk_index} created successfully!")
+            progress('chunking', chunks_written=chunk_index, chunks_total=len(plans))
 
-            # Reset for the next chunk and generate a new random chunk duration limit
-            current_chunk_audio = AudioSegment.empty()
-            current_chunk_captions = []
-            chunk_duration_limit = random.randint(16, 29)  # New random chunk duration
-            chunk_index += 1
-
-    # Handle any leftover audio and captions (final chunk)
-    if len(current_chunk_audio) > 0:
-        leftover_duration = len(current_chunk_audio) / 1000
-
-        if 16 <= leftover_duration <= 29:
-            # Save the final audio chunk
-            chunk_audio_path = os.path.join(audio_chunk_dir, f"{chunk_index}.wav")
-            current_chunk_audio.export(chunk_audio_path, format="wav")
-
-            # Save the corresponding SRT chunk
-            chunk_srt_path = os.path.join(caption_chunk_dir, f"{chunk_index}.srt")
-            save_srt_chunk(current_chunk_captions, chunk_srt_path)
-
-            # Append metadata for the final chunk
-            chunk_metadata.append({
-                'audio_filepath': os.path.join(*os.path.normpath(chunk_audio_path).split(os.path.sep)[os.path.normpath(chunk_audio_path).split(os.path.sep).index(f'temp_files_{unique_id}'):]).replace('\\', '/'),
-                'duration': leftover_duration,
-                'text': ' '.join(caption.strip() for start, end, caption in current_chunk_captions),
-                'lang_id': language_map.get(language.lower(), 'en')
-            })
-
-            # Log success message
-            print(f"Final chunk {chunk_index} created successfully!")
-
-        else:
-            # If the last segment is shorter than 16 seconds, append it to the previous chunk
-            if chunk_index > 1:
-                prev_audio_file = os.path.join(audio_chunk_dir, f"{chunk_index - 1}.wav")
-                prev_audio = AudioSegment.from_wav(prev_audio_file)
-                prev_audio += current_chunk_audio
-                prev_audio.export(prev_audio_file, format="wav")
-
-                # Append SRT chunk to previous file
-                prev_srt_file = os.path.join(caption_chunk_dir, f"{chunk_index - 1}.srt")
-                append_srt_chunk(prev_srt_file, current_chunk_captions)
-
-                # Update the metadata of the previous chunk
-                chunk_metadata[-1]['duration'] += leftover_duration  # Extend previous chunk's duration
-                chunk_metadata[-1]['text'] += ' ' + ' '.join(caption.strip() for start, end, caption in current_chunk_captions)  # Append text
-
-                # Log success message for appending to the previous chunk
-                print(f"Appended remaining audio to chunk {chunk_index - 1} successfully!")
+        try:
+            for chunk_index, plan in enumerate(plans, start=1):
+                # Read just this chunk's samples and encode them on the shared pool
+                samples = reader.read_ranges(plan['ranges'])
+                chunk_audio_path = os.path.join(audio_chunk_dir, f"{chunk_index}.{extension}")
+                encode = _encode_executor.submit(encode_chunk_timed, chunk_audio_path, samples, codec, bitrate, language.lower())
+                in_flight.append((chunk_index, plan, chunk_audio_path, encode))
+
+                # Save the corresponding SRT chunk with captions
+                chunk_srt_path = os.path.join(caption_chunk_dir, f"{chunk_index}.srt")
+                save_srt_chunk(plan['captions'], chunk_srt_path)
+
+                if len(in_flight) >= CHUNK_WINDOW:
+                    finish_oldest()
+            while in_flight:
+                finish_oldest()
+        finally:
+            # Don't leave encodes of a failed video running after the reader is closed
+            for _, _, _, encode in in_flight:
+                encode.cancel()
 
     return chunk_metadata
 
-# Main function to process the YouTube links and create folders with language input
-def process_youtube_links(file_path, language):
+# Per-stage concurrency for the download -> transcribe -> chunk pipeline
+DOWNLOAD_WORKERS = int(os.environ.get("DOWNLOAD_WORKERS", "2"))
+TRANSCRIBE_WORKERS = int(os.environ.get("TRANSCRIBE_WORKERS", "1"))
+CHUNK_WORKERS = int(os.environ.get("CHUNK_WORKERS", "1"))
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", "2"))
+# Keep a full-length SRT next to each video's chunks (the chunker itself never needs it)
+WRITE_FULL_SRT = os.environ.get("WRITE_FULL_SRT", "false").lower() == "true"
+# A video's transcript segments, kept between its transcribe and chunk checkpoints
+SEGMENTS_FILE = 'segments.json'
+
+# Function to name a job as the owner of its video leases
+def job_lease_owner(unique_id):
+    return f'job-{unique_id}-{os.getpid()}'
+
+# Function to build the download, transcribe and chunk stages for one job.
+# The downloader, transcriber and chunker are parameters so local stand-ins can replace them;
+# each is called with a progress= keyword that reports (status, **details) for the current video,
+# and the downloader also with the job's language= for its stage metrics.
+# Every finished stage is checkpointed, so a resumed job skips the work a video has already done.
+def build_video_pipeline(language, unique_id, temp_links_file, progress,
+                         downloader=None, transcriber=None, chunker=None, write_full_srt=WRITE_FULL_SRT,
+                         codec='wav', bitrate=None, asr=None, checkpoints=None):
+    downloader = downloader or download_cached
+    transcriber = transcriber or transcribe_audio
+    chunker = chunker or chunk_audio_and_srt
+    checkpoints = checkpoints or CheckpointManifest(f'temp_files_{unique_id}')
+    temp_links_lock = threading.Lock()
+    lease_owner = job_lease_owner(unique_id)
+    model_label = asr_label(get_backend(**(asr or {})).spec())
+
+    def reporter(item):
+        return lambda status, **details: progress(item['video_id'], status, **details)
+
+    # Function to pick up a video's audio (and transcript) from its checkpoint; returns False if it must start over
+    def resume(item):
+        checkpoint = checkpoints.get(item['video_id']) or {}
+        audio_file = checkpoint.get('audio_file')
+        if checkpoint.get('completed') not in ('downloaded', 'transcribed') or not audio_file or not os.path.exists(audio_file):
+            return False
+        item['audio_file'] = audio_file
+        segments_file = os.path.join(item['video_dir'], SEGMENTS_FILE)
+        if checkpoint['completed'] == 'transcribed' and os.path.exists(segments_file):
+            with open(segments_file, 'r', encoding='utf-8') as f:
+                item['segments'] = [tuple(segment) for segment in json.load(f)]
+        print(f"Resuming {item['video_id']} after {'transcription' if 'segments' in item else 'download'}")
+        return True
+
+    def download(item):
+        if resume(item):
+            progress(item['video_id'], 'downloaded', resumed=True)
+            if 'segments' not in item:
+                acquire_lease(item['video_id'], language.lower(), lease_owner,
+                              on_wait=lambda holder: progress(item['video_id'], 'waiting', held_by=holder['owner']))
+            return item
+
+        # Hold the video's lease from download until its transcript is cached; a job that gets here second
+        # waits for it and then picks the audio and transcript up from the shared caches
+        acquire_lease(item['video_id'], language.lower(), lease_owner,
+                      on_wait=lambda holder: progress(item['video_id'], 'waiting', held_by=holder['owner']))
+        progress(item['video_id'], 'downloading', link=item['link'])
+        item['audio_file'] = downloader(item['link'], item['video_dir'], progress=reporter(item), language=language.lower())
+        if not item['audio_file']:
+            release_lease(item['video_id'], language.lower(), lease_owner)
+            raise RuntimeError(f"Failed to download audio for {item['link']}")
+        checkpoints.complete(item['video_id'], 'downloaded', audio_file=item['audio_file'])
+        progress(item['video_id'], 'downloaded')
+        return item
+
+    def transcribe(item):
+        if item.get('segments') is not None:
+            progress(item['video_id'], 'transcribed', resumed=True)
+            return item
+        progress(item['video_id'], 'transcribing')
+        try:
+            item['segments'] = transcriber(item['audio_file'], language, progress=reporter(item), asr=asr)
+        finally:
+            release_lease(item['video_id'], language.lower(), lease_owner)
+        if item['segments'] is None:
+            raise RuntimeError(f"Failed to generate SRT for {item['audio_file']}")
+        print(f"Generated {len(item['segments'])} caption segments in {language.capitalize()} for {item['audio_file']}")
+        if write_full_srt:
+            save_srt_chunk(item['segments'], os.path.join(item['video_dir'], f"{item['video_id']}.srt"))
+        # Keep the segments with the video so a resume after a chunking failure does not transcribe again
+        with open(os.path.join(item['video_dir'], SEGMENTS_FILE), 'w', encoding='utf-8') as f:
+            json.dump([list(segment) for segment in item['segments']], f, ensure_ascii=False)
+        checkpoints.complete(item['video_id'], 'transcribed')
+        progress(item['video_id'], 'transcribed')
+        return item
+
+    def chunk(item):
+        progress(item['video_id'], 'chunking')
+        chunk_metadata = chunker(item['audio_file'], item['segments'], item['video_dir'], language, unique_id,
+                                 progress=reporter(item), codec=codec, bitrate=bitrate)
+
+        if chunk_metadata:
+            # Create JSON metadata file
+            metadata_file_path = os.path.join(item['video_dir'], 'metadata.json')
+            with timed('metadata_write', language.lower(), model_label) as record:
+                with open(metadata_file_path, 'w', encoding='utf-8') as metadata_file:
+                    for chunk in chunk_metadata:
+                        json.dump(chunk, metadata_file, ensure_ascii=False)
+                        metadata_file.write('\n')
+                record['bytes'] = os.path.getsize(metadata_file_path)
+
+            print(f"Created metadata file: {metadata_file_path}")
+            item['metadata_file'] = metadata_file_path
+
+            # Count words once per video so the analytics endpoints only merge counters
+            try:
+                write_word_counts(item['video_dir'], [chunk['text'] for chunk in chunk_metadata], language)
+            except Exception as e:
+                print(f"An error occurred while counting words for {item['video_id']}: {e}")
+
+        os.remove(item['audio_file'])
+        segments_file = os.path.join(item['video_dir'], SEGMENTS_FILE)
+        if os.path.exists(segments_file):
+            os.remove(segments_file)
+        with temp_links_lock:
+            mark_link_as_processed(item['link'], temp_links_file)
+        checkpoints.complete(item['video_id'], 'chunked', metadata_file=item.get('metadata_file'))
+        progress(item['video_id'], 'processed', chunks=len(chunk_metadata or []))
+        return item
+
+    # Function to record a stage failure in the video's checkpoint and report it, leaving the other videos running
+    def checkpointed(stage_name, func):
+        def run(item):
+            try:
+                return func(item)
+            except Exception as e:
+                checkpoints.fail(item['video_id'], stage_name, str(e))
+                progress(item['video_id'], 'failed', message=str(e), failed_stage=stage_name)
+                raise
+        return run
+
+    return [
+        PipelineStage('download', checkpointed('download', download), DOWNLOAD_WORKERS),
+        PipelineStage('transcribe', checkpointed('transcribe', transcribe), TRANSCRIBE_WORKERS),
+        PipelineStage('chunk', checkpointed('chunk', chunk), CHUNK_WORKERS),
+    ]
+
+# Main function to process the YouTube links and create folders with language input.
+# With file_path=None the job's saved links are used, which resumes an earlier run of the same unique_id:
+# videos already chunked are kept, and the others continue from their last checkpoint.
+def process_youtube_links(file_path, language, unique_id=None, progress=None,
+                          downloader=None, transcriber=None, chunker=None, codec='wav', bitrate=None, asr=None):
     main_op_dir = 'audio_files'
-    unique_id = uuid.uuid4()  # Generate unique ID for each process
+    unique_id = unique_id or uuid.uuid4()  # Generate unique ID for each process unless the job queue assigned one
+    progress = progress or (lambda video_id, status, **details: None)
     output_dir = f'temp_files_{unique_id}'
     os.makedirs(main_op_dir, exist_ok=True)
     os.makedirs(output_dir, exist_ok=True)
-    processed_links_file = os.path.join(main_op_dir, 'processed_links.txt')
     temp_links_file = os.path.join(output_dir, 'temp_links.txt')
+    links_file = os.path.join(output_dir, JOB_LINKS_FILE)
 
     try:
-        with open(file_path, 'r') as file:
+        with open(file_path or links_file, 'r') as file:
             links = [line.strip() for line in file.readlines() if line.strip()]
+        if file_path:
+            with open(links_file, 'w') as file:
+                file.write(''.join(f"{link}\n" for link in links))
 
         language_folder = os.path.join(output_dir, language.lower())
         os.makedirs(language_folder, exist_ok=True)
 
         processed_videos = []
-
-        for link in links:
-            if is_link_processed(link, processed_links_file):
-                print(f"Link already processed: {link}")
-                processed_videos.append({'status': 'already_processed', 'link': link})
-                continue
-
-            video_links = extract_video_links_from_playlist(link) if "list" in link else [link]
-
-            for video_link in video_links:
-                video_id = extract_video_id(video_link)
-                if not video_id:
-                    print(f"Failed to extract video ID for {video_link}")
+        checkpoints = CheckpointManifest(output_dir)
+
+        # Look up every directly linked video in one batch against the processed-video index
+        direct_video_ids = [extract_video_id(link) for link in links if "list" not in link]
+        already_processed = filter_processed(direct_video_ids)
+
+        # Generator feeding the pipeline, so downloads start while later playlists are still being expanded
+        def videos_to_process():
+            order = 0
+            seen = set()  # A video listed twice (directly or through playlists) is processed once
+            for link in links:
+                if "list" not in link and extract_video_id(link) in already_processed:
+                    print(f"Link already processed: {link}")
+                    processed_videos.append({'status': 'already_processed', 'link': link})
                     continue
 
-                video_dir = os.path.join(language_folder, video_id)
-                os.makedirs(video_dir, exist_ok=True)
-
-                print(f"Processing video {video_id}: {video_link}")
-
-                audio_file = download_and_convert_to_wav(video_link, video_dir)
-
-                if audio_file:
-                    srt_file = generate_srt_file(audio_file, video_dir, language)
-                    if srt_file:
-                        print(f"Generated SRT in {language.capitalize()}: {srt_file}")
-                        chunk_metadata = chunk_audio_and_srt(audio_file, srt_file, video_dir, language, unique_id)
-
-                        if chunk_metadata:
-                            # Create JSON metadata file
-                            metadata_file_path = os.path.join(video_dir, 'metadata.json')
-                            with open(metadata_file_path, 'w', encoding='utf-8') as metadata_file:
-                                for chunk in chunk_metadata:
-                                    json.dump(chunk, metadata_file, ensure_ascii=False)
-                                    metadata_file.write('\n')
-
-                            print(f"Created metadata file: {metadata_file_path}")
-                            processed_videos.append({
-                                'status': 'processed',
-                                'link': video_link,
-                                'metadata_file': metadata_file_path
-                            })
-
-                        os.remove(audio_file)
-                        os.remove(srt_file)
-                        mark_link_as_processed(video_link, temp_links_file)
-                    else:
-                        print(f"Failed to generate SRT for {audio_file}")
-                        return {"status": "error", "message": f"Failed to generate SRT for {audio_file}"}, 500
-                else:
-                    print(f"Failed to process {link}")
-                    return {"status": "error", "message": f"Failed to process {link}"}, 500
-
-        # Include the unique_id in the success response
-        return {"status": "success", "processed_videos": processed_videos, "unique_id": str(unique_id)}, 200
+                video_links = extract_video_links_from_playlist(link) if "list" in link else [link]
+                playlist_processed = filter_processed(extract_video_id(video_link) for video_link in video_links) if "list" in link else set()
+
+                for video_link in video_links:
+                    video_id = extract_video_id(video_link)
+                    if not video_id:
+                        print(f"Failed to extract video ID for {video_link}")
+                        continue
+                    if video_id in seen:
+                        print(f"Skipping repeated video {video_id}: {video_link}")
+                        continue
+                    seen.add(video_id)
+                    if video_id in playlist_processed:
+                        print(f"Link already processed: {video_link}")
+                        processed_videos.append({'status': 'already_processed', 'link': video_link})
+                        continue
+
+                    order += 1
+                    checkpoint = checkpoints.get(video_id)
+                    if checkpoint and checkpoint['completed'] == 'chunked':
+                        # Finished by an earlier run of this job
+                        progress(video_id, 'processed', resumed=True)
+                        if checkpoint.get('metadata_file'):
+                            processed_videos.append({'status': 'processed', 'link': video_link,
+                                                     'metadata_file': checkpoint['metadata_file']})
+                        continue
+
+                    video_dir = os.path.join(language_folder, video_id)
+                    os.makedirs(video_dir, exist_ok=True)
+
+                    print(f"Processing video {video_id}: {video_link}")
+                    checkpoints.start(video_id, video_link, order)
+                    progress(video_id, 'queued', link=video_link)
+                    yield {'order': order, 'video_id': video_id, 'link': video_link, 'video_dir': video_dir}
+
+        stages = build_video_pipeline(language, unique_id, temp_links_file, progress,
+                                      downloader=downloader, transcriber=transcriber, chunker=chunker,
+                                      codec=codec, bitrate=bitrate, asr=asr, checkpoints=checkpoints)
+        try:
+            # A failed video is checkpointed and skipped; the rest of the job carries on
+            completed, failures = run_pipeline(videos_to_process(), stages, queue_size=PIPELINE_QUEUE_SIZE,
+                                               stop_on_error=False)
+        finally:
+            # Videos dropped after a failure never reach the transcribe stage; don't make other jobs wait out their leases
+            release_owner_leases(job_lease_owner(unique_id))
+
+        for item in sorted(completed, key=lambda item: item['order']):
+            if item.get('metadata_file'):
+                processed_videos.append({
+                    'status': 'processed',
+                    'link': item['link'],
+                    'metadata_file': item['metadata_file']
+                })
+
+        failed_videos = [{'status': 'failed', 'link': failure['item']['link'] if failure['item'] else None,
+                          'stage': failure['stage'], 'error': failure['error']} for failure in failures]
+        processed_videos.extend(failed_videos)
+
+        # Include the unique_id in the success response; failed videos can be retried with /jobs/{id}/resume
+        return {"status": "partial" if failed_videos else "success", "processed_videos": processed_videos,
+                "failed_videos": len(failed_videos), "unique_id": str(unique_id)}, 200
 
     except FileNotFoundError:
-        print(f"The file {file_path} was not found.")
-        return {"status": "error", "message": f"The file {file_path} was not found."}, 404
+        print(f"The file {file_path or links_file} was not found.")
+        return {"status": "error", "message": f"The file {file_path or links_file} was not found."}, 404
     except Exception as e:
         print(f"An error occurred while processing the file: {e}")
-        return {"status": "error", "message": str(e)}, 500
\ No newline at end of file
+        return {"status": "error", "message": str(e)}, 500
@@ -0,0 +1,86 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from backend.services.catalog_service import catalog_version
+
+# Byte budget for rendered images kept in this worker
+RENDER_CACHE_BYTES = int(os.environ.get("RENDER_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+
+class RenderCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.size -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self.size += len(data)
+            # Evict least recently used images until the cache fits its budget again
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def invalidate(self, language=None):
+        with self._lock:
+            for key in [key for key in self._entries if language is None or key[1] == language]:
+                self.size -= len(self._entries.pop(key))
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.size, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+_cache = RenderCache(RENDER_CACHE_BYTES)
+
+# Function to build the cache key; the catalog version changes whenever transfer_data commits videos
+def render_key(endpoint, language, video_code=None):
+    return (endpoint, language, video_code or '', catalog_version())
+
+# Function to derive a strong ETag from a cache key (identical across workers for the same dataset).
+# It is only strong because the renders are deterministic: the same key always produces the same PNG bytes.
+def render_etag(key):
+    return '"' + hashlib.sha1('|'.join(str(part) for part in key).encode('utf-8')).hexdigest() + '"'
+
+# Function to check an If-None-Match header against an ETag
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or any(candidate.removeprefix('W/') == etag for candidate in candidates)
+
+# Function to look up a rendered image; returns the PNG bytes or None
+def get_render(key):
+    return _cache.get(key)
+
+# Function to store a rendered image under its key
+def put_render(key, data):
+    _cache.put(key, data)
+
+# Function to drop cached images (for one language, or all); called when transfer_data adds videos
+def invalidate_render_cache(language=None):
+    _cache.invalidate(language)
+
+# Function to report render cache usage
+def render_cache_stats():
+    return _cache.stats()
@@ -0,0 +1,41 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from backend.services.metrics_service import add_gauge
+
+# Chart rendering runs on its own small pool so heavy visualisation traffic can't starve the event loop or the job workers
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", "2"))
+RENDER_QUEUE_LIMIT = int(os.environ.get("RENDER_QUEUE_LIMIT", "8"))
+RENDER_TIMEOUT_SECONDS = float(os.environ.get("RENDER_TIMEOUT_SECONDS", "30"))
+
+_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+# Renders running or waiting; a slot is only released when the render really finishes, even after a timeout
+_slots = threading.BoundedSemaphore(RENDER_WORKERS + RENDER_QUEUE_LIMIT)
+
+
+class RenderPoolBusy(Exception):
+    pass
+
+
+class RenderTimeout(Exception):
+    pass
+
+
+# Function to run a render function on the pool without blocking the event loop
+async def run_render(render, *args, timeout=None):
+    if not _slots.acquire(blocking=False):
+        raise RenderPoolBusy("Too many charts are being rendered. Please try again shortly.")
+    try:
+        future = _executor.submit(render, *args)
+    except Exception:
+        _slots.release()
+        raise
+    add_gauge('audio_generator_queue_depth', 1, queue='render')
+    future.add_done_callback(lambda _: (_slots.release(), add_gauge('audio_generator_queue_depth', -1, queue='render')))
+
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout or RENDER_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        future.cancel()  # Drops it if it never started; a render already running finishes in the background
+        raise RenderTimeout(f"Rendering took longer than {timeout or RENDER_TIMEOUT_SECONDS} seconds.")
@@ -0,0 +1,80 @@
+import os
+import json
+import time
+import hashlib
+from backend.utils.db_utils import connect, transaction
+
+# Content-addressed transcription cache: (PCM hash, ASR spec, language, windowing settings) -> segment list.
+# Shared by every worker through SQLite; least recently used entries are evicted beyond the byte budget.
+TRANSCRIPT_CACHE_PATH = os.environ.get("TRANSCRIPT_CACHE_PATH", os.path.join('cache', 'transcripts.db'))
+TRANSCRIPT_CACHE_BYTES = int(os.environ.get("TRANSCRIPT_CACHE_BYTES", str(256 * 1024 * 1024)))
+
+_initialised = set()
+
+# Function to open the cache, creating its schema the first time
+def _cache(db_path=TRANSCRIPT_CACHE_PATH):
+    conn = connect(db_path)
+    if db_path not in _initialised:
+        conn.execute('''CREATE TABLE IF NOT EXISTS transcripts (
+            key TEXT PRIMARY KEY,
+            segments TEXT NOT NULL,
+            nbytes INTEGER NOT NULL,
+            created_at REAL,
+            last_used_at REAL)''')
+        conn.execute('CREATE INDEX IF NOT EXISTS transcripts_last_used ON transcripts (last_used_at)')
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        _initialised.add(db_path)
+    return conn
+
+# Function to build a cache key; settings holds anything else that changes the transcript (VAD, window sizes)
+def transcript_key(pcm_hash, asr, language, settings=None):
+    material = json.dumps({'pcm': pcm_hash, 'asr': asr, 'language': language, 'settings': settings}, sort_keys=True)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+# Function to bump a hit/miss/eviction counter
+def _count(conn, name, amount=1):
+    conn.execute('INSERT INTO cache_counters (name, value) VALUES (?, ?) '
+                 'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value', (name, amount))
+
+# Function to look up cached segments; returns a list of (start, end, text) or None
+def get_transcript(key, db_path=TRANSCRIPT_CACHE_PATH):
+    conn = _cache(db_path)
+    with transaction(conn):
+        row = conn.execute('SELECT segments FROM transcripts WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            _count(conn, 'misses')
+            return None
+        conn.execute('UPDATE transcripts SET last_used_at = ? WHERE key = ?', (time.time(), key))
+        _count(conn, 'hits')
+    return [tuple(segment) for segment in json.loads(row[0])]
+
+# Function to store segments and evict least recently used entries until the cache fits its budget
+def put_transcript(key, segments, db_path=TRANSCRIPT_CACHE_PATH, max_bytes=TRANSCRIPT_CACHE_BYTES):
+    data = json.dumps([list(segment) for segment in segments], ensure_ascii=False)
+    nbytes = len(data.encode('utf-8'))
+    if nbytes > max_bytes:
+        return
+    conn = _cache(db_path)
+    now = time.time()
+    with transaction(conn):
+        conn.execute('INSERT OR REPLACE INTO transcripts (key, segments, nbytes, created_at, last_used_at) VALUES (?, ?, ?, ?, ?)',
+                     (key, data, nbytes, now, now))
+        total = conn.execute('SELECT COALESCE(SUM(nbytes), 0) FROM transcripts').fetchone()[0]
+        evicted = 0
+        for old_key, old_bytes in conn.execute('SELECT key, nbytes FROM transcripts WHERE key != ? ORDER BY last_used_at',
+                                               (key,)).fetchall():
+            if total <= max_bytes:
+                break
+            conn.execute('DELETE FROM transcripts WHERE key = ?', (old_key,))
+            total -= old_bytes
+            evicted += 1
+        if evicted:
+            _count(conn, 'evictions', evicted)
+
+# Function to report cache usage and counters
+def transcript_cache_stats(db_path=TRANSCRIPT_CACHE_PATH):
+    conn = _cache(db_path)
+    entries, nbytes = conn.execute('SELECT COUNT(*), COALESCE(SUM(nbytes), 0) FROM transcripts').fetchone()
+    counters = dict(conn.execute('SELECT name, value FROM cache_counters'))
+    return {'entries': entries, 'bytes': nbytes, 'max_bytes': TRANSCRIPT_CACHE_BYTES,
+            'hits': counters.get('hits', 0), 'misses': counters.get('misses', 0), 'evictions': counters.get('evictions', 0)}
@@ -0,0 +1,144 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from backend.services.model_service import transcription_progress
+from backend.services.asr_service import get_backend
+from backend.utils.audio_utils import quiet_windows, WavReader, SAMPLE_RATE
+from backend.utils.vad_utils import VAD_ENABLED, vad_settings, detect_speech, pack_regions, PackedTimeline
+
+# Transcription window length, how far back from its end to look for a quiet cut, and how many segments carry over as prompt
+TRANSCRIBE_WINDOW_SECONDS = float(os.environ.get("TRANSCRIBE_WINDOW_SECONDS", "600"))
+WINDOW_SEARCH_SECONDS = float(os.environ.get("WINDOW_SEARCH_SECONDS", "10"))
+PROMPT_SEGMENTS = int(os.environ.get("PROMPT_SEGMENTS", "3"))
+
+# Parallel mode: windows of one video are transcribed by TRANSCRIBE_PROCESSES worker processes, each limited to
+# TRANSCRIBE_THREADS_PER_PROCESS torch threads, and each window also covers the start of the next for WINDOW_OVERLAP_SECONDS
+TRANSCRIBE_PROCESSES = int(os.environ.get("TRANSCRIBE_PROCESSES", "1"))
+TRANSCRIBE_THREADS_PER_PROCESS = int(os.environ.get("TRANSCRIBE_THREADS_PER_PROCESS",
+                                                    str(max(1, (os.cpu_count() or 1) // max(TRANSCRIBE_PROCESSES, 1)))))
+WINDOW_OVERLAP_SECONDS = float(os.environ.get("WINDOW_OVERLAP_SECONDS", "5"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Function to describe the settings that shape a transcript besides the audio and the ASR spec (part of the cache key)
+def transcription_settings(language):
+    return {
+        'vad': vad_settings(language) if VAD_ENABLED else None,
+        'window_seconds': TRANSCRIBE_WINDOW_SECONDS,
+        'search_seconds': WINDOW_SEARCH_SECONDS,
+        'prompt_segments': PROMPT_SEGMENTS,
+        'overlap_seconds': WINDOW_OVERLAP_SECONDS if TRANSCRIBE_PROCESSES > 1 else None,
+    }
+
+# Function to plan the transcription windows of a WAV: speech regions, split at quiet points, packed into windows.
+# Returns (windows, speech_samples); each window is a list of (start, end) sample pieces.
+def plan_windows(reader, language):
+    regions = detect_speech(reader, vad_settings(language)) if VAD_ENABLED else [(0, reader.num_samples)]
+    pieces = [piece for start, end in regions
+              for piece in quiet_windows(reader, int(TRANSCRIBE_WINDOW_SECONDS * SAMPLE_RATE),
+                                         int(WINDOW_SEARCH_SECONDS * SAMPLE_RATE), start, end)]
+    return pack_regions(pieces, int(TRANSCRIBE_WINDOW_SECONDS * SAMPLE_RATE)), sum(end - start for start, end in regions)
+
+# Function to read a window's pieces as the float32 signal the ASR engines expect (Whisper's own loader also scales s16 PCM by 1/32768)
+def _window_audio(reader, pieces):
+    return reader.read_ranges(pieces).astype(np.float32) / 32768.0
+
+# Function to transcribe one window and map its segments back onto the original recording
+def _transcribe_pieces(backend, reader, pieces, language_code, prompt=None):
+    timeline = PackedTimeline(pieces)
+    segments = backend.transcribe(_window_audio(reader, pieces), language_code, initial_prompt=prompt)
+    return [timeline.to_original_span(segment['start'], segment['end']) + (segment['text'].strip(),)
+            for segment in segments]
+
+# Function to transcribe the windows one after another, carrying the previous window's text over as the prompt
+def transcribe_sequential(audio_file_path, windows, asr, language_code, report):
+    backend = get_backend(**asr)
+    segments = []
+    seconds_before = 0.0
+    with WavReader(audio_file_path) as reader:
+        for pieces in windows:
+            prompt = ' '.join(text for start, end, text in segments[-PROMPT_SEGMENTS:]) or None
+            with transcription_progress(lambda seconds_done, window_seconds, before=seconds_before: report(before + seconds_done)):
+                segments.extend(_transcribe_pieces(backend, reader, pieces, language_code, prompt))
+            seconds_before += sum(end - start for start, end in pieces) / SAMPLE_RATE
+    return segments
+
+# Function run once in each worker process: cap torch's threads so the workers share the cores instead of oversubscribing them
+def _init_worker(threads):
+    import torch
+    torch.set_num_threads(threads)
+
+# Function run in a worker process to transcribe one window (the worker reads its own audio, so no samples are pickled).
+# A worker runs one window at a time, so the job's own torch thread count can be applied without touching other jobs.
+def _transcribe_window(audio_file_path, pieces, asr, language_code):
+    import torch
+    torch.set_num_threads(asr.get('threads') or TRANSCRIBE_THREADS_PER_PROCESS)
+    with WavReader(audio_file_path) as reader:
+        return _transcribe_pieces(get_backend(**asr), reader, pieces, language_code)
+
+# Function to get the shared transcription process pool (spawned, so workers don't inherit the server's threads)
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # Two jobs may reach their first parallel video at once; only one of them may spawn the workers
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=TRANSCRIBE_PROCESSES, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker, initargs=(TRANSCRIBE_THREADS_PER_PROCESS,))
+    return _pool
+
+# Function to extend each window with the first overlap_samples of the next one
+def _overlapping(windows, overlap_samples):
+    extended = []
+    for index, pieces in enumerate(windows):
+        pieces = list(pieces)
+        remaining = overlap_samples
+        for start, end in (windows[index + 1] if index + 1 < len(windows) else []):
+            if remaining <= 0:
+                break
+            pieces.append((start, min(end, start + remaining)))
+            remaining -= min(end, start + remaining) - start
+        extended.append(pieces)
+    return extended
+
+# Function to merge per-window segments: a window keeps segments starting before the next window begins,
+# a segment whose midpoint is already covered by the previous window's last kept segment is a duplicate,
+# and a kept segment never starts before the one in front of it ends, so the chunker sees no overlaps
+def merge_window_segments(windows, window_segments):
+    merged = []
+    for index, segments in enumerate(window_segments):
+        boundary = windows[index + 1][0][0] / SAMPLE_RATE if index + 1 < len(windows) else float('inf')
+        covered_until = merged[-1][1] if merged else float('-inf')
+        for start, end, text in segments:
+            if start >= boundary or (start + end) / 2 < covered_until:
+                continue
+            start = max(start, merged[-1][1]) if merged else start
+            if start < end:
+                merged.append((start, end, text))
+    return merged
+
+# Function to transcribe the windows in parallel on the process pool
+def transcribe_parallel(audio_file_path, windows, asr, language_code, report):
+    extended = _overlapping(windows, int(WINDOW_OVERLAP_SECONDS * SAMPLE_RATE))
+    pool = _get_pool()
+    futures = {pool.submit(_transcribe_window, audio_file_path, pieces, asr, language_code): index
+               for index, pieces in enumerate(extended)}
+    window_segments = [None] * len(windows)
+    seconds_done = 0.0
+    for future in as_completed(futures):
+        index = futures[future]
+        window_segments[index] = future.result()
+        seconds_done += sum(end - start for start, end in windows[index]) / SAMPLE_RATE
+        report(seconds_done)
+    return merge_window_segments(windows, window_segments)
+
+# Function to transcribe planned windows, in parallel when more than one worker process is configured
+# asr is a backend spec dict (see asr_service.get_backend), so it can be sent to the worker processes
+def transcribe_windows(audio_file_path, windows, asr, language_code, report):
+    if TRANSCRIBE_PROCESSES > 1 and len(windows) > 1:
+        return transcribe_parallel(audio_file_path, windows, asr, language_code, report)
+    return transcribe_sequential(audio_file_path, windows, asr, language_code, report)
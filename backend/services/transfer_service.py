@@ -1,110 +1,233 @@
 import os
-import shutil
 import json
+import time
+import fcntl
+from contextlib import contextmanager
+from backend.utils.processed_index import mark_videos_processed
+from backend.services.catalog_service import add_videos
+from backend.services.render_cache_service import invalidate_render_cache
+from backend.services.checkpoint_service import read_checkpoints, CHECKPOINT_FILE, JOB_LINKS_FILE
+from backend.services.metrics_service import timed
+from backend.services.job_service import job_is_active
 
-# Function to update metadata filepath
-def update_metadata(temp_dir):
-    for language in os.listdir(temp_dir):
-        language_dir = os.path.join(temp_dir, language)
-        if os.path.isdir(language_dir):
-            for video_folder in os.listdir(language_dir):
-                metadata_file_path = os.path.join(language_dir, video_folder, 'metadata.json')
-                if os.path.exists(metadata_file_path):
-                    with open(metadata_file_path, 'r+', encoding='utf-8') as metadata_file:
-                        # Read all lines from metadata.json
-                        lines = metadata_file.readlines()
-                        # Update each line in metadata.json
-                        updated_lines = []
-                        for line in lines:
-                            metadata = json.loads(line)
-                            metadata['audio_filepath'] = metadata['audio_filepath'].replace(temp_dir, 'audio_files')
-                            updated_lines.append(json.dumps(metadata, ensure_ascii=False))
-                        # Write updated lines back to the file
-                        metadata_file.seek(0)
-                        metadata_file.truncate()  # Clear the file content
-                        for updated_line in updated_lines:
-                            metadata_file.write(updated_line + '\n')
-
-# Function to move content from temp_files/temp_links.txt to audio_files/processed_links.txt
-def transfer_processed_links(temp_links_file, processed_links_file):
+# A transfer is a list of video-folder renames recorded in this manifest before the first rename,
+# so a crash part-way through can be resumed (or rolled back) from the manifest alone
+MANIFEST_FILE = 'transfer_manifest.json'
+# Lock file in the job's temp folder held (with flock) while its transfer or rollback runs, in whichever worker
+TRANSFER_LOCK_FILE = '.transfer.lock'
+
+
+class TransferError(Exception):
+    pass
+
+
+class TransferBusy(TransferError):
+    pass
+
+
+# Function to hold a job's transfer lock, so two workers never plan or apply moves from one manifest at once.
+# The kernel drops an flock when its process dies, so a crashed transfer never leaves a stale lock behind.
+@contextmanager
+def _job_locked(temp_dir):
+    lock_path = os.path.join(temp_dir, TRANSFER_LOCK_FILE)
+    fd = os.open(lock_path, os.O_CREAT | os.O_WRONLY)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise TransferBusy(f"{temp_dir} is already being transferred or rolled back.")
+        # A finished transfer deletes its lock file while holding it; a lock on the deleted file protects nothing
+        try:
+            current_inode = os.stat(lock_path).st_ino
+        except FileNotFoundError:
+            current_inode = None
+        if current_inode != os.fstat(fd).st_ino:
+            raise TransferBusy(f"{temp_dir} was just transferred by another worker.")
+        yield
+    finally:
+        os.close(fd)  # Releases the flock
+
+
+# Function to move content from temp_files/temp_links.txt into the processed-video index
+def transfer_processed_links(temp_links_file):
     try:
         # Read from temp_links.txt
         if os.path.exists(temp_links_file):
             with open(temp_links_file, 'r') as temp_file:
-                temp_links = temp_file.readlines()
+                temp_links = [line.strip() for line in temp_file if line.strip()]
 
             # If there are links to transfer
             if temp_links:
-                # Append to processed_links.txt
-                with open(processed_links_file, 'a') as processed_file:
-                    processed_file.writelines(temp_links)
+                count = mark_videos_processed(temp_links)
 
                 # Delete temp_links.txt after transferring
                 os.remove(temp_links_file)
-                print(f"Successfully transferred links from {temp_links_file} to {processed_links_file} and deleted the temporary file.")
+                print(f"Successfully recorded {count} videos from {temp_links_file} in the processed-video index and deleted the temporary file.")
             else:
                 print(f"No links to transfer from {temp_links_file}.")
         else:
             print(f"{temp_links_file} does not exist.")
     except Exception as e:
         print(f"An error occurred while transferring links: {e}")
-        
-        
-# Function to transfer folders from temp_files to audio_files
-def transfer_folders(temp_dir, main_dir):
-    try:
-        # Get the list of language folders inside temp_files
-        language_folders = [folder for folder in os.listdir(temp_dir) if os.path.isdir(os.path.join(temp_dir, folder))]
-
-        for language in language_folders:
-            temp_language_path = os.path.join(temp_dir, language)
-            main_language_path = os.path.join(main_dir, language)
-
-            # Check if the language folder already exists in audio_files
-            if os.path.exists(main_language_path):
-                # If the language folder exists, move only the video folders inside it
-                for video_folder in os.listdir(temp_language_path):
-                    temp_video_path = os.path.join(temp_language_path, video_folder)
-                    main_video_path = os.path.join(main_language_path, video_folder)
-                    
-                    # Move video folder from temp_files to audio_files
-                    shutil.move(temp_video_path, main_video_path)
-                    print(f"Moved {video_folder} from {temp_language_path} to {main_language_path}.")
-
-                # Remove the empty language folder from temp_files
-                os.rmdir(temp_language_path)
-                print(f"Deleted empty folder {temp_language_path}.")
-            else:
-                # If the language folder doesn't exist, move the entire language folder
-                shutil.move(temp_language_path, main_language_path)
-                print(f"Moved {language} folder to {main_dir}.")
 
-        # After moving all language folders, remove the temp_files folder if it's empty
-        if not os.listdir(temp_dir):
+
+# Function to write a job's transfer manifest atomically
+def _write_manifest(temp_dir, manifest):
+    path = os.path.join(temp_dir, MANIFEST_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+# Function to read a job's transfer manifest, or None if no transfer was started
+def read_manifest(temp_dir):
+    path = os.path.join(temp_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+# Function to plan the renames that move every finished video folder of a job into the dataset.
+# Videos whose checkpoint is not 'chunked' (failed or unfinished) stay behind so the job can still resume them.
+def plan_transfer(temp_dir, main_dir):
+    checkpoints = read_checkpoints(temp_dir)
+    moves = []
+    for language in sorted(os.listdir(temp_dir)):
+        temp_language_path = os.path.join(temp_dir, language)
+        if not os.path.isdir(temp_language_path):
+            continue
+        for video_folder in sorted(os.listdir(temp_language_path)):
+            checkpoint = checkpoints.get(video_folder)
+            if checkpoint is not None and checkpoint['completed'] != 'chunked':
+                print(f"Skipping unfinished video {video_folder} ({checkpoint['state']}).")
+                continue
+            if os.path.isdir(os.path.join(temp_language_path, video_folder)):
+                moves.append({
+                    'language': language,
+                    'video_id': video_folder,
+                    'src': os.path.join(temp_language_path, video_folder),
+                    'dst': os.path.join(main_dir, language, video_folder),
+                })
+
+    # Every rename must stay on one filesystem, and must not land on a video that is already committed
+    if moves and os.stat(temp_dir).st_dev != os.stat(main_dir).st_dev:
+        raise TransferError(f"{temp_dir} and {main_dir} are on different filesystems; the transfer cannot be done with renames.")
+    conflicts = [move['dst'] for move in moves if os.path.exists(move['dst'])]
+    if conflicts:
+        raise TransferError(f"Videos already exist in {main_dir}: {', '.join(conflicts)}")
+    return {'created_at': time.time(), 'main_dir': main_dir, 'moves': moves}
+
+# Function to apply a manifest's renames; moves that already happened are skipped, so it doubles as resume
+def _apply_moves(manifest):
+    done = []
+    for move in manifest['moves']:
+        if not os.path.exists(move['src']) and os.path.exists(move['dst']):
+            continue  # Moved before an earlier attempt was interrupted
+        try:
+            os.makedirs(os.path.dirname(move['dst']), exist_ok=True)
+            os.rename(move['src'], move['dst'])
+        except OSError as e:
+            # Put back what this attempt moved; moves from an interrupted earlier attempt are left for resume or rollback
+            for moved in reversed(done):
+                os.rename(moved['dst'], moved['src'])
+            raise TransferError(f"Failed to move {move['src']} to {move['dst']}: {e}") from e
+        done.append(move)
+        print(f"Moved {move['video_id']} to {move['dst']}.")
+
+# Function to undo a started transfer, renaming every committed video folder back into the job's temp folder
+def rollback_transfer(unique_id):
+    temp_dir = f'temp_files_{unique_id}'
+    with _job_locked(temp_dir):
+        manifest = read_manifest(temp_dir)
+        if manifest is None:
+            return 0
+        if manifest.get('committed_at'):
+            raise TransferError(f"The transfer of job {unique_id} is already committed; run it again to finish it.")
+        restored = 0
+        for move in reversed(manifest['moves']):
+            if os.path.exists(move['dst']) and not os.path.exists(move['src']):
+                os.makedirs(os.path.dirname(move['src']), exist_ok=True)
+                os.rename(move['dst'], move['src'])
+                restored += 1
+        os.remove(os.path.join(temp_dir, MANIFEST_FILE))
+        print(f"Rolled back {restored} videos of job {unique_id}.")
+        return restored
+
+# Function to remove a job's bookkeeping files and empty folders once its videos are committed.
+# If unfinished videos are left behind, the job's status, links and checkpoints are kept so it can still be resumed.
+def _cleanup_temp_dir(temp_dir):
+    os.remove(os.path.join(temp_dir, MANIFEST_FILE))
+    for language in os.listdir(temp_dir):
+        language_dir = os.path.join(temp_dir, language)
+        if os.path.isdir(language_dir) and not os.listdir(language_dir):
+            os.rmdir(language_dir)
+    if any(os.path.isdir(os.path.join(temp_dir, name)) for name in os.listdir(temp_dir)):
+        print(f"Kept unfinished videos in {temp_dir} for resume.")
+        return
+    for name in ('job.json', 'events.jsonl', CHECKPOINT_FILE, JOB_LINKS_FILE):
+        path = os.path.join(temp_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+    # The caller still holds the lock file; it goes last, and a worker that opened it meanwhile sees it was deleted
+    if os.listdir(temp_dir) == [TRANSFER_LOCK_FILE]:
+        os.remove(os.path.join(temp_dir, TRANSFER_LOCK_FILE))
+        try:
             os.rmdir(temp_dir)
             print(f"Deleted empty folder {temp_dir}.")
-
-    except Exception as e:
-        print(f"An error occurred while transferring folders: {e}")
+        except OSError:
+            pass  # Another worker recreated the lock file; it finds nothing left to transfer
 
 
 def transfer_data(unique_id):
     try:
         # Define paths
         temp_links_file = os.path.join(f'temp_files_{unique_id}', 'temp_links.txt')
-        processed_links_file = os.path.join('audio_files', 'processed_links.txt')
         temp_dir = f'temp_files_{unique_id}'
         main_dir = 'audio_files'
 
-        # Step 1: Update metadata filepath
-        update_metadata(temp_dir)
+        if not os.path.exists(temp_dir):
+            return {"status": "error", "message": f"Folder {temp_dir} does not exist."}
+
+        # Refuse to transfer a job that is still downloading or transcribing
+        job_file = os.path.join(temp_dir, 'job.json')
+        language = ''
+        if os.path.exists(job_file):
+            with open(job_file, 'r', encoding='utf-8') as f:
+                job = json.load(f)
+            # A job whose worker died is interrupted, not running, and may be cleaned up
+            if job_is_active(job):
+                return {"status": "error", "message": f"Job {unique_id} is still {job['status']}."}
+            language = job['language'].lower()
+
+        with _job_locked(temp_dir), timed('transfer', language):
+            # Step 1: Record the planned renames, or pick up the manifest of an interrupted transfer
+            manifest = read_manifest(temp_dir)
+            if manifest is None:
+                os.makedirs(main_dir, exist_ok=True)
+                manifest = plan_transfer(temp_dir, main_dir)
+                _write_manifest(temp_dir, manifest)
+            else:
+                print(f"Resuming interrupted transfer of job {unique_id}.")
+
+            # Step 2: Rename each video folder into the dataset (metadata paths are dataset-relative, so nothing is rewritten)
+            _apply_moves(manifest)
+            # Commit point: from here on the transfer can only be completed, never rolled back
+            if not manifest.get('committed_at'):
+                manifest['committed_at'] = time.time()
+                _write_manifest(temp_dir, manifest)
 
-        # Step 2: Transfer processed links
-        transfer_processed_links(temp_links_file, processed_links_file)
+            # Step 3: Record the committed videos in the processed-video index and the catalog
+            transfer_processed_links(temp_links_file)
+            videos = [(move['language'], move['video_id']) for move in manifest['moves']]
+            add_videos(videos, main_dir)
+            for language in set(language for language, _ in videos):
+                invalidate_render_cache(language)
 
-        # Step 3: Transfer folders
-        transfer_folders(temp_dir, main_dir)
+            # Step 4: Drop the manifest and the job's leftover files
+            _cleanup_temp_dir(temp_dir)
 
-        return {"status": "success", "message": "Data transferred successfully."}
+        return {"status": "success", "message": f"Transferred {len(videos)} videos successfully."}
     except Exception as e:
-        return {"status": "error", "message": f"An error occurred during data transfer: {e}"}
\ No newline at end of file
+        return {"status": "error", "message": f"An error occurred during data transfer: {e}"}
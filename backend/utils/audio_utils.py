@@ -0,0 +1,135 @@
+import os
+import hashlib
+import subprocess
+import wave
+import numpy as np
+
+# Every audio file the pipeline works on is 16 kHz, mono, 16-bit PCM
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2
+
+# Chunk output codecs: file extension and ffmpeg encoder arguments (Opus takes the job's bitrate)
+CHUNK_CODECS = {
+    'wav': ('wav', None),
+    'flac': ('flac', ['-c:a', 'flac', '-compression_level', '8']),
+    'opus': ('opus', ['-c:a', 'libopus', '-application', 'voip']),
+}
+DEFAULT_OPUS_BITRATE = os.environ.get("DEFAULT_OPUS_BITRATE", "32k")
+
+# Function to build the ffmpeg arguments that resample and downmix any container to 16 kHz mono PCM
+def _ffmpeg_decode_args(source_path):
+    return ['ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+            '-i', source_path, '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE)]
+
+# Function to decode a downloaded container straight into the final 16 kHz mono WAV
+def decode_to_wav(source_path, wav_file_path):
+    subprocess.run(_ffmpeg_decode_args(source_path) + ['-c:a', 'pcm_s16le', '-f', 'wav', wav_file_path], check=True)
+    return wav_file_path
+
+# Function to decode a downloaded container into an in-memory int16 sample array
+def decode_to_array(source_path):
+    result = subprocess.run(_ffmpeg_decode_args(source_path) + ['-f', 's16le', '-c:a', 'pcm_s16le', '-'],
+                            check=True, stdout=subprocess.PIPE)
+    return np.frombuffer(result.stdout, dtype=np.int16)
+
+# Function to convert a time in seconds to a sample index (truncating, like pydub's millisecond slicing)
+def seconds_to_sample(seconds):
+    return max(int(seconds * 1000 * (SAMPLE_RATE / 1000.0)), 0)
+
+# Function to load a 16 kHz mono WAV into one int16 sample array
+def read_wav(wav_file_path):
+    with wave.open(wav_file_path, 'rb') as wav_file:
+        if wav_file.getsampwidth() != SAMPLE_WIDTH or wav_file.getframerate() != SAMPLE_RATE:
+            raise ValueError(f"{wav_file_path} is not 16-bit {SAMPLE_RATE} Hz PCM")
+        samples = np.frombuffer(wav_file.readframes(wav_file.getnframes()), dtype=np.int16)
+        channels = wav_file.getnchannels()
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    return samples
+
+# Windowed reader over a 16 kHz mono WAV: only the requested sample range is ever held in memory
+class WavReader:
+    def __init__(self, wav_file_path):
+        self._wav_file = wave.open(wav_file_path, 'rb')
+        if self._wav_file.getsampwidth() != SAMPLE_WIDTH or self._wav_file.getframerate() != SAMPLE_RATE:
+            self._wav_file.close()
+            raise ValueError(f"{wav_file_path} is not 16-bit {SAMPLE_RATE} Hz PCM")
+        self.channels = self._wav_file.getnchannels()
+        self.num_samples = self._wav_file.getnframes()
+
+    def read(self, start, end):
+        start = min(max(start, 0), self.num_samples)
+        end = min(max(end, start), self.num_samples)
+        self._wav_file.setpos(start)
+        samples = np.frombuffer(self._wav_file.readframes(end - start), dtype=np.int16)
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1).astype(np.int16)
+        return samples
+
+    def read_ranges(self, ranges):
+        return np.concatenate([self.read(start, end) for start, end in ranges]) if ranges else np.zeros(0, dtype=np.int16)
+
+    def close(self):
+        self._wav_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Function to hash a WAV's samples (not its header), reading it block by block
+def pcm_sha256(wav_file_path, block_samples=60 * SAMPLE_RATE):
+    digest = hashlib.sha256()
+    with WavReader(wav_file_path) as reader:
+        for start in range(0, reader.num_samples, block_samples):
+            digest.update(reader.read(start, start + block_samples).tobytes())
+    return digest.hexdigest()
+
+# Function to split a WAV (or its [start, stop) span) into windows of at most window_samples, cutting each window
+# at the quietest 20 ms frame in its last search_samples so words are rarely split between windows; yields (start, end)
+def quiet_windows(reader, window_samples, search_samples, start=0, stop=None):
+    frame = SAMPLE_RATE // 50
+    stop = reader.num_samples if stop is None else min(stop, reader.num_samples)
+    while start < stop:
+        end = start + window_samples
+        if end >= stop:
+            yield start, stop
+            return
+        search_start = max(start + 1, end - search_samples)
+        region = reader.read(search_start, end).astype(np.float32)
+        frames = len(region) // frame
+        if frames > 1:
+            energy = np.square(region[:frames * frame]).reshape(frames, frame).mean(axis=1)
+            end = search_start + int(np.argmin(energy)) * frame + frame // 2
+        yield start, end
+        start = end
+
+# Function to write sample ranges of one array to a WAV file; each range is written as a view, without concatenating
+def write_wav(wav_file_path, samples, ranges):
+    with wave.open(wav_file_path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(SAMPLE_WIDTH)
+        wav_file.setframerate(SAMPLE_RATE)
+        for start, end in ranges:
+            wav_file.writeframesraw(samples[start:end])
+    return sum(end - start for start, end in ranges)
+
+# Function to encode sample ranges of one array into a chunk file with the given codec; returns the sample count
+def encode_chunk(chunk_path, samples, ranges, codec='wav', bitrate=None):
+    if codec == 'wav':
+        return write_wav(chunk_path, samples, ranges)
+    encoder_args = list(CHUNK_CODECS[codec][1])
+    if codec == 'opus':
+        encoder_args += ['-b:a', bitrate or DEFAULT_OPUS_BITRATE]
+    pcm = b''.join(samples[start:end].tobytes() for start, end in ranges)
+    subprocess.run(['ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+                    '-f', 's16le', '-ar', str(SAMPLE_RATE), '-ac', '1', '-i', 'pipe:0'] + encoder_args + [chunk_path],
+                   input=pcm, check=True)
+    return len(pcm) // SAMPLE_WIDTH
+
+# Function to load any chunk file as int16 samples (WAV is read directly, other codecs go through ffmpeg)
+def read_chunk(chunk_path):
+    if chunk_path.endswith('.wav'):
+        return read_wav(chunk_path)
+    return decode_to_array(chunk_path)
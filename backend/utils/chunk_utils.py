@@ -0,0 +1,63 @@
+import random
+from backend.utils.audio_utils import SAMPLE_RATE, seconds_to_sample
+
+# Chunking rules: a random target between MIN and MAX seconds, short gaps absorbed, hard cap at MAX seconds
+MIN_CHUNK_SECONDS = 16
+MAX_CHUNK_SECONDS = 29
+SILENCE_THRESHOLD_SECONDS = 3
+
+# Function to append a sample range to a chunk, merging it with the previous range when they touch
+def extend_ranges(ranges, start, end):
+    if end <= start:
+        return
+    if ranges and ranges[-1][1] == start:
+        ranges[-1] = (ranges[-1][0], end)
+    else:
+        ranges.append((start, end))
+
+# Function to plan every chunk's captions and sample ranges before any audio is written.
+# segments is a list of (start, end, text) in seconds. total_samples clamps ranges to the audio length.
+# Pass seed (or an rng with randint) for reproducible plans; by default the global random module is used.
+def plan_chunks(segments, total_samples=None, seed=None, rng=None,
+                min_duration=MIN_CHUNK_SECONDS, max_duration=MAX_CHUNK_SECONDS,
+                silence_threshold=SILENCE_THRESHOLD_SECONDS):
+    rng = rng or (random.Random(seed) if seed is not None else random)
+
+    def to_sample(seconds):
+        sample = seconds_to_sample(seconds)
+        return sample if total_samples is None else min(sample, total_samples)
+
+    def new_chunk():
+        return {'ranges': [], 'captions': [], 'duration': 0.0}
+
+    plans = []
+    current = new_chunk()
+    chunk_duration_limit = rng.randint(min_duration, max_duration)
+
+    for idx, (segment_start, segment_end, text) in enumerate(segments):
+        extend_ranges(current['ranges'], to_sample(segment_start), to_sample(segment_end))
+        current['captions'].append((segment_start, segment_end, text))
+
+        # Include the gap to the next segment when it is short enough
+        next_segment_start = segments[idx + 1][0] if idx + 1 < len(segments) else None
+        if next_segment_start and next_segment_start - segment_end <= silence_threshold:
+            extend_ranges(current['ranges'], to_sample(segment_end), to_sample(next_segment_start))
+
+        current['duration'] = sum(end - start for start, end in current['ranges']) / SAMPLE_RATE
+        if current['duration'] >= chunk_duration_limit or current['duration'] > max_duration:
+            plans.append(current)
+            current = new_chunk()
+            chunk_duration_limit = rng.randint(min_duration, max_duration)
+
+    # A leftover within the allowed range is its own chunk; anything else joins the previous chunk
+    if current['ranges']:
+        if min_duration <= current['duration'] <= max_duration:
+            plans.append(current)
+        elif plans:
+            previous = plans[-1]
+            for start, end in current['ranges']:
+                extend_ranges(previous['ranges'], start, end)
+            previous['captions'].extend(current['captions'])
+            previous['duration'] += current['duration']
+
+    return plans
@@ -0,0 +1,43 @@
+import os
+import sqlite3
+import threading
+
+# One connection per (thread, database file); SQLite connections must not be shared across threads
+_local = threading.local()
+
+# Function to open (or reuse) a WAL-mode SQLite connection that is safe for concurrent uvicorn workers
+def connect(db_path):
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(db_path)
+    if conn is None:
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode; multi-statement writes use explicit BEGIN IMMEDIATE transactions
+        conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=30000')
+        connections[db_path] = conn
+    return conn
+
+# Function to run a block of writes in a single immediate transaction
+class transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute('BEGIN IMMEDIATE')
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+        return False
+
+# Function to split a list into batches small enough for one SQL "IN (...)" clause
+def batched(items, size=500):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
@@ -0,0 +1,59 @@
+import os
+import time
+from backend.utils.db_utils import connect, transaction, batched
+from backend.utils.utils import extract_video_id
+
+# Persistent index of committed videos, keyed by YouTube video ID
+PROCESSED_INDEX_PATH = os.path.join('audio_files', 'processed_videos.db')
+LEGACY_PROCESSED_LINKS_FILE = os.path.join('audio_files', 'processed_links.txt')
+
+_initialised = set()
+
+# Function to open the index, creating it and importing processed_links.txt the first time
+def _index(db_path=PROCESSED_INDEX_PATH):
+    conn = connect(db_path)
+    if db_path not in _initialised:
+        conn.execute('CREATE TABLE IF NOT EXISTS processed_videos (video_id TEXT PRIMARY KEY, link TEXT, processed_at REAL)')
+        conn.execute('CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value TEXT)')
+        legacy_file = os.path.join(os.path.dirname(db_path), os.path.basename(LEGACY_PROCESSED_LINKS_FILE))
+        with transaction(conn):
+            imported = conn.execute("SELECT value FROM index_meta WHERE key = 'legacy_import'").fetchone()
+            if not imported:
+                count = _import_links_file(conn, legacy_file)
+                conn.execute("INSERT INTO index_meta (key, value) VALUES ('legacy_import', ?)", (str(time.time()),))
+                print(f"Imported {count} processed links from {legacy_file} into {db_path}")
+        _initialised.add(db_path)
+    return conn
+
+# Function to copy the links of a processed_links.txt file into the index (inside the caller's transaction)
+def _import_links_file(conn, links_file):
+    if not os.path.exists(links_file):
+        return 0
+    with open(links_file, 'r') as f:
+        links = [line.strip() for line in f if line.strip()]
+    rows = [(video_id, link, time.time()) for link in links for video_id in [extract_video_id(link)] if video_id]
+    conn.executemany('INSERT OR IGNORE INTO processed_videos (video_id, link, processed_at) VALUES (?, ?, ?)', rows)
+    return len(rows)
+
+# Function to check whether a single video ID has been committed
+def is_video_processed(video_id, db_path=PROCESSED_INDEX_PATH):
+    row = _index(db_path).execute('SELECT 1 FROM processed_videos WHERE video_id = ?', (video_id,)).fetchone()
+    return row is not None
+
+# Function to look up a whole batch of video IDs at once; returns the subset already committed
+def filter_processed(video_ids, db_path=PROCESSED_INDEX_PATH):
+    conn = _index(db_path)
+    processed = set()
+    for batch in batched(set(v for v in video_ids if v)):
+        placeholders = ','.join('?' * len(batch))
+        rows = conn.execute(f'SELECT video_id FROM processed_videos WHERE video_id IN ({placeholders})', batch)
+        processed.update(row[0] for row in rows)
+    return processed
+
+# Function to record links as committed; safe to call from several workers at once
+def mark_videos_processed(links, db_path=PROCESSED_INDEX_PATH):
+    rows = [(video_id, link, time.time()) for link in links for video_id in [extract_video_id(link)] if video_id]
+    conn = _index(db_path)
+    with transaction(conn):
+        conn.executemany('INSERT OR IGNORE INTO processed_videos (video_id, link, processed_at) VALUES (?, ?, ?)', rows)
+    return len(rows)
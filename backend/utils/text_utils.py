@@ -0,0 +1,47 @@
+import os
+import json
+import string
+from collections import Counter
+from functools import lru_cache
+from nltk.corpus import stopwords
+
+WORD_COUNTS_FILE = 'word_counts.json'
+
+# Translation table that strips punctuation, built once
+_PUNCTUATION_TABLE = str.maketrans('', '', string.punctuation)
+
+# Function to load the stopword set of a language once per process (empty for languages NLTK has no list for)
+@lru_cache(maxsize=None)
+def get_stopwords(language):
+    try:
+        return frozenset(stopwords.words(language))
+    except OSError as e:
+        print(f"No stopword list available for {language}: {e}")
+        return frozenset()
+
+# Function to count words and stopwords over transcript lines
+def count_words(texts, language):
+    stop_words = get_stopwords(language)
+    word_freq = Counter()
+    stopword_freq = Counter()
+    for text in texts:
+        words = text.lower().translate(_PUNCTUATION_TABLE).split()
+        word_freq.update(word for word in words if word not in stop_words)
+        stopword_freq.update(word for word in words if word in stop_words)
+    return word_freq, stopword_freq
+
+# Function to write a video's word and stopword counts next to its metadata.json
+def write_word_counts(video_dir, texts, language):
+    word_freq, stopword_freq = count_words(texts, language)
+    counts = {'language': language, 'words': dict(word_freq), 'stopwords': dict(stopword_freq)}
+    with open(os.path.join(video_dir, WORD_COUNTS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(counts, f, ensure_ascii=False)
+    return counts
+
+# Function to read a video's precomputed counts, or None if the video predates them
+def read_word_counts(video_dir):
+    path = os.path.join(video_dir, WORD_COUNTS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
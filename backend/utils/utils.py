@@ -1,5 +1,3 @@
-import os
-
 # Function to extract video_id from url
 def extract_video_id(youtube_url):
     try:
@@ -19,16 +17,14 @@ def extract_video_id(youtube_url):
         return None
 
 
-# Function to check if the link has been processed
-def is_link_processed(link, processed_links_file):
-    if not os.path.exists(processed_links_file):
-        open(processed_links_file, 'w').close()  # Create file if it doesn't exist
-        return False
-
-    with open(processed_links_file, 'r') as file:
-        processed_links = [line.strip() for line in file.readlines()]
+# Function to express a chunk's audio_filepath relative to the dataset root
+# (metadata.json files written before paths became relative start with 'audio_files/' or 'temp_files_<id>/')
+def dataset_relative_path(audio_filepath):
+    parts = audio_filepath.replace('\\', '/').split('/')
+    if len(parts) > 1 and (parts[0] == 'audio_files' or parts[0].startswith('temp_files_')):
+        parts = parts[1:]
+    return '/'.join(parts)
 
-    return link in processed_links
 
 # Function to add a link to the processed list
 def mark_link_as_processed(link, processed_links_file):
@@ -41,20 +37,26 @@ def convert_srt_time_to_seconds(srt_time):
     seconds, milliseconds = seconds.split(',')
     return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(milliseconds) / 1000
 
+# Function to parse an SRT file into (start, end, text) segments; captions may span several lines
+def parse_srt_file(srt_file_path):
+    segments = []
+    with open(srt_file_path, 'r', encoding='utf-8') as srt_file:
+        blocks = srt_file.read().replace('\r\n', '\n').strip().split('\n\n')
+    for block in blocks:
+        lines = [line.strip() for line in block.split('\n') if line.strip()]
+        timing_index = next((i for i, line in enumerate(lines) if ' --> ' in line), None)
+        if timing_index is None:
+            continue
+        start, end = lines[timing_index].split(' --> ')
+        text = ' '.join(lines[timing_index + 1:])
+        segments.append((convert_srt_time_to_seconds(start.strip()), convert_srt_time_to_seconds(end.strip()), text))
+    return segments
+
 # Function to format timestamps for SRT
 def format_timestamp(seconds):
     millisec = int((seconds - int(seconds)) * 1000)
     return "{:02}:{:02}:{:02},{:03}".format(int(seconds // 3600), int((seconds % 3600) // 60), int(seconds % 60), millisec)
 
-# Function to append new captions to an existing SRT file
-def append_srt_chunk(srt_file_path, captions):
-    with open(srt_file_path, 'a', encoding='utf-8') as srt_file:
-        current_index = sum(1 for _ in open(srt_file_path)) // 4  # Get the current number of captions
-        for index, (start, end, text) in enumerate(captions):
-            srt_file.write(f"{current_index + index + 1}\n")
-            srt_file.write(f"{format_timestamp(start)} --> {format_timestamp(end)}\n")
-            srt_file.write(f"{text}\n\n")
-            
 # Function to save a chunk of captions to an SRT file
 def save_srt_chunk(captions, srt_file_path):
     with open(srt_file_path, 'w', encoding='utf-8') as srt_file:
@@ -0,0 +1,191 @@
+import os
+import json
+import bisect
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from backend.utils.audio_utils import SAMPLE_RATE
+
+# Voice-activity pre-pass: frame energy, zero-crossing rate and energy modulation decide which spans reach Whisper.
+# Settings are per language on top of the defaults; VAD_OVERRIDES takes JSON such as {"hindi": {"margin_db": 8}}.
+VAD_ENABLED = os.environ.get("VAD_ENABLED", "true").lower() == "true"
+VAD_DEFAULTS = {
+    'frame_ms': 30,               # Analysis frame length
+    'floor_percentile': 10,       # Percentile of frame energies taken as the noise floor
+    'margin_db': 10.0,            # Speech must be this far above the noise floor...
+    'min_energy_db': -55.0,       # ...and above this absolute level (dBFS)
+    'max_zcr': 0.35,              # Frames crossing zero more often than this are hiss or broadband noise
+    'modulation_seconds': 1.0,    # Window over which energy modulation is measured
+    'min_modulation_db': 2.0,     # Speech rises and falls with syllables; steady music beds and hum do not
+    'bed_seconds': 3.0,           # Under a music bed the floor is the quietest frame within this window...
+    'bed_margin_db': 3.0,         # ...and speech only has to clear that local floor by this much
+    'min_speech_seconds': 0.25,   # Shorter bursts are dropped
+    'min_silence_seconds': 1.0,   # Shorter gaps are bridged
+    'pad_seconds': 0.3,           # Context kept around every region so word edges are not clipped
+    'min_speech_ratio': 0.05,     # Less speech than this share of the non-silent audio means VAD failed: keep everything
+}
+VAD_LANGUAGE_SETTINGS = {
+    'english': {},
+    'german': {},
+    # Hindi has many low-energy nasal and aspirated endings; keep more around each region
+    'hindi': {'margin_db': 8.0, 'pad_seconds': 0.4},
+}
+VAD_OVERRIDES = json.loads(os.environ.get("VAD_OVERRIDES", "{}"))
+VAD_BLOCK_SECONDS = 60
+
+
+# Function to merge the VAD settings for a language
+def vad_settings(language=None, **overrides):
+    settings = dict(VAD_DEFAULTS)
+    settings.update(VAD_LANGUAGE_SETTINGS.get(language, {}))
+    settings.update(VAD_OVERRIDES.get(language, {}))
+    settings.update(overrides)
+    return settings
+
+# Function to compute per-frame energy (dBFS) and zero-crossing rate of int16 samples
+def frame_features(samples, frame):
+    frames = len(samples) // frame
+    x = samples[:frames * frame].astype(np.float32).reshape(frames, frame) / 32768.0
+    energy_db = 10 * np.log10(np.mean(np.square(x), axis=1) + 1e-10)
+    signs = np.signbit(x)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (frame - 1)
+    return energy_db, zcr
+
+# Function to compute a centred rolling standard deviation with cumulative sums
+def _rolling_std(values, width):
+    if len(values) == 0:
+        return values
+    width = max(1, min(width, len(values)))
+    padded = np.pad(values, (width // 2, width - 1 - width // 2), mode='edge').astype(np.float64)
+    sums = np.concatenate([[0.0], np.cumsum(padded)])
+    squares = np.concatenate([[0.0], np.cumsum(np.square(padded))])
+    mean = (sums[width:] - sums[:-width]) / width
+    return np.sqrt(np.maximum((squares[width:] - squares[:-width]) / width - np.square(mean), 0))
+
+# Function to compute a centred rolling minimum
+def _rolling_min(values, width):
+    if len(values) == 0:
+        return values
+    width = max(1, min(width, len(values)))
+    padded = np.pad(values, (width // 2, width - 1 - width // 2), mode='edge')
+    return sliding_window_view(padded, width).min(axis=1)
+
+# Function to mark speech frames from their features.
+# A frame must clear the file's noise floor by margin_db, or, under a steady music bed that lifts that floor,
+# the quietest frame around it by bed_margin_db; either way it must also be modulated like speech.
+def speech_frames(energy_db, zcr, settings):
+    if len(energy_db) == 0:
+        return np.zeros(0, dtype=bool)
+    frames_per_second = 1000 / settings['frame_ms']
+    file_threshold = np.percentile(energy_db, settings['floor_percentile']) + settings['margin_db']
+    bed_threshold = _rolling_min(energy_db, int(settings['bed_seconds'] * frames_per_second)) + settings['bed_margin_db']
+    threshold = np.maximum(settings['min_energy_db'], np.minimum(file_threshold, bed_threshold))
+    modulation = _rolling_std(energy_db, int(settings['modulation_seconds'] * frames_per_second))
+    return (energy_db > threshold) & (zcr < settings['max_zcr']) & (modulation >= settings['min_modulation_db'])
+
+# Function to fall back to the whole recording when VAD finds almost no speech in audio that is not silent;
+# losing a video's transcript to a missed detection is worse than transcribing its music
+def _speech_or_everything(regions, energy_db, settings, total_samples):
+    frame = SAMPLE_RATE * settings['frame_ms'] // 1000
+    active_samples = int(np.count_nonzero(energy_db > settings['min_energy_db'])) * frame
+    speech_samples = sum(end - start for start, end in regions)
+    if active_samples and speech_samples < settings['min_speech_ratio'] * active_samples:
+        print(f"Voice activity found {speech_samples / SAMPLE_RATE:.1f}s of speech in {active_samples / SAMPLE_RATE:.1f}s "
+              f"of sound; transcribing the whole recording instead")
+        return [(0, total_samples)]
+    return regions
+
+# Function to turn a speech-frame mask into padded (start, end) sample regions
+def frames_to_regions(mask, settings, total_samples):
+    frame = SAMPLE_RATE * settings['frame_ms'] // 1000
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], mask.astype(np.int8), [0]])))
+    regions = []
+    for start_frame, end_frame in zip(edges[::2], edges[1::2]):
+        start, end = int(start_frame) * frame, int(end_frame) * frame
+        # Bridge short gaps
+        if regions and start - regions[-1][1] < settings['min_silence_seconds'] * SAMPLE_RATE:
+            regions[-1] = (regions[-1][0], end)
+        else:
+            regions.append((start, end))
+
+    pad = int(settings['pad_seconds'] * SAMPLE_RATE)
+    padded = []
+    for start, end in regions:
+        if end - start < settings['min_speech_seconds'] * SAMPLE_RATE:
+            continue
+        start, end = max(start - pad, 0), min(end + pad, total_samples)
+        if padded and start <= padded[-1][1]:
+            padded[-1] = (padded[-1][0], end)
+        else:
+            padded.append((start, end))
+    return padded
+
+# Function to find the speech regions of an int16 array
+def detect_speech_in_samples(samples, settings):
+    energy_db, zcr = frame_features(samples, SAMPLE_RATE * settings['frame_ms'] // 1000)
+    regions = frames_to_regions(speech_frames(energy_db, zcr, settings), settings, len(samples))
+    return _speech_or_everything(regions, energy_db, settings, len(samples))
+
+# Function to find the speech regions of a WAV, reading it block by block through a WavReader
+def detect_speech(reader, settings):
+    frame = SAMPLE_RATE * settings['frame_ms'] // 1000
+    block = (VAD_BLOCK_SECONDS * SAMPLE_RATE // frame) * frame
+    energies, zcrs = [], []
+    for start in range(0, reader.num_samples, block):
+        energy_db, zcr = frame_features(reader.read(start, start + block), frame)
+        energies.append(energy_db)
+        zcrs.append(zcr)
+    if not energies:
+        return []
+    energy_db = np.concatenate(energies)
+    regions = frames_to_regions(speech_frames(energy_db, np.concatenate(zcrs), settings), settings, reader.num_samples)
+    return _speech_or_everything(regions, energy_db, settings, reader.num_samples)
+
+# Function to pack (start, end) pieces into transcription windows of at most window_samples in total
+def pack_regions(pieces, window_samples):
+    windows = []
+    size = window_samples
+    for start, end in pieces:
+        if size + (end - start) > window_samples:
+            windows.append([])
+            size = 0
+        windows[-1].append((start, end))
+        size += end - start
+    return windows
+
+
+# Maps times in a window built by concatenating pieces back onto the original recording
+class PackedTimeline:
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.offsets = [0]
+        for start, end in pieces:
+            self.offsets.append(self.offsets[-1] + end - start)
+        self.num_samples = self.offsets[-1]
+
+    def _sample(self, seconds):
+        return min(max(int(round(seconds * SAMPLE_RATE)), 0), self.num_samples)
+
+    def _piece(self, sample, is_end=False):
+        # An end time that lands exactly on a seam belongs to the piece before it
+        index = (bisect.bisect_left if is_end else bisect.bisect_right)(self.offsets, sample) - 1
+        return min(max(index, 0), len(self.pieces) - 1)
+
+    def to_original(self, seconds, is_end=False):
+        sample = self._sample(seconds)
+        index = self._piece(sample, is_end)
+        return (self.pieces[index][0] + sample - self.offsets[index]) / SAMPLE_RATE
+
+    # Maps a (start, end) segment back onto the recording. A segment crossing a seam between pieces that are
+    # not adjacent in the recording would bring back the audio skipped between them, so it is clipped to the
+    # piece holding most of it (the earlier one on a tie).
+    def to_original_span(self, start, end):
+        start_sample, end_sample = self._sample(start), self._sample(end)
+        first, last = self._piece(start_sample), self._piece(end_sample, is_end=True)
+        if last <= first or all(self.pieces[i][1] == self.pieces[i + 1][0] for i in range(first, last)):
+            return self.to_original(start), self.to_original(end, is_end=True)
+        index = max(range(first, last + 1),
+                    key=lambda i: (min(end_sample, self.offsets[i + 1]) - max(start_sample, self.offsets[i]), -i))
+        clipped_start = max(start_sample, self.offsets[index])
+        clipped_end = min(end_sample, self.offsets[index + 1])
+        return ((self.pieces[index][0] + clipped_start - self.offsets[index]) / SAMPLE_RATE,
+                (self.pieces[index][0] + clipped_end - self.offsets[index]) / SAMPLE_RATE)
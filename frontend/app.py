@@ -1,5 +1,6 @@
 import streamlit as st
 import requests
+import json
 
 BACKEND_URL_PROCESS = "http://localhost:8080/process/"
 BACKEND_URL_TRANSFER = "http://localhost:8080/transfer/"
@@ -8,6 +9,9 @@ BACKEND_URL_WORDCLOUD = "http://localhost:8080/wordcloud/"
 BACKEND_URL_HISTOGRAM = "http://localhost:8080/histograms/"
 BACKEND_URL_LANGUAGES = "http://localhost:8080/language_folders/"
 BACKEND_URL_VIDEOS = "http://localhost:8080/video_folders/"
+BACKEND_URL_JOBS = "http://localhost:8080/jobs/"
+BACKEND_URL_MODELS = "http://localhost:8080/models/"
+EVENT_STREAM_TIMEOUT_SECONDS = 60
 
 # App title and description
 st.title("Audio Data Generator 🎥➡️📝")
@@ -73,6 +77,59 @@ if selected_language and (st.session_state.selected_language != selected_languag
     # Fetch videos and store in session state
     st.session_state.videos = get_videos(selected_language)
 
+# Function to fetch a visualisation, revalidating the copy from the previous click with its ETag
+def get_image(url):
+    if 'image_cache' not in st.session_state:
+        st.session_state.image_cache = {}
+    cached = st.session_state.image_cache.get(url)
+    headers = {"If-None-Match": cached["etag"]} if cached else {}
+    response = requests.get(url, headers=headers)
+    if response.status_code == 304 and cached:
+        return 200, cached["content"]
+    if response.status_code == 200 and response.headers.get("ETag"):
+        st.session_state.image_cache[url] = {"etag": response.headers["ETag"], "content": response.content}
+    return response.status_code, response.content
+
+# Function to describe one video's latest progress event
+def describe_video_progress(event):
+    stage = event.get("stage")
+    if stage == "downloading" and event.get("total_bytes"):
+        return f"downloading {event['downloaded_bytes'] * 100 // event['total_bytes']}%"
+    if stage == "transcribing" and event.get("percent") is not None:
+        return f"transcribing {event['percent']}%"
+    if stage == "chunking" and event.get("chunks_total"):
+        return f"chunking {event['chunks_written']}/{event['chunks_total']}"
+    if stage == "waiting":
+        return "waiting for another job processing this video"
+    if stage == "failed":
+        return f"failed: {event.get('message')}"
+    return stage
+
+# Function to follow a job's server-sent progress events until it finishes; returns the final job status
+def follow_job_events(unique_id, status_placeholder, progress_placeholder):
+    videos = {}
+    last_event_id = None
+    while True:
+        headers = {"Last-Event-ID": last_event_id} if last_event_id else {}
+        try:
+            with requests.get(f"{BACKEND_URL_JOBS}{unique_id}/events", headers=headers, stream=True,
+                              timeout=EVENT_STREAM_TIMEOUT_SECONDS) as response:
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith("id:"):
+                        last_event_id = line[3:].strip()
+                    elif line.startswith("data:"):
+                        event = json.loads(line[5:])
+                        if event["type"] == "video":
+                            videos[event["video_id"]] = describe_video_progress(event)
+                            progress_placeholder.markdown("\n".join(f"- `{video_id}`: {status}" for video_id, status in videos.items()))
+                        done = sum(1 for status in videos.values() if status == "processed")
+                        status_placeholder.write(f"{done}/{len(videos)} videos processed")
+        except requests.exceptions.RequestException:
+            pass  # Reconnect and resume after the last event received
+        job = requests.get(f"{BACKEND_URL_JOBS}{unique_id}").json()
+        if job.get("status") in ("completed", "failed", "interrupted"):
+            return job
+
 # Dropdown for video selection (optional)
 if selected_language:
     selected_video = st.selectbox("Select your video (optional)", [""] + st.session_state.videos)
@@ -82,34 +139,34 @@ if selected_language:
     if st.button("Generate Visualisations"):
         if selected_video == "":
             # Only language selected
-            wordcloud_response = requests.get(f"{BACKEND_URL_WORDCLOUD}?language={selected_language.lower()}")
-            histogram_response = requests.get(f"{BACKEND_URL_HISTOGRAM}?language={selected_language.lower()}")
+            wordcloud_status, wordcloud_image = get_image(f"{BACKEND_URL_WORDCLOUD}?language={selected_language.lower()}")
+            histogram_status, histogram_image = get_image(f"{BACKEND_URL_HISTOGRAM}?language={selected_language.lower()}")
 
-            if wordcloud_response.status_code == 200:
-                st.image(wordcloud_response.content, caption="Generated Wordcloud")
+            if wordcloud_status == 200:
+                st.image(wordcloud_image, caption="Generated Wordcloud")
             else:
                 st.error("Error generating wordcloud.")
 
-            if histogram_response.status_code == 200:
-                st.image(histogram_response.content, caption="Generated Histogram")
+            if histogram_status == 200:
+                st.image(histogram_image, caption="Generated Histogram")
             else:
                 st.error("Error generating histogram.")
         else:
             # Both language and video selected
-            wordcloud_response = requests.get(
+            wordcloud_status, wordcloud_image = get_image(
                 f"{BACKEND_URL_WORDCLOUD}?language={selected_language.lower()}&video_code={selected_video}"
             )
-            histogram_response = requests.get(
+            histogram_status, histogram_image = get_image(
                 f"{BACKEND_URL_HISTOGRAM}?language={selected_language.lower()}&video_code={selected_video}"
             )
 
-            if wordcloud_response.status_code == 200:
-                st.image(wordcloud_response.content, caption="Generated Wordcloud")
+            if wordcloud_status == 200:
+                st.image(wordcloud_image, caption="Generated Wordcloud")
             else:
                 st.error("Error generating wordcloud.")
 
-            if histogram_response.status_code == 200:
-                st.image(histogram_response.content, caption="Generated Histogram")
+            if histogram_status == 200:
+                st.image(histogram_image, caption="Generated Histogram")
             else:
                 st.error("Error generating histogram.")
 
@@ -132,12 +189,51 @@ if 'file_processed' not in st.session_state:
 if 'unique_id' not in st.session_state:
     st.session_state.unique_id = None
 
+if 'failed_videos' not in st.session_state:
+    st.session_state.failed_videos = 0
+
+# Function to show how a finished job went and remember it for the transfer, delete and retry buttons
+def report_job_outcome(unique_id, job):
+    result = job.get("result") or {}
+    st.session_state.unique_id = unique_id
+    st.session_state.failed_videos = result.get("failed_videos", 0)
+    if job.get("status") == "completed":
+        if st.session_state.failed_videos:
+            failed = [video for video in result.get("processed_videos", []) if video["status"] == "failed"]
+            st.warning(f"{len(failed)} videos failed and were skipped ⚠️\n"
+                       + "\n".join(f"- {video['link']}: {video['error']}" for video in failed))
+        else:
+            st.success("File processed successfully! 🎉")
+        st.session_state.file_processed = True  # Update session state after successful processing
+    elif job.get("status") == "interrupted":
+        # The worker died mid-job; every video it had not finished can be retried from its checkpoints
+        st.session_state.failed_videos = sum(1 for video in job.get("videos", {}).values() if video.get("status") != "processed") or 1
+        st.warning(f"{job.get('message')} Retry to continue where it stopped ⚠️")
+    else:
+        st.error(f"Error: {job.get('message')} ❌")
+
 # File uploader for .txt file
 uploaded_file = st.file_uploader("Upload a text file with YouTube links", type=["txt"])
 
 # Dropdown for language selection in file processing section
 file_language = st.selectbox("Select a language for transcription", ["", "English", "Hindi", "German"])
 
+# Dropdown for the audio format of the generated chunks (Opus also takes a bitrate)
+chunk_codec = st.selectbox("Select the audio format of the chunks", ["WAV", "FLAC", "Opus"])
+opus_bitrate = st.selectbox("Select the Opus bitrate", ["16k", "24k", "32k", "48k", "64k"], index=2) if chunk_codec == "Opus" else None
+
+# Dropdowns for the transcription engine and model size (the quantized engine is faster on CPU, slightly less accurate)
+ASR_ENGINES = {"Whisper (PyTorch)": "whisper", "Faster-Whisper (int8)": "faster-whisper"}
+if 'asr_engines' not in st.session_state:
+    # Only offer the engines installed on the backend (faster-whisper is an optional dependency)
+    try:
+        st.session_state.asr_engines = requests.get(BACKEND_URL_MODELS).json().get("engines", ["whisper"])
+    except Exception:
+        st.session_state.asr_engines = ["whisper"]
+ASR_ENGINES = {label: engine for label, engine in ASR_ENGINES.items() if engine in st.session_state.asr_engines}
+asr_engine = st.selectbox("Select the transcription engine", list(ASR_ENGINES))
+asr_model = st.selectbox("Select the transcription model", ["tiny", "base", "small", "medium"], index=1)
+
 # Button to trigger processing
 if uploaded_file and file_language != "":
     if st.button("Submit", key="submit_button"):
@@ -146,26 +242,29 @@ if uploaded_file and file_language != "":
 
         # Create a dictionary for the POST request with the file and form data
         files = {"file": (uploaded_file.name, file_bytes)}
-        data = {"language": file_language.lower()}
+        data = {"language": file_language.lower(), "codec": chunk_codec.lower(),
+                "asr_backend": ASR_ENGINES[asr_engine], "asr_model": asr_model}
+        if opus_bitrate:
+            data["bitrate"] = opus_bitrate
 
-        # Make the API request to the FastAPI backend
+        # Queue the job with the FastAPI backend, then follow its progress until it finishes
         try:
-            with st.spinner('Processing your request...'):
-                response = requests.post(BACKEND_URL_PROCESS, files=files, data=data)
+            response = requests.post(BACKEND_URL_PROCESS, files=files, data=data)
 
             # Check the status of the response
-            if response.status_code == 200:
-                result = response.json()
-                st.success("File processed successfully! 🎉")
+            if response.status_code == 202:
+                unique_id = response.json().get("unique_id")
+                st.write(f"Unique ID: {unique_id}")  # Display the unique ID on the frontend
 
-                # Store the unique_id in session state
-                st.session_state.unique_id = result.get("unique_id")
-                st.session_state.file_processed = True  # Update session state after successful processing
+                status_placeholder = st.empty()
+                progress_placeholder = st.empty()
+                with st.spinner('Processing your request...'):
+                    job = follow_job_events(unique_id, status_placeholder, progress_placeholder)
 
-                st.write(f"Unique ID: {st.session_state.unique_id}")  # Display the unique ID on the frontend
+                report_job_outcome(unique_id, job)
 
             else:
-                st.error(f"Error: {response.json()['message']} ❌")
+                st.error(f"Error: {response.json()['detail']} ❌")
 
         except Exception as e:
             st.error(f"An error occurred: {e} ❌")
@@ -173,6 +272,22 @@ if uploaded_file and file_language != "":
 else:
     st.warning("Please upload a valid .txt file and select a language before submitting.")
 
+# Retry only the failed videos of the last job; finished videos are kept from its checkpoints
+if st.session_state.failed_videos:
+    if st.button("Retry failed videos", key="resume_button"):
+        try:
+            resume_response = requests.post(f"{BACKEND_URL_JOBS}{st.session_state.unique_id}/resume")
+            if resume_response.status_code == 202:
+                status_placeholder = st.empty()
+                progress_placeholder = st.empty()
+                with st.spinner('Retrying failed videos...'):
+                    job = follow_job_events(st.session_state.unique_id, status_placeholder, progress_placeholder)
+                report_job_outcome(st.session_state.unique_id, job)
+            else:
+                st.error(f"Error: {resume_response.json()['detail']} ❌")
+        except Exception as e:
+            st.error(f"An error occurred while retrying: {e} ❌")
+
 # Only show the Yes/No buttons after successful file processing
 if st.session_state.file_processed:
     st.write("Would you like to store the generated chunks?")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Import the backend package from the repository root, as backend/main.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
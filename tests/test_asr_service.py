@@ -0,0 +1,54 @@
+import importlib
+import pytest
+
+pytest.importorskip("whisper")  # asr_service imports the transcription stack
+from backend.services import asr_service, model_service
+
+
+def test_fake_backend_is_not_accepted_by_default():
+    if asr_service.ASR_ALLOW_FAKE:
+        pytest.skip("ASR_ALLOW_FAKE is set for this run")
+    assert 'fake' not in asr_service.ASR_BACKENDS
+    with pytest.raises(ValueError):
+        asr_service.get_backend('fake')
+
+
+def test_fake_backend_can_be_injected_by_tests(monkeypatch):
+    monkeypatch.setitem(asr_service.ASR_BACKENDS, 'fake', asr_service.FakeBackend)
+    assert asr_service.get_backend('fake').spec()['backend'] == 'fake'
+
+
+def test_whisper_progress_bar_is_installed_only_while_transcribing():
+    module = importlib.import_module('whisper.transcribe')
+    original = getattr(module, 'tqdm', None)
+    with model_service.whisper_progress_bar():
+        assert module.tqdm is model_service._TqdmShim
+        with model_service.whisper_progress_bar():  # A second model transcribing at the same time
+            pass
+        assert module.tqdm is model_service._TqdmShim
+    assert getattr(module, 'tqdm', None) is original
+
+def test_whisper_without_a_tqdm_attribute_transcribes_without_progress(monkeypatch):
+    module = importlib.import_module('whisper.transcribe')
+    monkeypatch.delattr(module, 'tqdm', raising=False)
+    with model_service.whisper_progress_bar():
+        assert not hasattr(module, 'tqdm')
+
+def test_load_locks_are_dropped_once_models_are_loaded(monkeypatch):
+    monkeypatch.setattr(model_service, '_models', model_service.OrderedDict())
+    monkeypatch.setattr(model_service, '_load', lambda *key: {'model': key, 'hits': 0, 'lock': model_service.threading.Lock()})
+    monkeypatch.setattr(model_service, 'MAX_RESIDENT_MODELS', 1)
+    # Cycling through more sizes than fit evicts and reloads, but leaves no load lock behind
+    for model_size in ('tiny', 'base', 'small', 'tiny', 'base'):
+        assert model_service.get_model(model_size)[1] == model_size
+    assert len(model_service._models) == 1
+    assert model_service._key_locks == {}
+
+def test_load_lock_is_dropped_after_a_failed_load(monkeypatch):
+    def failing_load(*key):
+        raise RuntimeError('no such model')
+    monkeypatch.setattr(model_service, '_models', model_service.OrderedDict())
+    monkeypatch.setattr(model_service, '_load', failing_load)
+    with pytest.raises(RuntimeError):
+        model_service.get_model('missing')
+    assert model_service._key_locks == {}
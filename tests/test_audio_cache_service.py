@@ -0,0 +1,95 @@
+import os
+import time
+import threading
+from backend.services import audio_cache_service
+from backend.services.audio_cache_service import get_cached_audio, audio_cache_stats
+
+
+# A fetch that writes a small WAV-sized payload and counts how often it ran
+class CountingFetch:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, work_dir):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        path = os.path.join(work_dir, 'audio.wav')
+        with open(path, 'wb') as f:
+            f.write(b'RIFF' + b'\0' * 1020)
+        return path
+
+
+def test_miss_then_hit(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    fetch = CountingFetch()
+    events = []
+    first = get_cached_audio('vid1', str(tmp_path / 'a.wav'), fetch, cache_dir=cache_dir)
+    second = get_cached_audio('vid1', str(tmp_path / 'b.wav'), fetch, progress=lambda status, **details: events.append(details),
+                              cache_dir=cache_dir)
+
+    assert fetch.calls == 1
+    assert os.path.getsize(first) == os.path.getsize(second) == 1024
+    assert events == [{'cache': 'hit'}]
+    stats = audio_cache_stats(cache_dir)
+    assert (stats['entries'], stats['hits'], stats['misses'], stats['fetching']) == (1, 1, 1, 0)
+
+def test_concurrent_fills_of_the_same_video_download_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_cache_service, 'AUDIO_FETCH_POLL_SECONDS', 0.02)
+    cache_dir = str(tmp_path / 'cache')
+    fetch = CountingFetch(delay=0.3)
+    events = []
+    results = [None, None]
+
+    def fill(index):
+        results[index] = get_cached_audio('vid1', str(tmp_path / f'{index}.wav'), fetch,
+                                          progress=lambda status, **details: events.append(details['cache']), cache_dir=cache_dir)
+
+    threads = [threading.Thread(target=fill, args=(index,)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert fetch.calls == 1
+    assert all(result and os.path.getsize(result) == 1024 for result in results)
+    # The waiting job reports the wait once, then the hit
+    assert events == ['waiting', 'hit']
+
+def test_failed_fetch_releases_the_claim(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    assert get_cached_audio('vid1', str(tmp_path / 'a.wav'), lambda work_dir: None, cache_dir=cache_dir) is None
+    fetch = CountingFetch()
+    assert get_cached_audio('vid1', str(tmp_path / 'a.wav'), fetch, cache_dir=cache_dir)
+    assert fetch.calls == 1
+
+def test_claim_of_a_long_fetch_is_renewed(tmp_path, monkeypatch):
+    # The fetch outlasts the timeout several times over; the heartbeat keeps the waiter from fetching again
+    monkeypatch.setattr(audio_cache_service, 'AUDIO_FETCH_POLL_SECONDS', 0.02)
+    monkeypatch.setattr(audio_cache_service, 'AUDIO_FETCH_HEARTBEAT_SECONDS', 0.05)
+    monkeypatch.setattr(audio_cache_service, 'AUDIO_FETCH_TIMEOUT_SECONDS', 0.25)
+    cache_dir = str(tmp_path / 'cache')
+    fetch = CountingFetch(delay=1.0)
+    threads = [threading.Thread(target=get_cached_audio, args=('vid1', str(tmp_path / f'{index}.wav'), fetch),
+                                kwargs={'cache_dir': cache_dir}) for index in range(2)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.1)
+    for thread in threads:
+        thread.join()
+    assert fetch.calls == 1
+
+def test_claim_of_a_dead_worker_is_taken_over(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_cache_service, 'AUDIO_FETCH_POLL_SECONDS', 0.02)
+    monkeypatch.setattr(audio_cache_service, 'AUDIO_FETCH_TIMEOUT_SECONDS', 0.3)
+    cache_dir = str(tmp_path / 'cache')
+    # A worker claimed the video and died before its first renewal
+    audio_cache_service._index(cache_dir).execute('INSERT INTO fetches (video_id, owner, started_at) VALUES (?, ?, ?)',
+                                                  ('vid1', 'dead-worker', time.time()))
+    fetch = CountingFetch()
+    start = time.monotonic()
+    assert get_cached_audio('vid1', str(tmp_path / 'a.wav'), fetch, cache_dir=cache_dir)
+    assert fetch.calls == 1
+    assert 0.25 <= time.monotonic() - start < 5
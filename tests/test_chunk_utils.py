@@ -0,0 +1,75 @@
+import random
+import warnings
+import numpy as np
+import pytest
+from backend.utils.audio_utils import SAMPLE_RATE
+from backend.utils.chunk_utils import plan_chunks
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", RuntimeWarning)  # pydub warns when ffmpeg is missing; slicing does not need it
+    from pydub import AudioSegment
+
+
+# The original pydub chunker, reduced to what it decided: the audio and captions of each chunk
+def pydub_chunks(audio, segments, rng):
+    chunks = []
+    current_audio = AudioSegment.empty()
+    current_captions = []
+    limit = rng.randint(16, 29)
+    for idx, (segment_start, segment_end, text) in enumerate(segments):
+        current_audio += audio[segment_start * 1000:segment_end * 1000]
+        current_captions.append((segment_start, segment_end, text))
+        next_segment_start = segments[idx + 1][0] if idx + 1 < len(segments) else None
+        if next_segment_start and next_segment_start - segment_end <= 3:
+            current_audio += audio[segment_end * 1000:next_segment_start * 1000]
+        if len(current_audio) / 1000 >= limit or len(current_audio) / 1000 > 29:
+            chunks.append((current_audio, current_captions))
+            current_audio = AudioSegment.empty()
+            current_captions = []
+            limit = rng.randint(16, 29)
+    if len(current_audio) > 0:
+        if 16 <= len(current_audio) / 1000 <= 29:
+            chunks.append((current_audio, current_captions))
+        elif chunks:
+            chunks[-1] = (chunks[-1][0] + current_audio, chunks[-1][1] + current_captions)
+    return [(np.frombuffer(chunk_audio.raw_data, dtype=np.int16), captions) for chunk_audio, captions in chunks]
+
+# Function to make random caption segments with whole-millisecond times, gaps of up to 5 s
+def random_segments(rng, count):
+    segments = []
+    time_ms = rng.randint(0, 2000)
+    for index in range(count):
+        start = time_ms + rng.randint(0, 5000)
+        end = start + rng.randint(500, 12000)
+        segments.append((start / 1000, end / 1000, f"caption {index}"))
+        time_ms = end
+    return segments
+
+def planned_chunks(samples, plans):
+    return [(np.concatenate([samples[start:end] for start, end in plan['ranges']]), plan['captions']) for plan in plans]
+
+
+@pytest.mark.parametrize("trial", range(30))
+def test_plan_matches_pydub_chunker(trial):
+    rng = random.Random(trial)
+    segments = random_segments(rng, rng.randint(1, 40))
+    samples = np.random.RandomState(trial).randint(-2000, 2000, int((segments[-1][1] + 1) * SAMPLE_RATE)).astype(np.int16)
+    audio = AudioSegment(data=samples.tobytes(), sample_width=2, frame_rate=SAMPLE_RATE, channels=1)
+
+    expected = pydub_chunks(audio, segments, random.Random(trial))
+    actual = planned_chunks(samples, plan_chunks(segments, total_samples=len(samples), seed=trial))
+
+    assert len(actual) == len(expected)
+    for (actual_samples, actual_captions), (expected_samples, expected_captions) in zip(actual, expected):
+        assert actual_captions == expected_captions
+        np.testing.assert_array_equal(actual_samples, expected_samples)
+
+def test_chunk_closes_at_the_29_second_cap():
+    # Contiguous 1 s segments; with every random target at the cap a chunk closes exactly at 29 s
+    segments = [(second, second + 1, f"word {second}") for second in range(60)]
+    plans = plan_chunks(segments, total_samples=60 * SAMPLE_RATE, rng=random.Random(0), min_duration=29, max_duration=29)
+    assert [plan['duration'] for plan in plans] == [29.0, 31.0]  # The 2 s leftover joins the last chunk
+    assert sum(len(plan['captions']) for plan in plans) == 60
+
+def test_empty_srt_plans_no_chunks():
+    assert plan_chunks([], total_samples=SAMPLE_RATE, seed=0) == []
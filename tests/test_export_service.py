@@ -0,0 +1,12 @@
+import os
+import pytest
+from backend.services.export_service import export_path_for
+
+
+@pytest.mark.parametrize("name", ["../../x", "..", ".", "/tmp/x", "a/b", "", "name with spaces", None])
+def test_export_names_outside_the_export_dir_are_rejected(tmp_path, name):
+    with pytest.raises(ValueError):
+        export_path_for(name, str(tmp_path))
+
+def test_plain_export_name_resolves_inside_the_export_dir(tmp_path):
+    assert export_path_for("english-v1.2_small", str(tmp_path)) == os.path.join(os.path.realpath(tmp_path), "english-v1.2_small")
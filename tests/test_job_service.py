@@ -0,0 +1,89 @@
+import os
+import json
+import time
+import subprocess
+import sys
+import pytest
+
+pytest.importorskip("whisper")  # job_service imports the transcription stack
+from backend.services import job_service
+from backend.services.job_service import job_is_active, get_job, resume_job, read_events, JobNotResumable
+from backend.services.deletion_service import delete_temp_files_folder
+from backend.services.checkpoint_service import JOB_LINKS_FILE
+
+
+# Function to get the PID of a process that has already exited
+def dead_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+def write_job(unique_id, **fields):
+    job = {'unique_id': unique_id, 'language': 'english', 'codec': 'wav', 'bitrate': None, 'asr': None,
+           'status': 'running', 'message': None, 'created_at': time.time(), 'started_at': time.time(),
+           'finished_at': None, 'videos': {}, 'result': None, 'owner_pid': os.getpid(), 'heartbeat_at': time.time()}
+    job.update(fields)
+    os.makedirs(f'temp_files_{unique_id}', exist_ok=True)
+    with open(job_service.job_file_path(unique_id), 'w', encoding='utf-8') as f:
+        json.dump(job, f)
+    with open(os.path.join(f'temp_files_{unique_id}', JOB_LINKS_FILE), 'w', encoding='utf-8') as f:
+        f.write('https://www.youtube.com/watch?v=abcdefghijk\n')
+    return job
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+def test_running_job_with_a_live_fresh_owner_is_active():
+    assert job_is_active(write_job('live'))
+    assert get_job('live')['status'] == 'running'
+
+@pytest.mark.parametrize("fields", [
+    {'owner_pid': None},
+    {'heartbeat_at': time.time() - job_service.JOB_STALE_SECONDS - 1},
+    {'status': 'completed'},
+])
+def test_job_without_a_live_fresh_owner_is_not_active(fields):
+    assert not job_is_active(write_job('stale', **fields))
+
+def test_job_of_a_dead_worker_is_reported_interrupted():
+    write_job('dead', owner_pid=dead_pid())
+    assert get_job('dead')['status'] == 'interrupted'
+
+def test_interrupted_job_can_be_resumed(monkeypatch):
+    submitted = []
+    monkeypatch.setattr(job_service._executor, 'submit', lambda *args: submitted.append(args))
+    monkeypatch.setattr(job_service, 'add_gauge', lambda *args, **labels: None)
+    write_job('dead', status='queued', owner_pid=dead_pid())
+
+    job = resume_job('dead')
+    assert (job['status'], job['owner_pid'], job['resumes']) == ('queued', os.getpid(), 1)
+    assert len(submitted) == 1
+    job_service._jobs.pop('dead', None)
+
+def test_active_job_cannot_be_resumed_or_deleted():
+    write_job('live')
+    with pytest.raises(JobNotResumable):
+        resume_job('live')
+    assert delete_temp_files_folder('live')['status'] == 'error'
+
+def test_interrupted_job_can_be_deleted():
+    write_job('dead', owner_pid=dead_pid())
+    assert delete_temp_files_folder('dead')['status'] == 'success'
+    assert not os.path.exists('temp_files_dead')
+
+def test_events_resume_from_the_byte_offset_of_the_last_one_read():
+    write_job('events')
+    for stage in ('queued', 'downloading', 'transcribing'):
+        job_service._append_event('events', {'type': 'video', 'stage': stage})
+
+    events = read_events('events')
+    assert [event['stage'] for _, event in events] == ['queued', 'downloading', 'transcribing']
+    assert [event['stage'] for _, event in read_events('events', events[0][0])] == ['downloading', 'transcribing']
+    assert read_events('events', events[-1][0]) == []
+
+    # A line still being written is left for the next poll
+    with open(job_service.job_events_path('events'), 'a', encoding='utf-8') as f:
+        f.write('{"type": "video", "stage": "chu')
+    assert read_events('events', events[-1][0]) == []
@@ -0,0 +1,88 @@
+import time
+import threading
+import pytest
+from backend.services import lease_service
+from backend.services.lease_service import try_acquire_lease, acquire_lease, release_lease, release_owner_leases, list_leases
+from backend.services.transcript_cache_service import get_transcript, put_transcript
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(lease_service, 'LEASE_POLL_SECONDS', 0.02)
+    return str(tmp_path / 'leases.db')
+
+def owners(db_path):
+    return [(lease['video_id'], lease['owner']) for lease in list_leases(db_path)]
+
+
+def test_only_one_of_two_racing_jobs_gets_the_lease(db_path):
+    barrier = threading.Barrier(2)
+    results = {}
+
+    def race(owner):
+        barrier.wait()
+        results[owner] = try_acquire_lease('vid1', 'english', owner, db_path)
+
+    threads = [threading.Thread(target=race, args=(owner,)) for owner in ('job-a', 'job-b')]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    winners = [owner for owner, holder in results.items() if holder is None]
+    assert len(winners) == 1
+    loser = 'job-b' if winners == ['job-a'] else 'job-a'
+    assert results[loser]['owner'] == winners[0]
+    assert owners(db_path) == [('vid1', winners[0])]
+    release_lease('vid1', 'english', winners[0], db_path)
+
+def test_waiter_gets_the_lease_after_release_and_reads_the_caches(tmp_path, db_path):
+    transcripts = str(tmp_path / 'transcripts.db')
+    segments = [(0.0, 1.5, 'hello there')]
+    assert acquire_lease('vid1', 'english', 'job-a', db_path=db_path) is False
+
+    waits = []
+    outcome = {}
+    def waiter():
+        outcome['waited'] = acquire_lease('vid1', 'english', 'job-b', on_wait=waits.append, db_path=db_path)
+        outcome['segments'] = get_transcript('key-vid1', transcripts)
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.2)
+    # The holder caches its transcript before letting go, so the waiter finds it instead of transcribing again
+    put_transcript('key-vid1', segments, transcripts)
+    release_lease('vid1', 'english', 'job-a', db_path)
+    thread.join(timeout=5)
+
+    assert outcome == {'waited': True, 'segments': segments}
+    assert [holder['owner'] for holder in waits] == ['job-a']  # on_wait is called once, not on every poll
+    assert owners(db_path) == [('vid1', 'job-b')]
+    release_lease('vid1', 'english', 'job-b', db_path)
+
+def test_expired_lease_is_reclaimed(db_path):
+    # A job whose worker died: its lease was never renewed and has run out
+    conn = lease_service._leases(db_path)
+    conn.execute('INSERT INTO video_leases (video_id, language, owner, acquired_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                 ('vid1', 'english', 'job-dead', time.time() - 300, time.time() - 1))
+    assert list_leases(db_path)[0]['expired']
+
+    assert acquire_lease('vid1', 'english', 'job-b', db_path=db_path) is False
+    assert owners(db_path) == [('vid1', 'job-b')]
+    release_lease('vid1', 'english', 'job-b', db_path)
+
+def test_live_lease_of_another_language_does_not_block(db_path):
+    assert try_acquire_lease('vid1', 'english', 'job-a', db_path) is None
+    assert try_acquire_lease('vid1', 'german', 'job-b', db_path) is None
+    release_lease('vid1', 'english', 'job-a', db_path)
+    release_lease('vid1', 'german', 'job-b', db_path)
+
+def test_release_owner_leases_drops_only_that_owner(db_path):
+    for video_id in ('vid1', 'vid2'):
+        try_acquire_lease(video_id, 'english', 'job-a', db_path)
+    try_acquire_lease('vid3', 'english', 'job-b', db_path)
+
+    release_owner_leases('job-a', db_path)
+    assert owners(db_path) == [('vid3', 'job-b')]
+    assert not any(owner == 'job-a' for owner in lease_service._held.values())
+    release_lease('vid3', 'english', 'job-b', db_path)
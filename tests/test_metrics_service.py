@@ -0,0 +1,44 @@
+import os
+import json
+import subprocess
+import sys
+from backend.services import metrics_service
+
+
+# Function to write a snapshot file for a process that has already exited
+def write_dead_snapshot(metrics_dir, entries):
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    path = os.path.join(metrics_dir, f'{process.pid}-1.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f)
+    return path
+
+def sample_lines(text, label):
+    return [line for line in text.splitlines() if not line.startswith('#') and label in line]
+
+
+def test_snapshot_name_identifies_the_process():
+    pid, _, start = metrics_service._snapshot_name()[:-len('.json')].partition('-')
+    assert int(pid) == os.getpid()
+    assert metrics_service._alive(int(pid), start)
+    assert not metrics_service._alive(int(pid), start + '0')  # Same PID, different process
+
+def test_dead_snapshots_are_folded_into_the_retired_totals(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics_service, 'METRICS_DIR', str(tmp_path))
+    labels = {'stage': 'download', 'language': 'retired-test', 'asr_model': ''}
+    dead_path = write_dead_snapshot(str(tmp_path), [
+        {'name': 'audio_generator_bytes_written_total', 'labels': labels, 'value': 100},
+        {'name': 'audio_generator_stage_seconds', 'labels': labels,
+         'value': {'buckets': [1] * len(metrics_service.STAGE_BUCKETS), 'sum': 0.01, 'count': 1}},
+        {'name': 'audio_generator_queue_depth', 'labels': {'queue': 'retired-test'}, 'value': 4},
+    ])
+
+    first = metrics_service.render_metrics()
+    assert not os.path.exists(dead_path)
+    assert sample_lines(first, 'queue="retired-test"') == []
+    assert 'audio_generator_bytes_written_total{asr_model="",language="retired-test",stage="download"} 100' in first
+    # Values of the deleted snapshot survive later scrapes, and are counted once
+    second = metrics_service.render_metrics()
+    assert sample_lines(second, 'retired-test') == sample_lines(first, 'retired-test')
+    assert 'audio_generator_stage_seconds_count{asr_model="",language="retired-test",stage="download"} 1' in second
@@ -0,0 +1,152 @@
+import os
+import time
+import threading
+import functools
+import pytest
+from backend.services.pipeline_service import PipelineStage, run_pipeline
+
+pytest.importorskip("whisper")  # process_service imports the transcription stack
+from backend.services import process_service, lease_service
+from backend.utils import processed_index
+
+
+def link(number):
+    return f"https://www.youtube.com/watch?v=video{number:06d}"
+
+
+# Local stand-ins for the three stages; they record which stages are busy at the same time
+class Stages:
+    def __init__(self, delays=None, fail=()):
+        self.delays = delays or {}
+        self.fail = set(fail)
+        self.calls = {'download': [], 'transcribe': [], 'chunk': []}
+        self.active = set()
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def _run(self, stage, video_id):
+        with self._lock:
+            self.calls[stage].append(video_id)
+            self.active.add(stage)
+            self.max_active = max(self.max_active, len(self.active))
+        try:
+            time.sleep(self.delays.get((stage, video_id), self.delays.get(stage, 0.05)))
+            if (stage, video_id) in self.fail:
+                raise RuntimeError(f"{stage} failed for {video_id}")
+        finally:
+            with self._lock:
+                self.active.discard(stage)
+
+    def downloader(self, youtube_url, output_dir, progress=None, language=''):
+        video_id = youtube_url.split('v=')[1]
+        self._run('download', video_id)
+        audio_file = os.path.join(output_dir, f'{video_id}_mono_16000.wav')
+        with open(audio_file, 'wb') as f:
+            f.write(b'RIFF')
+        return audio_file
+
+    def transcriber(self, audio_file, language, progress=None, asr=None):
+        video_id = os.path.basename(audio_file).split('_')[0]
+        self._run('transcribe', video_id)
+        return [(0.0, 1.0, f' words of {video_id}')]
+
+    def chunker(self, audio_file, segments, output_dir, language, unique_id, progress=None, codec='wav', bitrate=None):
+        video_id = os.path.basename(output_dir)
+        self._run('chunk', video_id)
+        return [{'audio_filepath': f'{language}/{video_id}/audio_chunks/1.wav', 'duration': 1.0, 'codec': codec,
+                 'text': text.strip(), 'lang_id': 'en'} for _, _, text in segments]
+
+
+@pytest.fixture
+def job_dir(tmp_path, monkeypatch):
+    # Job folders go under tmp_path; the lease table and processed-video index get their own files there too
+    monkeypatch.chdir(tmp_path)
+    leases = str(tmp_path / 'leases.db')
+    for name in ('acquire_lease', 'release_lease', 'release_owner_leases'):
+        monkeypatch.setattr(process_service, name, functools.partial(getattr(lease_service, name), db_path=leases))
+    monkeypatch.setattr(process_service, 'filter_processed',
+                        functools.partial(processed_index.filter_processed, db_path=str(tmp_path / 'processed.db')))
+    return tmp_path
+
+def run_job(job_dir, links, stages, unique_id='job'):
+    links_file = job_dir / 'links.txt'
+    links_file.write_text(''.join(f'{line}\n' for line in links))
+    return process_youtube_links(str(links_file), stages, unique_id)
+
+def process_youtube_links(file_path, stages, unique_id):
+    result, status_code = process_service.process_youtube_links(
+        file_path, 'english', unique_id=unique_id,
+        downloader=stages.downloader, transcriber=stages.transcriber, chunker=stages.chunker)
+    assert status_code == 200
+    return result
+
+
+def test_stages_overlap_and_results_keep_input_order(job_dir):
+    # Downloads are the slowest stage, so the later stages work while they run; the first video downloads
+    # slowest of all, so it finishes after the videos behind it
+    stages = Stages(delays={'download': 0.2, 'transcribe': 0.1, 'chunk': 0.1, ('download', 'video000001'): 0.6})
+    result = run_job(job_dir, [link(number) for number in range(1, 9)], stages)
+
+    assert stages.max_active == 3
+    assert stages.calls['chunk'][0] != 'video000001'
+    assert result['status'] == 'success'
+    assert [video['link'] for video in result['processed_videos']] == [link(number) for number in range(1, 9)]
+    assert all(os.path.exists(video['metadata_file']) for video in result['processed_videos'])
+
+def test_failed_video_does_not_stop_the_others(job_dir):
+    stages = Stages(fail=[('transcribe', 'video000002')])
+    result = run_job(job_dir, [link(number) for number in range(1, 5)], stages)
+
+    assert result['status'] == 'partial'
+    assert result['failed_videos'] == 1
+    processed = [video['link'] for video in result['processed_videos'] if video['status'] == 'processed']
+    failed = [video for video in result['processed_videos'] if video['status'] == 'failed']
+    assert processed == [link(1), link(3), link(4)]
+    assert [(video['link'], video['stage']) for video in failed] == [(link(2), 'transcribe')]
+    # The failed video's lease was given back, so another job is not left waiting for it
+    assert lease_service.list_leases(str(job_dir / 'leases.db')) == []
+
+def test_video_listed_twice_is_processed_once(job_dir):
+    stages = Stages()
+    result = run_job(job_dir, [link(1), link(2), link(1), f'{link(2)}&t=30'], stages)
+
+    assert sorted(stages.calls['download']) == ['video000001', 'video000002']
+    assert [video['link'] for video in result['processed_videos']] == [link(1), link(2)]
+
+
+# run_pipeline on its own: a raising stage must not leave any worker blocked on a full queue or a missing _DONE
+def run_with_timeout(items, stages, **options):
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.update(result=run_pipeline(items, stages, **options)), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "run_pipeline deadlocked"
+    return outcome['result']
+
+def fail_on(bad):
+    def func(item):
+        if item in bad:
+            raise ValueError(f"bad item {item}")
+        return item
+    return func
+
+@pytest.mark.parametrize("stop_on_error", [True, False])
+def test_raising_stage_does_not_deadlock(stop_on_error):
+    stages = [PipelineStage('first', fail_on({3}), workers=2), PipelineStage('second', fail_on({5, 7})),
+              PipelineStage('third', lambda item: item, workers=3)]
+    completed, failures = run_with_timeout(range(50), stages, queue_size=1, stop_on_error=stop_on_error)
+
+    if stop_on_error:
+        assert failures and len(completed) < 50
+    else:
+        assert sorted(completed) == [item for item in range(50) if item not in (3, 5, 7)]
+        assert sorted((failure['stage'], failure['item']) for failure in failures) == [('first', 3), ('second', 5), ('second', 7)]
+
+def test_failing_input_still_closes_the_pipeline():
+    def items():
+        yield 1
+        raise RuntimeError("playlist lookup failed")
+
+    completed, failures = run_with_timeout(items(), [PipelineStage('only', lambda item: item)], stop_on_error=False)
+    assert completed == [1]
+    assert [failure['stage'] for failure in failures] == ['input']
@@ -0,0 +1,42 @@
+from backend.utils import processed_index
+from backend.utils.processed_index import is_video_processed, filter_processed, mark_videos_processed
+
+
+def link(number):
+    return f"https://www.youtube.com/watch?v=video{number:06d}"
+
+def video_id(number):
+    return f"video{number:06d}"
+
+
+def test_legacy_links_file_is_imported_once(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'processed_videos.db')
+    legacy_file = tmp_path / 'processed_links.txt'
+    legacy_file.write_text(f"{link(1)}\n\nhttps://youtu.be/video000002?t=5\nnot a link\n")
+
+    assert filter_processed([video_id(1), video_id(2), video_id(3)], db_path) == {video_id(1), video_id(2)}
+
+    # A later worker start must not import the file again, even if it changed since
+    legacy_file.write_text(f"{link(3)}\n")
+    monkeypatch.setattr(processed_index, '_initialised', set())
+    assert not is_video_processed(video_id(3), db_path)
+    assert is_video_processed(video_id(1), db_path)
+
+def test_missing_legacy_file_imports_nothing(tmp_path):
+    db_path = str(tmp_path / 'processed_videos.db')
+    assert filter_processed([video_id(1)], db_path) == set()
+    assert processed_index._index(db_path).execute("SELECT 1 FROM index_meta WHERE key = 'legacy_import'").fetchone()
+
+def test_marked_videos_are_found_in_batches_beyond_the_sqlite_variable_limit(tmp_path):
+    db_path = str(tmp_path / 'processed_videos.db')
+    # Every other video is processed; far more IDs than one "IN (...)" clause may bind
+    assert mark_videos_processed([link(number) for number in range(0, 40000, 2)], db_path) == 20000
+    processed = filter_processed([video_id(number) for number in range(40000)] + [None, ''], db_path)
+    assert processed == {video_id(number) for number in range(0, 40000, 2)}
+
+def test_marking_a_video_twice_keeps_one_row(tmp_path):
+    db_path = str(tmp_path / 'processed_videos.db')
+    mark_videos_processed([link(1)], db_path)
+    mark_videos_processed([link(1), f"{link(1)}&t=30"], db_path)
+    count = processed_index._index(db_path).execute('SELECT COUNT(*) FROM processed_videos').fetchone()[0]
+    assert count == 1
@@ -0,0 +1,37 @@
+import io
+import asyncio
+import threading
+import pytest
+
+pytest.importorskip("whisper")  # The router imports the transcription stack
+from backend.routers import process as process_router
+from backend.services import render_cache_service
+
+
+class FakeRequest:
+    headers = {}
+
+
+# The catalog lookup behind the cache key and the render itself must both run off the event loop thread
+def test_png_response_keeps_catalog_and_render_off_the_event_loop(monkeypatch):
+    threads = {}
+
+    def catalog_version():
+        threads['catalog'] = threading.current_thread()
+        return 41
+
+    def render(language, video_code):
+        threads['render'] = threading.current_thread()
+        return io.BytesIO(b'png')
+
+    monkeypatch.setattr(render_cache_service, 'catalog_version', catalog_version)
+    render_cache_service.invalidate_render_cache()
+
+    async def serve():
+        threads['loop'] = threading.current_thread()
+        return await process_router.cached_png_response(FakeRequest(), 'wordcloud', 'english', None, render)
+
+    response = asyncio.run(serve())
+    assert response.body == b'png'
+    assert threads['catalog'] is not threads['loop']
+    assert threads['render'] is not threads['loop']
@@ -0,0 +1,66 @@
+import json
+import pytest
+from backend.services.transcript_cache_service import transcript_key, get_transcript, put_transcript, transcript_cache_stats
+from backend.utils.vad_utils import vad_settings
+
+ASR = {'backend': 'whisper', 'model_size': 'base', 'compute_type': 'fp32', 'threads': None, 'beam_size': None}
+SETTINGS = {'vad': vad_settings('english'), 'window_seconds': 600.0, 'search_seconds': 10.0,
+            'prompt_segments': 3, 'overlap_seconds': None}
+
+
+# Function to build segments whose stored JSON is exactly nbytes long
+def segments_of(nbytes):
+    text = 'x' * (nbytes - len(json.dumps([[0.0, 1.0, '']])))
+    segments = [(0.0, 1.0, text)]
+    assert len(json.dumps([list(segment) for segment in segments])) == nbytes
+    return segments
+
+
+def test_miss_then_hit(tmp_path):
+    db_path = str(tmp_path / 'transcripts.db')
+    key = transcript_key('pcm1', ASR, 'english', SETTINGS)
+    segments = [(0.0, 1.5, 'hello'), (1.5, 3.0, 'wörld')]
+
+    assert get_transcript(key, db_path) is None
+    put_transcript(key, segments, db_path)
+    assert get_transcript(key, db_path) == segments
+    stats = transcript_cache_stats(db_path)
+    assert (stats['entries'], stats['hits'], stats['misses']) == (1, 1, 1)
+
+@pytest.mark.parametrize("pcm, asr, language, settings", [
+    ('pcm2', ASR, 'english', SETTINGS),
+    ('pcm1', dict(ASR, backend='faster-whisper', compute_type='int8'), 'english', SETTINGS),
+    ('pcm1', dict(ASR, model_size='small'), 'english', SETTINGS),
+    ('pcm1', dict(ASR, beam_size=5), 'english', SETTINGS),
+    ('pcm1', ASR, 'german', SETTINGS),
+    ('pcm1', ASR, 'english', dict(SETTINGS, vad=vad_settings('english', margin_db=8.0))),
+    ('pcm1', ASR, 'english', dict(SETTINGS, vad=None)),
+    ('pcm1', ASR, 'english', dict(SETTINGS, window_seconds=300.0)),
+])
+def test_anything_that_changes_the_transcript_changes_the_key(tmp_path, pcm, asr, language, settings):
+    db_path = str(tmp_path / 'transcripts.db')
+    put_transcript(transcript_key('pcm1', ASR, 'english', SETTINGS), [(0.0, 1.0, 'cached')], db_path)
+    assert get_transcript(transcript_key(pcm, asr, language, settings), db_path) is None
+
+def test_key_does_not_depend_on_dict_order():
+    reordered = dict(reversed(list(ASR.items())))
+    assert transcript_key('pcm1', reordered, 'english', SETTINGS) == transcript_key('pcm1', ASR, 'english', SETTINGS)
+
+def test_least_recently_used_entries_are_evicted_beyond_the_budget(tmp_path):
+    db_path = str(tmp_path / 'transcripts.db')
+    for key in ('a', 'b', 'c'):
+        put_transcript(key, segments_of(100), db_path, max_bytes=300)
+    assert get_transcript('a', db_path)  # 'a' is now more recently used than 'b'
+
+    put_transcript('d', segments_of(100), db_path, max_bytes=300)
+    assert get_transcript('b', db_path) is None
+    assert all(get_transcript(key, db_path) for key in ('a', 'c', 'd'))
+    stats = transcript_cache_stats(db_path)
+    assert (stats['entries'], stats['bytes'], stats['evictions']) == (3, 300, 1)
+
+def test_entry_larger_than_the_budget_is_not_cached(tmp_path):
+    db_path = str(tmp_path / 'transcripts.db')
+    put_transcript('a', segments_of(100), db_path, max_bytes=300)
+    put_transcript('huge', segments_of(400), db_path, max_bytes=300)
+    assert get_transcript('huge', db_path) is None
+    assert get_transcript('a', db_path)
@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip("whisper")  # transcription_service imports the transcription stack
+from backend.utils.audio_utils import SAMPLE_RATE
+from backend.services.transcription_service import _overlapping, merge_window_segments
+
+
+def seconds(*pairs):
+    return [(int(start * SAMPLE_RATE), int(end * SAMPLE_RATE)) for start, end in pairs]
+
+WINDOWS = [seconds((0, 10)), seconds((10, 20)), seconds((20, 30))]
+
+
+def test_windows_are_extended_into_the_start_of_the_next():
+    windows = [[(0, 100), (200, 300)], [(400, 450), (500, 600)], [(700, 800)]]
+    assert _overlapping(windows, 120) == [[(0, 100), (200, 300), (400, 450), (500, 570)],
+                                          [(400, 450), (500, 600), (700, 800)],
+                                          [(700, 800)]]
+    assert _overlapping(windows, 0) == windows
+
+def test_single_window_passes_through_unchanged():
+    segments = [(0.0, 2.5, 'one'), (2.5, 6.0, 'two'), (7.0, 9.5, 'three')]
+    assert merge_window_segments(WINDOWS[:1], [segments]) == segments
+
+def test_segment_straddling_the_overlap_is_kept_once():
+    window_segments = [
+        [(0.0, 4.0, 'a'), (8.0, 12.0, 'b'), (10.5, 11.5, 'heard in the overlap')],  # Starts after the next window begins
+        [(10.2, 12.0, 'b'), (12.5, 18.0, 'c')],  # Head repeats 'b', already covered by the first window
+        [(20.0, 25.0, 'd')],
+    ]
+    assert merge_window_segments(WINDOWS, window_segments) == [
+        (0.0, 4.0, 'a'), (8.0, 12.0, 'b'), (12.5, 18.0, 'c'), (20.0, 25.0, 'd')]
+
+def test_overlapping_ends_are_clamped():
+    window_segments = [
+        [(0.0, 4.0, 'a'), (7.0, 12.0, 'b')],
+        [(11.0, 16.0, 'c')],  # Midpoint past 'b', so kept, but it may not start before 'b' ends
+        [(15.5, 22.0, 'd'), (21.0, 21.5, 'swallowed')],  # 'swallowed' would be empty after clamping
+    ]
+    merged = merge_window_segments(WINDOWS, window_segments)
+    assert merged == [(0.0, 4.0, 'a'), (7.0, 12.0, 'b'), (12.0, 16.0, 'c'), (16.0, 22.0, 'd')]
+    assert all(previous[1] <= current[0] for previous, current in zip(merged, merged[1:]))
@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import subprocess
+import sys
+import functools
+import pytest
+
+pytest.importorskip("whisper")  # transfer_service imports job_service, which imports the transcription stack
+from backend.services import transfer_service, catalog_service
+from backend.services.transfer_service import transfer_data, rollback_transfer, plan_transfer, read_manifest, TransferError
+from backend.services.checkpoint_service import CHECKPOINT_FILE
+from backend.utils import processed_index
+
+TEMP_DIR = 'temp_files_job'
+VIDEOS = ['video000001', 'video000002', 'video000003']
+
+
+@pytest.fixture(autouse=True)
+def job(tmp_path, monkeypatch):
+    # A finished job with three chunked videos; the catalog and processed-video index get their own files under tmp_path
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(transfer_service, 'add_videos',
+                        functools.partial(catalog_service.add_videos, db_path=str(tmp_path / 'catalog.db')))
+    monkeypatch.setattr(transfer_service, 'mark_videos_processed',
+                        functools.partial(processed_index.mark_videos_processed, db_path=str(tmp_path / 'processed.db')))
+    os.makedirs('audio_files')
+    for video_id in VIDEOS:
+        video_dir = os.path.join(TEMP_DIR, 'english', video_id)
+        os.makedirs(os.path.join(video_dir, 'audio_chunks'))
+        with open(os.path.join(video_dir, 'metadata.json'), 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'audio_filepath': f'english/{video_id}/audio_chunks/1.wav', 'duration': 1.0,
+                                'text': 'hello', 'lang_id': 'en'}) + '\n')
+        with open(os.path.join(video_dir, 'word_counts.json'), 'w', encoding='utf-8') as f:
+            json.dump({'language': 'english', 'words': {'hello': 1}, 'stopwords': {}}, f)
+    with open(os.path.join(TEMP_DIR, CHECKPOINT_FILE), 'w', encoding='utf-8') as f:
+        json.dump({video_id: {'completed': 'chunked', 'state': 'chunked'} for video_id in VIDEOS}, f)
+    with open(os.path.join(TEMP_DIR, 'job.json'), 'w', encoding='utf-8') as f:
+        json.dump({'unique_id': 'job', 'language': 'english', 'status': 'completed'}, f)
+
+def in_dataset(video_id):
+    return os.path.isdir(os.path.join('audio_files', 'english', video_id))
+
+def in_temp(video_id):
+    return os.path.isdir(os.path.join(TEMP_DIR, 'english', video_id))
+
+# Function to write the manifest and do the first move, as a transfer that crashed part-way through would have
+def interrupt_after_first_move():
+    manifest = plan_transfer(TEMP_DIR, 'audio_files')
+    transfer_service._write_manifest(TEMP_DIR, manifest)
+    os.makedirs(os.path.dirname(manifest['moves'][0]['dst']), exist_ok=True)
+    os.rename(manifest['moves'][0]['src'], manifest['moves'][0]['dst'])
+
+
+def test_transfer_moves_every_video_and_removes_the_job_folder():
+    assert transfer_data('job')['status'] == 'success'
+    assert all(in_dataset(video_id) for video_id in VIDEOS)
+    assert not os.path.exists(TEMP_DIR)
+
+def test_failed_rename_puts_back_the_videos_already_moved(monkeypatch):
+    rename = os.rename
+    def failing_rename(src, dst):
+        if src.endswith(VIDEOS[1]) and dst.startswith('audio_files'):
+            raise OSError("disk full")
+        rename(src, dst)
+    monkeypatch.setattr(os, 'rename', failing_rename)
+
+    result = transfer_data('job')
+    assert result['status'] == 'error' and 'disk full' in result['message']
+    assert all(in_temp(video_id) and not in_dataset(video_id) for video_id in VIDEOS)
+    # The manifest stays until the transfer is retried or rolled back
+    assert read_manifest(TEMP_DIR) is not None
+    assert rollback_transfer('job') == 0
+    assert read_manifest(TEMP_DIR) is None
+
+    monkeypatch.setattr(os, 'rename', rename)
+    assert transfer_data('job')['status'] == 'success'
+    assert all(in_dataset(video_id) for video_id in VIDEOS)
+
+def test_leftover_manifest_is_resumed():
+    interrupt_after_first_move()
+    assert transfer_data('job')['status'] == 'success'
+    assert all(in_dataset(video_id) for video_id in VIDEOS)
+    assert not os.path.exists(TEMP_DIR)
+
+def test_leftover_manifest_can_be_rolled_back():
+    interrupt_after_first_move()
+    assert rollback_transfer('job') == 1
+    assert all(in_temp(video_id) and not in_dataset(video_id) for video_id in VIDEOS)
+    assert read_manifest(TEMP_DIR) is None
+
+def test_committed_transfer_cannot_be_rolled_back():
+    manifest = plan_transfer(TEMP_DIR, 'audio_files')
+    manifest['committed_at'] = time.time()
+    transfer_service._write_manifest(TEMP_DIR, manifest)
+    with pytest.raises(TransferError):
+        rollback_transfer('job')
+
+def test_transfer_held_by_another_process_is_refused():
+    holder = subprocess.Popen([sys.executable, '-c', (
+        "import fcntl, os, sys, time\n"
+        f"fd = os.open({os.path.join(TEMP_DIR, transfer_service.TRANSFER_LOCK_FILE)!r}, os.O_CREAT | os.O_WRONLY)\n"
+        "fcntl.flock(fd, fcntl.LOCK_EX)\n"
+        "print('locked', flush=True)\n"
+        "time.sleep(30)\n")], stdout=subprocess.PIPE, text=True)
+    try:
+        assert holder.stdout.readline().strip() == 'locked'
+        result = transfer_data('job')
+        assert result['status'] == 'error' and 'already being transferred' in result['message']
+        assert all(in_temp(video_id) for video_id in VIDEOS)
+    finally:
+        holder.kill()
+        holder.wait()
+    # The lock dies with its process
+    assert transfer_data('job')['status'] == 'success'
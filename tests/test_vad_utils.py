@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from backend.utils.audio_utils import SAMPLE_RATE
+from backend.utils.vad_utils import PackedTimeline, detect_speech_in_samples, vad_settings
+
+
+def seconds(*pairs):
+    return [(int(start * SAMPLE_RATE), int(end * SAMPLE_RATE)) for start, end in pairs]
+
+
+def test_segment_inside_a_piece_maps_directly():
+    timeline = PackedTimeline(seconds((0, 5), (100, 105)))
+    assert timeline.to_original_span(1.0, 3.0) == (1.0, 3.0)
+    assert timeline.to_original_span(6.0, 8.0) == (101.0, 103.0)
+
+@pytest.mark.parametrize("span, expected", [
+    ((4.0, 6.0), (4.0, 5.0)),      # Even split: the earlier piece
+    ((4.5, 7.0), (100.0, 102.0)),  # Mostly in the later piece
+    ((3.0, 5.5), (3.0, 5.0)),      # Mostly in the earlier piece
+])
+def test_segment_crossing_a_seam_never_brings_back_skipped_audio(span, expected):
+    timeline = PackedTimeline(seconds((0, 5), (100, 105)))
+    start, end = timeline.to_original_span(*span)
+    assert (start, end) == expected
+    assert end - start <= span[1] - span[0]
+
+def test_segment_crossing_a_seam_between_adjacent_pieces_is_kept_whole():
+    # quiet_windows splits one speech region into touching pieces; nothing was skipped between them
+    timeline = PackedTimeline(seconds((10, 15), (15, 20)))
+    assert timeline.to_original_span(4.0, 6.0) == (14.0, 16.0)
+
+def test_end_on_a_seam_belongs_to_the_earlier_piece():
+    timeline = PackedTimeline(seconds((0, 5), (100, 105)))
+    assert timeline.to_original_span(2.0, 5.0) == (2.0, 5.0)
+
+
+# Synthetic signals: voiced syllables (harmonics of a gliding pitch under short Hann envelopes) and a steady chord as music
+def syllables(seconds, seed=0):
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    phase = 2 * np.pi * np.cumsum(120 + 20 * np.sin(2 * np.pi * 0.5 * t)) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.zeros_like(t)
+    position = 0.0
+    while position < seconds:
+        length = rng.uniform(0.12, 0.3)
+        start, end = int(position * SAMPLE_RATE), min(int((position + length) * SAMPLE_RATE), len(t))
+        envelope[start:end] = np.hanning(end - start)
+        position += length + rng.uniform(0.05, 0.25)
+    return voiced * envelope
+
+def chord(seconds):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return sum(np.sin(2 * np.pi * frequency * t) for frequency in (220, 277.2, 329.6, 440)) / 4
+
+def to_int16(signal):
+    peak = np.max(np.abs(signal))
+    return (signal / peak * 12000 if peak else signal).astype(np.int16)
+
+def speech_seconds(regions):
+    return sum(end - start for start, end in regions) / SAMPLE_RATE
+
+
+def test_speech_between_silences_is_found_and_silence_skipped():
+    samples = to_int16(np.concatenate([np.zeros(5 * SAMPLE_RATE), syllables(20), np.zeros(5 * SAMPLE_RATE)]))
+    regions = detect_speech_in_samples(samples, vad_settings('english'))
+    assert 19 <= speech_seconds(regions) <= 21.5
+    assert regions[0][0] >= 4 * SAMPLE_RATE and regions[-1][1] <= 26 * SAMPLE_RATE
+
+@pytest.mark.parametrize("bed_gain", [0.1, 0.3, 0.5, 1.0])
+def test_speech_over_a_music_bed_is_kept(bed_gain):
+    samples = to_int16(np.concatenate([chord(5) * bed_gain, syllables(20) + chord(20) * bed_gain, chord(5) * bed_gain]))
+    assert speech_seconds(detect_speech_in_samples(samples, vad_settings('english'))) >= 19
+
+def test_steady_music_after_speech_is_skipped():
+    samples = to_int16(np.concatenate([syllables(20), chord(20) * 0.5]))
+    regions = detect_speech_in_samples(samples, vad_settings('english'))
+    assert 19 <= speech_seconds(regions) <= 22
+
+def test_no_detected_speech_in_sound_falls_back_to_the_whole_recording():
+    # Speech drowned in a bed three times louder: better to transcribe everything than lose the video's transcript
+    samples = to_int16(np.concatenate([chord(5) * 3, syllables(20) + chord(20) * 3, chord(5) * 3]))
+    assert detect_speech_in_samples(samples, vad_settings('english')) == [(0, len(samples))]
+
+def test_silence_has_no_speech():
+    assert detect_speech_in_samples(np.zeros(10 * SAMPLE_RATE, dtype=np.int16), vad_settings('english')) == []
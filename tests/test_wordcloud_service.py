@@ -0,0 +1,11 @@
+from collections import Counter
+from backend.services import wordcloud_service
+
+
+def test_wordcloud_renders_identical_bytes(monkeypatch):
+    # Strong ETags promise byte-identical bodies, so the layout must not depend on a random seed
+    words = Counter({f'word{index}': 100 - index for index in range(60)})
+    monkeypatch.setattr(wordcloud_service, 'fetch_word_counts', lambda language, video_code=None: (words, Counter()))
+    first = wordcloud_service.generate_wordcloud('english').getvalue()
+    second = wordcloud_service.generate_wordcloud('english').getvalue()
+    assert first == second